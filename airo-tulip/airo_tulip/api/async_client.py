@@ -0,0 +1,127 @@
+"""The AsyncKELORobile client is an asyncio client that interfaces with the TulipServer (see server.py)."""
+
+import asyncio
+import itertools
+from typing import Any, Callable, Dict, Optional
+
+import zmq
+import zmq.asyncio
+from airo_tulip.api.client_base import KELORobileBase, KELORobileError
+from airo_tulip.api.codec import decode_message, encode_message
+from airo_tulip.api.messages import RequestMessage, ResponseMessage, TelemetryMessage
+from airo_tulip.hardware.pose_goal import PoseGoalStatus
+from loguru import logger
+
+
+class AsyncKELORobile(KELORobileBase):
+    """The AsyncKELORobile is an asyncio client that interfaces with the TulipServer (see server.py). It has the same
+    methods as the `KELORobile`, which return awaitables, except for `connect_command_stream()` and
+    `subscribe_telemetry()`.
+
+    Requests are sent over a DEALER socket, tagged with a request id that the server echoes in its response, so
+    multiple requests can be in flight at the same time, e.g., from concurrent tasks. Create the client with
+    `await AsyncKELORobile.connect(robot_ip)`. All the methods can raise a KELORobileError in case of an error."""
+
+    def __init__(self, robot_ip: str, robot_port: int = 49789, timeout: float = 0.5):
+        """Initialize the client. Use `connect()` instead, which also performs the handshake with the server.
+
+        Args:
+            robot_ip: The IP address of the robot. Use 0.0.0.0 for access from the local network.
+            robot_port: The port on which to run this server (default: 49789).
+            timeout: Time (s) to wait for a response to a request (default: 0.5)."""
+        super().__init__(robot_ip, zmq.asyncio.Context())
+        self._timeout = timeout
+
+        address = f"tcp://{robot_ip}:{robot_port}"
+        logger.info(f"Connecting to {address}...")
+        self._zmq_socket = self._zmq_ctx.socket(zmq.DEALER)
+        self._zmq_socket.setsockopt(zmq.LINGER, 0)
+        self._zmq_socket.connect(address)
+        logger.info(f"Connected to {address}.")
+
+        # Responses are matched to requests by request id, by a task that receives all responses.
+        self._request_ids = itertools.count()
+        self._pending: Dict[bytes, asyncio.Future] = {}
+        self._receiver: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def connect(cls, robot_ip: str, robot_port: int = 49789, timeout: float = 0.5) -> "AsyncKELORobile":
+        """Create a client and perform a handshake with the server, see `__init__()`."""
+        client = cls(robot_ip, robot_port, timeout)
+        logger.info("Performing handshake.")
+        await client._handshake()
+        logger.info("Connection established!")
+        return client
+
+    async def wait_for_pose_goal(self, goal_id: int, poll_interval: float = 0.05) -> PoseGoalStatus:
+        """Wait until a pose goal is no longer running, without blocking the event loop, see `KELORobile`."""
+        while True:
+            status = await self.get_pose_goal_status()
+            if self._is_pose_goal_finished(status, goal_id):
+                return status
+            await asyncio.sleep(poll_interval)
+
+    async def _request(self, req: RequestMessage, result: Optional[Callable[[ResponseMessage], Any]] = None) -> Any:
+        response = await self._transceive_message(req)
+        return response if result is None else result(response)
+
+    async def _send_command(self, data: bytes) -> None:
+        try:
+            await self._command_socket.send(data, zmq.NOBLOCK)
+        except zmq.Again:
+            logger.warning("Could not send the velocity target, the command stream is not connected.")
+
+    async def _receive_telemetry(self, timeout: float) -> TelemetryMessage:
+        try:
+            data = await asyncio.wait_for(self._telemetry_socket.recv(), timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError("Did not receive telemetry in time from the tulip server. Is it publishing telemetry?")
+        return decode_message(data)
+
+    async def _transceive_message(self, req: RequestMessage) -> ResponseMessage:
+        """Send a request message to the server and return the response message. Raises a RuntimeError on timeouts."""
+        if self._receiver is None or self._receiver.done():
+            self._receiver = asyncio.ensure_future(self._receive_responses())
+
+        request_id = next(self._request_ids).to_bytes(8, "little")
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            # The empty frame delimits the envelope that the server echoes, like a REQ socket does.
+            await self._zmq_socket.send_multipart([b"", request_id, encode_message(req)])
+            response = await asyncio.wait_for(future, self._timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError("Did not receive a reply in time from the tulip server. Is it running?")
+        finally:
+            self._pending.pop(request_id, None)
+
+        return self._check_response(response)
+
+    async def _receive_responses(self) -> None:
+        """Receive all responses and resolve the futures of the requests they belong to."""
+        while True:
+            frames = await self._zmq_socket.recv_multipart()
+            if len(frames) != 3:
+                logger.warning("Received a response with an unexpected envelope.")
+                continue
+            _, request_id, data = frames
+            future = self._pending.get(request_id)
+            # Responses to requests that timed out are dropped.
+            if future is None or future.done():
+                continue
+            try:
+                future.set_result(decode_message(data))
+            except ValueError as e:
+                future.set_exception(KELORobileError(f"Invalid response: {e}"))
+
+    def close(self):
+        """Close the connection to the server."""
+        if self._receiver is not None:
+            self._receiver.cancel()
+        super().close()
+
+    async def __aenter__(self) -> "AsyncKELORobile":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
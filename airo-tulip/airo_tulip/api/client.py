@@ -1,50 +1,37 @@
 """The KELORobile client is a client that interfaces with the TulipServer (see server.py)."""
 
-from uuid import uuid4
+import time
+from typing import Any, Callable, Optional
 
 import zmq
-from airo_tulip.api.messages import (
-    AreDrivesAlignedMessage,
-    ErrorResponse,
-    GetOdometryMessage,
-    GetVelocityMessage,
-    HandshakeMessage,
-    RequestMessage,
-    ResetOdometryMessage,
-    ResponseMessage,
-    SetDriverTypeMessage,
-    SetPlatformVelocityTargetMessage,
-    StopServerMessage,
-)
-from airo_tulip.hardware.platform_driver import PlatformDriverType
-from airo_tulip.hardware.structs import Attitude2DType
-from airo_typing import Vector3DType
+from airo_tulip.api.client_base import KELORobileError  # re-exported, the error of all clients
+from airo_tulip.api.client_base import KELORobileBase
+from airo_tulip.api.codec import decode_message, encode_message
+from airo_tulip.api.messages import RequestMessage, ResponseMessage, TelemetryMessage
+from airo_tulip.hardware.pose_goal import PoseGoalStatus
 from loguru import logger
 
 
-class KELORobileError(RuntimeError):
-    """Error raised when an error occurs in the KELORobile client."""
-
-    def __init__(self, message):
-        super().__init__(message)
-
-
-class KELORobile:
+class KELORobile(KELORobileBase):
     """The KELORobile is a client that interfaces with the TulipServer (see server.py).
 
-    Methods are translated into network calls (essentially performing RPC). All the methods
+    Methods are translated into network calls (essentially performing RPC), see `KELORobileBase`. All the methods
     can raise a KELORobileError in case of an error."""
 
-    def __init__(self, robot_ip: str, robot_port: int = 49789):
+    def __init__(self, robot_ip: str, robot_port: int = 49789, use_pickle: bool = False):
         """Initialize the client and connect to the server.
 
         Args:
             robot_ip: The IP address of the robot. Use 0.0.0.0 for access from the local network.
-            robot_port: The port on which to run this server (default: 49789)."""
+            robot_port: The port on which to run this server (default: 49789).
+            use_pickle: If true, send pickled messages instead of the binary encoding of `airo_tulip.api.codec`
+                (default: False)."""
+        super().__init__(robot_ip, zmq.Context())
+        self._use_pickle = use_pickle
+
         address = f"tcp://{robot_ip}:{robot_port}"
 
         logger.info(f"Connecting to {address}...")
-        self._zmq_ctx = zmq.Context()
         self._zmq_socket = self._zmq_ctx.socket(zmq.REQ)
         # Set timeout in milliseconds.
         self._zmq_socket.setsockopt(zmq.RCVTIMEO, 500)
@@ -55,111 +42,49 @@ class KELORobile:
         self._handshake()
         logger.info("Connection established!")
 
-    def _handshake(self):
-        """Perform a handshake with the server to ensure the connection is established. If the server returns
-        a different UUID, the connection is not proper, or if nothing is returned, the server is not running."""
-        from importlib.metadata import version
-
-        handshake_message = HandshakeMessage(str(uuid4()))
-        handshake_reply = self._transceive_message(handshake_message)
-        assert handshake_reply.uuid == handshake_message.uuid and version("airo-tulip") == handshake_reply.lib_version
-
-    def set_platform_velocity_target(
-        self,
-        vel_x: float,
-        vel_y: float,
-        vel_a: float,
-        *,
-        timeout: float = 1.0,
-    ) -> ResponseMessage:
-        """Set the x, y and angular velocity of the complete mobile platform.
-
-        Args:
-            vel_x: Linear velocity of platform in x (forward) direction in m/s.
-            vel_y: Linear velocity of platform in y (left) direction in m/s.
-            vel_a: Linear velocity of platform in angular direction in rad/s.
-            timeout: Duration in seconds after which the movement is automatically stopped (default 1.0).
-
-        Returns:
-            A ResponseMessage object indicating the response status of the request.
-        """
-        msg = SetPlatformVelocityTargetMessage(vel_x, vel_y, vel_a, timeout, False)
-        return self._transceive_message(msg)
-
-    def align_drives(self, vel_x: float, vel_y: float, vel_a: float, *, timeout: float = 1.0) -> ResponseMessage:
-        """Align the drives for the given velocity values, such that they are oriented correctly. Does not send forward velocities.
-
-        Args:
-            vel_x: Linear velocity of platform in x (forward) direction in m/s.
-            vel_y: Linear velocity of platform in y (left) direction in m/s.
-            vel_a: Linear velocity of platform in angular direction in rad/s.
-            timeout: Duration in seconds after which the movement is automatically stopped (default 1.0).
-
-        Returns:
-            A ResponseMessage object indicating the response status of the request.
-        """
-        msg = SetPlatformVelocityTargetMessage(vel_x, vel_y, vel_a, timeout, True)
-        return self._transceive_message(msg)
-
-    def are_drives_aligned(self) -> bool:
-        """Check whether the drives are aligned with the last sent velocity command orientation.
-
-        Returns:
-            A boolean indicating the alignment."""
-        msg = AreDrivesAlignedMessage()
-        return self._transceive_message(msg).aligned
-
-    def set_driver_type(self, driver_type: PlatformDriverType) -> ResponseMessage:
-        """Set the mode of the platform driver.
+    def wait_for_pose_goal(self, goal_id: int, poll_interval: float = 0.05) -> PoseGoalStatus:
+        """Wait until a pose goal is no longer running.
 
         Args:
-            driver_type: Type to which the driver should be set.
+            goal_id: The id of the goal, as returned by `move_to_pose()`.
+            poll_interval: Time (s) between two status requests (default: 0.05).
 
         Returns:
-            A ResponseMessage object indicating the response status of the request.
+            The final status of the goal, or the status of the goal that replaced it.
         """
-        msg = SetDriverTypeMessage(driver_type)
-        return self._transceive_message(msg)
+        while True:
+            status = self.get_pose_goal_status()
+            if self._is_pose_goal_finished(status, goal_id):
+                return status
+            time.sleep(poll_interval)
 
-    def stop_server(self) -> ResponseMessage:
-        """Stops the remote server.
+    def _request(self, req: RequestMessage, result: Optional[Callable[[ResponseMessage], Any]] = None) -> Any:
+        response = self._transceive_message(req)
+        return response if result is None else result(response)
 
-        Returns:
-            A ResponseMessage object indicating the response status of the request.
-        """
-        msg = StopServerMessage()
-        return self._transceive_message(msg)
-
-    def get_odometry(self) -> Attitude2DType:
-        """Get the robot platform's odometry."""
-        msg = GetOdometryMessage()
-        return self._transceive_message(msg).odometry
-
-    def reset_odometry(self):
-        """Reset the platform's odometry to 0."""
-        msg = ResetOdometryMessage()
-        self._transceive_message(msg)
+    def _send_command(self, data: bytes) -> None:
+        try:
+            self._command_socket.send(data, zmq.NOBLOCK)
+        except zmq.Again:
+            logger.warning("Could not send the velocity target, the command stream is not connected.")
 
-    def get_velocity(self) -> Vector3DType:
-        """Get the robot platform's velocity."""
-        msg = GetVelocityMessage()
-        return self._transceive_message(msg).velocity
+    def _receive_telemetry(self, timeout: float) -> TelemetryMessage:
+        if not self._telemetry_socket.poll(timeout * 1000):
+            raise RuntimeError("Did not receive telemetry in time from the tulip server. Is it publishing telemetry?")
+        return decode_message(self._telemetry_socket.recv())
 
     def _transceive_message(self, req: RequestMessage) -> ResponseMessage:
         """Send a request message to the server and return the response message. Raises a RuntimeError on timeouts."""
         try:
-            self._zmq_socket.send_pyobj(req)
-            response = self._zmq_socket.recv_pyobj()
-            if isinstance(response, ErrorResponse):
-                raise KELORobileError(f"Error: {response.message} caused by {response.cause}")
-            return response
+            if self._use_pickle:
+                self._zmq_socket.send_pyobj(req)
+                response = self._zmq_socket.recv_pyobj()
+            else:
+                self._zmq_socket.send(encode_message(req))
+                response = decode_message(self._zmq_socket.recv())
+            return self._check_response(response)
         except zmq.Again:
             raise RuntimeError("Did not receive a reply in time from the tulip server. Is it running?")
 
-    def close(self):
-        """Close the connection to the server."""
-        self._zmq_socket.close()
-        self._zmq_ctx.term()
-
     def __del__(self):
         self.close()
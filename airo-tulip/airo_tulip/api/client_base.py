@@ -0,0 +1,461 @@
+"""The requests of the KELORobile clients to the TulipServer (see server.py), shared by the blocking `KELORobile` and
+the asyncio `AsyncKELORobile`, which only differ in how they send requests and receive responses."""
+
+import random
+import time
+from abc import ABC, abstractmethod
+from operator import attrgetter
+from typing import Any, Callable, List, Optional
+from uuid import uuid4
+
+import numpy as np
+import zmq
+from airo_tulip.api.codec import encode_message
+from airo_tulip.api.messages import (
+    AcquireControlMessage,
+    AlignAndDriveMessage,
+    AreDrivesAlignedMessage,
+    CancelPoseGoalMessage,
+    CancelTrajectoryMessage,
+    ClientStatistics,
+    ErrorResponse,
+    ExecuteVelocityTrajectoryMessage,
+    GetClientStatisticsMessage,
+    GetLoopStatisticsMessage,
+    GetOdometryMessage,
+    GetPlatformStateMessage,
+    GetPoseGoalStatusMessage,
+    GetTrajectoryStatusMessage,
+    GetVelocityMessage,
+    HandshakeMessage,
+    HandshakeResponse,
+    MoveToPoseMessage,
+    PlatformStateField,
+    PlatformStateResponse,
+    ReleaseControlMessage,
+    RequestMessage,
+    ResetOdometryMessage,
+    ResponseMessage,
+    SetDriverTypeMessage,
+    SetPlatformVelocityTargetMessage,
+    StopServerMessage,
+    StreamVelocityTargetMessage,
+    TelemetryMessage,
+)
+from airo_tulip.hardware.platform_driver import (
+    DEFAULT_ALIGNMENT_TIMEOUT,
+    DEFAULT_ALIGNMENT_TOLERANCE,
+    PlatformDriverType,
+    check_platform_velocity_target,
+)
+from airo_tulip.hardware.pose_goal import PoseGoalState, PoseGoalStatus
+from airo_tulip.hardware.realtime import LoopStatistics
+from airo_tulip.hardware.structs import Attitude2DType
+from airo_tulip.hardware.trajectory import TrajectoryStatus
+from airo_typing import Vector3DType
+from loguru import logger
+
+
+class KELORobileError(RuntimeError):
+    """Error raised when an error occurs in the KELORobile client."""
+
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class KELORobileBase(ABC):
+    """The requests of a client to the TulipServer.
+
+    Every method builds a request message and extracts its result from the response, and leaves the transport to
+    `_request()`. In the `KELORobile`, `_request()` waits for the response and returns the result. In the
+    `AsyncKELORobile`, it is a coroutine, so the methods return awaitables of the annotated results."""
+
+    def __init__(self, robot_ip: str, zmq_ctx: zmq.Context):
+        """Initialize the state shared by all clients.
+
+        Args:
+            robot_ip: The IP address of the robot.
+            zmq_ctx: The ZMQ context of the client, which creates the sockets of the command stream and telemetry."""
+        self._robot_ip = robot_ip
+        self._zmq_ctx = zmq_ctx
+        self._zmq_socket: Optional[zmq.Socket] = None
+
+        self._telemetry_socket: Optional[zmq.Socket] = None
+        self._command_socket: Optional[zmq.Socket] = None
+        self._command_stream_id = random.getrandbits(63)
+        self._command_sequence = 0
+
+    @abstractmethod
+    def _request(self, req: RequestMessage, result: Optional[Callable[[ResponseMessage], Any]] = None) -> Any:
+        """Send a request message to the server and return the result of its response.
+
+        Args:
+            req: The request message.
+            result: Extracts the result from the response message (default: the response message itself).
+
+        Returns:
+            The result, or an awaitable of it in the `AsyncKELORobile`.
+
+        Raises:
+            KELORobileError: If the server responds with an error, see `_check_response()`."""
+
+    @abstractmethod
+    def _send_command(self, data: bytes) -> Any:
+        """Send an encoded message over the command stream, without waiting for a response."""
+
+    @abstractmethod
+    def _receive_telemetry(self, timeout: float) -> Any:
+        """Receive the latest telemetry message, waiting at most `timeout` seconds for a new one."""
+
+    @staticmethod
+    def _check_response(response: ResponseMessage) -> ResponseMessage:
+        """Raise a KELORobileError if the response is an error, otherwise return it."""
+        if isinstance(response, ErrorResponse):
+            raise KELORobileError(f"Error: {response.message} caused by {response.cause}")
+        return response
+
+    def _handshake(self) -> Any:
+        """Perform a handshake with the server to ensure the connection is established. If the server returns
+        a different UUID, the connection is not proper, or if nothing is returned, the server is not running."""
+        from importlib.metadata import version
+
+        handshake_message = HandshakeMessage(str(uuid4()))
+
+        def check(handshake_reply: HandshakeResponse) -> None:
+            assert (
+                handshake_reply.uuid == handshake_message.uuid and version("airo-tulip") == handshake_reply.lib_version
+            )
+
+        return self._request(handshake_message, check)
+
+    def set_platform_velocity_target(
+        self,
+        vel_x: float,
+        vel_y: float,
+        vel_a: float,
+        *,
+        timeout: float = 1.0,
+    ) -> ResponseMessage:
+        """Set the x, y and angular velocity of the complete mobile platform.
+
+        Args:
+            vel_x: Linear velocity of platform in x (forward) direction in m/s.
+            vel_y: Linear velocity of platform in y (left) direction in m/s.
+            vel_a: Linear velocity of platform in angular direction in rad/s.
+            timeout: Duration in seconds after which the movement is automatically stopped (default 1.0).
+
+        Returns:
+            A ResponseMessage object indicating the response status of the request.
+        """
+        msg = SetPlatformVelocityTargetMessage(vel_x, vel_y, vel_a, timeout, False)
+        return self._request(msg)
+
+    def align_drives(self, vel_x: float, vel_y: float, vel_a: float, *, timeout: float = 1.0) -> ResponseMessage:
+        """Align the drives for the given velocity values, such that they are oriented correctly. Does not send forward velocities.
+
+        Args:
+            vel_x: Linear velocity of platform in x (forward) direction in m/s.
+            vel_y: Linear velocity of platform in y (left) direction in m/s.
+            vel_a: Linear velocity of platform in angular direction in rad/s.
+            timeout: Duration in seconds after which the movement is automatically stopped (default 1.0).
+
+        Returns:
+            A ResponseMessage object indicating the response status of the request.
+        """
+        msg = SetPlatformVelocityTargetMessage(vel_x, vel_y, vel_a, timeout, True)
+        return self._request(msg)
+
+    def align_and_drive(
+        self,
+        vel_x: float,
+        vel_y: float,
+        vel_a: float,
+        *,
+        timeout: float = 1.0,
+        alignment_tolerance: float = DEFAULT_ALIGNMENT_TOLERANCE,
+        alignment_timeout: float = DEFAULT_ALIGNMENT_TIMEOUT,
+    ) -> ResponseMessage:
+        """Align the drives for the given velocity values, and drive at them as soon as they are aligned. The server
+        switches from aligning to driving in the cycle of the EtherCAT loop in which the drives are aligned, which
+        replaces calling `align_drives()`, polling `are_drives_aligned()` and then calling
+        `set_platform_velocity_target()`.
+
+        Args:
+            vel_x: Linear velocity of platform in x (forward) direction in m/s.
+            vel_y: Linear velocity of platform in y (left) direction in m/s.
+            vel_a: Linear velocity of platform in angular direction in rad/s.
+            timeout: Duration in seconds after which the movement is automatically stopped, counted from the moment
+                the drives are aligned (default 1.0).
+            alignment_tolerance: Maximum error in radians of every pivot to consider the drives aligned
+                (default 0.25).
+            alignment_timeout: Duration in seconds after which the platform is stopped if the drives are not
+                aligned yet (default 2.0).
+
+        Returns:
+            A ResponseMessage object indicating the response status of the request."""
+        msg = AlignAndDriveMessage(vel_x, vel_y, vel_a, timeout, alignment_tolerance, alignment_timeout)
+        return self._request(msg)
+
+    def are_drives_aligned(self) -> bool:
+        """Check whether the drives are aligned with the last sent velocity command orientation.
+
+        Returns:
+            A boolean indicating the alignment."""
+        msg = AreDrivesAlignedMessage()
+        return self._request(msg, attrgetter("aligned"))
+
+    def set_driver_type(self, driver_type: PlatformDriverType) -> ResponseMessage:
+        """Set the mode of the platform driver.
+
+        Args:
+            driver_type: Type to which the driver should be set.
+
+        Returns:
+            A ResponseMessage object indicating the response status of the request.
+        """
+        msg = SetDriverTypeMessage(driver_type)
+        return self._request(msg)
+
+    def stop_server(self) -> ResponseMessage:
+        """Stops the remote server.
+
+        Returns:
+            A ResponseMessage object indicating the response status of the request.
+        """
+        msg = StopServerMessage()
+        return self._request(msg)
+
+    def get_odometry(self) -> Attitude2DType:
+        """Get the robot platform's odometry."""
+        msg = GetOdometryMessage()
+        return self._request(msg, attrgetter("odometry"))
+
+    def reset_odometry(self):
+        """Reset the platform's odometry to 0."""
+        msg = ResetOdometryMessage()
+        return self._request(msg, lambda _response: None)
+
+    def get_velocity(self) -> Vector3DType:
+        """Get the robot platform's velocity."""
+        msg = GetVelocityMessage()
+        return self._request(msg, attrgetter("velocity"))
+
+    def get_loop_statistics(self) -> LoopStatistics:
+        """Get the timing statistics of the EtherCAT loop on the server: period, wake-up latency (jitter) histogram,
+        worst-case latency and missed deadlines. The statistics are updated at the rate of the diagnostics."""
+        msg = GetLoopStatisticsMessage()
+        return self._request(msg, attrgetter("statistics"))
+
+    def acquire_control(self) -> ResponseMessage:
+        """Become the only client that may command the robot: other clients can then only read its state. Control is
+        lost after `release_control()`, or when this client sends no requests or streamed velocity targets for a while
+        (see the `control_timeout` of the `TulipServer`).
+
+        Returns:
+            A ResponseMessage object indicating the response status of the request.
+        """
+        msg = AcquireControlMessage(self._command_stream_id)
+        return self._request(msg)
+
+    def release_control(self) -> ResponseMessage:
+        """Release control of the robot, such that any client may command it again.
+
+        Returns:
+            A ResponseMessage object indicating the response status of the request.
+        """
+        msg = ReleaseControlMessage()
+        return self._request(msg)
+
+    def get_client_statistics(self) -> List[ClientStatistics]:
+        """Get the request statistics (request rate, control) of all clients of the server."""
+        msg = GetClientStatisticsMessage()
+        return self._request(msg, attrgetter("clients"))
+
+    def get_platform_state(self, fields: PlatformStateField = PlatformStateField.ALL) -> PlatformStateResponse:
+        """Get the state of the robot at the end of the latest cycle of the EtherCAT loop in a single request, instead
+        of one request per value. Only the requested field groups are sent, the other fields of the response are None.
+
+        Args:
+            fields: The field groups to get, e.g., `PlatformStateField.POSE | PlatformStateField.ALIGNMENT` (default:
+                all).
+
+        Returns:
+            The platform state, with the time and cycle number of the cycle it was taken from."""
+        msg = GetPlatformStateMessage(fields)
+        return self._request(msg)
+
+    def execute_velocity_trajectory(self, samples: np.ndarray, *, preempt: bool = True) -> int:
+        """Execute a velocity trajectory on the server. The server interpolates the samples linearly and sets the
+        velocity target of the platform at every cycle of the EtherCAT loop, so the motion does not depend on the
+        network. The platform stops at the end of the trajectory. Setting a velocity target preempts the trajectory.
+
+        Args:
+            samples: Array of shape (N, 4) with rows (t, vel_x, vel_y, vel_a): the time in seconds since the start of
+                the trajectory (strictly increasing) and the platform velocity, within the same limits as
+                `set_platform_velocity_target()`. At most `MAX_TRAJECTORY_SAMPLES` samples.
+            preempt: If true (default), replace a running trajectory. If false, raise an error instead.
+
+        Returns:
+            The id of the trajectory, see `get_trajectory_status()`.
+        """
+        msg = ExecuteVelocityTrajectoryMessage(np.asarray(samples, dtype=np.float64), preempt)
+        return self._request(msg, attrgetter("status.trajectory_id"))
+
+    def cancel_trajectory(self) -> ResponseMessage:
+        """Stop the running trajectory, if any, and the platform."""
+        msg = CancelTrajectoryMessage()
+        return self._request(msg)
+
+    def get_trajectory_status(self) -> TrajectoryStatus:
+        """Get the progress of the latest trajectory.
+
+        Returns:
+            The id, state (running, succeeded, preempted or cancelled) and elapsed time of the trajectory.
+        """
+        msg = GetTrajectoryStatusMessage()
+        return self._request(msg, attrgetter("status"))
+
+    def move_to_pose(
+        self,
+        x: float,
+        y: float,
+        a: float,
+        *,
+        relative: bool = False,
+        max_vel_linear: float = 0.3,
+        max_vel_angular: float = 0.5,
+        position_tolerance: float = 0.01,
+        angle_tolerance: float = 0.02,
+        timeout: float = 30.0,
+    ) -> int:
+        """Drive the platform to a goal pose. The server drives towards the goal with a feedback controller on the
+        odometry, at every cycle of the EtherCAT loop, and stops the platform when the goal is reached within the
+        tolerances. Setting a velocity target or executing a trajectory preempts the goal.
+
+        Args:
+            x: Goal position (m) along the X axis.
+            y: Goal position (m) along the Y axis.
+            a: Goal orientation (rad).
+            relative: If false (default), the goal is in the odometry frame (see `get_odometry()`). If true, it is
+                relative to the pose of the platform, in its own frame.
+            max_vel_linear: Maximum linear velocity (m/s), within the limits of `set_platform_velocity_target()`.
+            max_vel_angular: Maximum angular velocity (rad/s), within the limits of `set_platform_velocity_target()`.
+            position_tolerance: Distance (m) to the goal position at which it is reached.
+            angle_tolerance: Difference (rad) with the goal orientation at which it is reached.
+            timeout: Time (s) after which the platform stops if the goal was not reached.
+
+        Returns:
+            The id of the goal, see `get_pose_goal_status()` and `wait_for_pose_goal()`.
+        """
+        msg = MoveToPoseMessage(
+            x, y, a, relative, max_vel_linear, max_vel_angular, position_tolerance, angle_tolerance, timeout
+        )
+        return self._request(msg, attrgetter("status.goal_id"))
+
+    def cancel_pose_goal(self) -> ResponseMessage:
+        """Stop driving towards the pose goal, if any, and stop the platform."""
+        msg = CancelPoseGoalMessage()
+        return self._request(msg)
+
+    def get_pose_goal_status(self) -> PoseGoalStatus:
+        """Get the progress of the latest pose goal.
+
+        Returns:
+            The id, state (running, succeeded, preempted, cancelled or timed out), goal pose in the odometry frame and
+            remaining errors of the goal.
+        """
+        msg = GetPoseGoalStatusMessage()
+        return self._request(msg, attrgetter("status"))
+
+    @staticmethod
+    def _is_pose_goal_finished(status: PoseGoalStatus, goal_id: int) -> bool:
+        """Check whether the goal with the given id is no longer running, see `wait_for_pose_goal()`."""
+        # Goal ids increase, a goal that did not start yet still has the status of the previous goal.
+        return status.goal_id > goal_id or (status.goal_id == goal_id and status.state != PoseGoalState.RUNNING)
+
+    def connect_command_stream(self, command_port: int) -> None:
+        """Connect to the one-way command stream of the server (see the `command_port` of the `TulipServer`), to send
+        velocity targets with `stream_platform_velocity_target()` without waiting for a response.
+
+        Args:
+            command_port: The port on which the server receives the command stream."""
+        if self._command_socket is not None:
+            self._command_socket.close()
+        address = f"tcp://{self._robot_ip}:{command_port}"
+        self._command_socket = self._zmq_ctx.socket(zmq.PUSH)
+        # Only keep the newest target if the server cannot keep up. Conflate must be set before connecting.
+        self._command_socket.setsockopt(zmq.CONFLATE, 1)
+        self._command_socket.setsockopt(zmq.LINGER, 0)
+        self._command_socket.connect(address)
+        logger.info(f"Connected to the command stream on {address}.")
+
+    def stream_platform_velocity_target(
+        self, vel_x: float, vel_y: float, vel_a: float, *, timeout: float = 1.0, only_align_drives: bool = False
+    ) -> None:
+        """Send a velocity target over the command stream, without waiting for a response. Meant for high-rate updates
+        (e.g., teleoperation): the server only applies the newest target and drops targets that arrive late.
+
+        Args:
+            vel_x: Linear velocity of platform in x (forward) direction in m/s.
+            vel_y: Linear velocity of platform in y (left) direction in m/s.
+            vel_a: Linear velocity of platform in angular direction in rad/s.
+            timeout: Duration in seconds after which the movement is automatically stopped (default 1.0).
+            only_align_drives: If true, only align the drives, see `align_drives()` (default False).
+
+        Raises:
+            ValueError: If the target exceeds the safety limits of the platform."""
+        if self._command_socket is None:
+            raise KELORobileError("Not connected to the command stream, call connect_command_stream() first.")
+        check_platform_velocity_target(vel_x, vel_y, vel_a, timeout)
+        self._command_sequence += 1
+        msg = StreamVelocityTargetMessage(
+            self._command_stream_id,
+            self._command_sequence,
+            time.monotonic(),
+            vel_x,
+            vel_y,
+            vel_a,
+            timeout,
+            only_align_drives,
+        )
+        return self._send_command(encode_message(msg))
+
+    def subscribe_telemetry(self, telemetry_port: int) -> None:
+        """Subscribe to the telemetry that the server publishes every few cycles of its EtherCAT loop (see the
+        `telemetry_port` of the `TulipServer`). Only the latest message is kept, so `get_telemetry()` never returns
+        stale samples, even if it is called less often than the server publishes.
+
+        Args:
+            telemetry_port: The port on which the server publishes telemetry."""
+        if self._telemetry_socket is not None:
+            self._telemetry_socket.close()
+        address = f"tcp://{self._robot_ip}:{telemetry_port}"
+        self._telemetry_socket = self._zmq_ctx.socket(zmq.SUB)
+        # Conflate must be set before connecting.
+        self._telemetry_socket.setsockopt(zmq.CONFLATE, 1)
+        self._telemetry_socket.setsockopt(zmq.LINGER, 0)
+        self._telemetry_socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self._telemetry_socket.connect(address)
+        logger.info(f"Subscribed to telemetry on {address}.")
+
+    def get_telemetry(self, timeout: float = 1.0) -> TelemetryMessage:
+        """Get the latest telemetry message, waiting for a new one if none arrived since the previous call.
+
+        Args:
+            timeout: Maximum time (s) to wait for a message (default 1.0).
+
+        Returns:
+            The latest telemetry message."""
+        if self._telemetry_socket is None:
+            raise KELORobileError("Not subscribed to telemetry, call subscribe_telemetry() first.")
+        return self._receive_telemetry(timeout)
+
+    def close(self):
+        """Close the connection to the server."""
+        if self._telemetry_socket is not None:
+            self._telemetry_socket.close()
+        if self._command_socket is not None:
+            self._command_socket.close()
+        if self._zmq_socket is not None:
+            self._zmq_socket.close()
+        self._zmq_ctx.term()
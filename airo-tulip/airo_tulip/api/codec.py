@@ -0,0 +1,408 @@
+"""Compact binary encoding of the messages between client (KELORobile) and server (TulipServer).
+
+Every message starts with a fixed header: a magic byte, the version of the encoding and the id of the message type.
+The fields of the message follow in a fixed, little-endian layout per message type, with numbers packed as float64
+(or as small integers for flags, counters and enumerations), followed by the variable-length fields (strings and
+per-drive arrays), each prefixed with its length in bytes.
+
+The magic byte differs from the first byte of a pickle (`0x80`), so that the server can accept both encodings on the
+same socket while clients migrate. Unlike unpickling, decoding a message never constructs arbitrary objects."""
+
+import struct
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Type
+
+import numpy as np
+from airo_tulip.api.messages import (
+    AcquireControlMessage,
+    AlignAndDriveMessage,
+    AreDrivesAlignedMessage,
+    AreDrivesAlignedResponse,
+    CancelPoseGoalMessage,
+    CancelTrajectoryMessage,
+    ClientStatistics,
+    ClientStatisticsResponse,
+    ErrorResponse,
+    ExecuteVelocityTrajectoryMessage,
+    GetClientStatisticsMessage,
+    GetLoopStatisticsMessage,
+    GetOdometryMessage,
+    GetPlatformStateMessage,
+    GetPoseGoalStatusMessage,
+    GetTrajectoryStatusMessage,
+    GetVelocityMessage,
+    HandshakeMessage,
+    HandshakeResponse,
+    LoopStatisticsResponse,
+    MoveToPoseMessage,
+    OdometryResponse,
+    OkResponse,
+    PlatformStateField,
+    PlatformStateResponse,
+    PoseGoalStatusResponse,
+    ReleaseControlMessage,
+    ResetOdometryMessage,
+    SetDriverTypeMessage,
+    SetPlatformVelocityTargetMessage,
+    StopServerMessage,
+    StreamVelocityTargetMessage,
+    TelemetryMessage,
+    TrajectoryStatusResponse,
+    VelocityResponse,
+)
+from airo_tulip.hardware.platform_driver import PlatformDriverState, PlatformDriverType
+from airo_tulip.hardware.pose_goal import PoseGoalState, PoseGoalStatus
+from airo_tulip.hardware.realtime import LATENCY_BIN_EDGES_US, LoopStatistics
+from airo_tulip.hardware.trajectory import TrajectoryState, TrajectoryStatus
+
+WIRE_MAGIC = 0xA7
+"""First byte of every binary message."""
+
+WIRE_VERSION = 1
+"""Version of the binary encoding. Increment it when the layout of any message changes."""
+
+_HEADER = struct.Struct("<BBH")  # magic, version, message type id
+_LENGTH = struct.Struct("<I")  # length (bytes) of a variable-length field
+
+
+class _FieldKind(NamedTuple):
+    """How a message field is packed: its struct format, the number of packed values, and conversions to and from
+    these values."""
+
+    fmt: str
+    count: int
+    encode: Callable[[Any], Tuple]
+    decode: Callable[[Sequence], Any]
+
+
+_FLOAT = _FieldKind("d", 1, lambda value: (float(value),), lambda values: values[0])
+_INT = _FieldKind("q", 1, lambda value: (int(value),), lambda values: values[0])
+_BOOL = _FieldKind("?", 1, lambda value: (bool(value),), lambda values: values[0])
+_DRIVER_TYPE = _FieldKind("B", 1, lambda value: (value.value,), lambda values: PlatformDriverType(values[0]))
+_STATE_FIELDS = _FieldKind("B", 1, lambda value: (int(value),), lambda values: PlatformStateField(values[0]))
+# Optional fields are packed as a value that the field cannot have when it is not None.
+_OPTIONAL_BOOL = _FieldKind(
+    "b",
+    1,
+    lambda value: (-1 if value is None else int(value),),
+    lambda values: None if values[0] < 0 else bool(values[0]),
+)
+_OPTIONAL_DRIVER_TYPE = _FieldKind(
+    "B",
+    1,
+    lambda value: (0 if value is None else value.value,),
+    lambda values: PlatformDriverType(values[0]) if values[0] != 0 else None,
+)
+_OPTIONAL_DRIVER_STATE = _FieldKind(
+    "h",
+    1,
+    lambda value: (-1 if value is None else value.value,),
+    lambda values: None if values[0] < 0 else PlatformDriverState(values[0]),
+)
+_VECTOR3 = _FieldKind("3d", 3, tuple, lambda values: np.array(values, dtype=np.float64))
+_LOOP_STATISTICS = _FieldKind(
+    f"dqqddddddq{len(LATENCY_BIN_EDGES_US)}q",
+    10 + len(LATENCY_BIN_EDGES_US),
+    lambda value: (
+        value.frequency,
+        value.cycles,
+        value.missed_deadlines,
+        value.period_mean,
+        value.period_min,
+        value.period_max,
+        value.latency_max,
+        value.step_duration_mean,
+        value.step_duration_max,
+        value.gc_collections,
+        *value.latency_histogram,
+    ),
+    lambda values: LoopStatistics(*values[:10], latency_histogram=list(values[10:])),
+)
+_TRAJECTORY_STATUS = _FieldKind(
+    "qBdd",
+    4,
+    lambda value: (value.trajectory_id, value.state.value, value.elapsed, value.duration),
+    lambda values: TrajectoryStatus(values[0], TrajectoryState(values[1]), values[2], values[3]),
+)
+
+_POSE_GOAL_STATUS = _FieldKind(
+    "qB3ddd",
+    7,
+    lambda value: (value.goal_id, value.state.value, *value.goal, value.position_error, value.angle_error),
+    lambda values: PoseGoalStatus(
+        values[0], PoseGoalState(values[1]), np.array(values[2:5], dtype=np.float64), values[5], values[6]
+    ),
+)
+
+
+class _VariableFieldKind(NamedTuple):
+    """How a variable-length message field is packed: conversions to and from its bytes."""
+
+    encode: Callable[[Any], bytes]
+    decode: Callable[[bytes], Any]
+
+
+_STRING = _VariableFieldKind(lambda value: value.encode("utf-8"), lambda data: data.decode("utf-8"))
+_FLOAT_ARRAY = _VariableFieldKind(
+    lambda value: np.asarray(value, dtype="<f8").tobytes(), lambda data: np.frombuffer(data, dtype="<f8").copy()
+)
+_CLIENT_STATISTICS = struct.Struct("<qdd?")  # requests, request rate, last request age, in control
+
+
+def _encode_client_statistics(clients: List[ClientStatistics]) -> bytes:
+    parts = []
+    for client in clients:
+        client_id = client.client_id.encode("utf-8")
+        parts.append(_LENGTH.pack(len(client_id)))
+        parts.append(client_id)
+        parts.append(
+            _CLIENT_STATISTICS.pack(client.requests, client.request_rate, client.last_request_age, client.in_control)
+        )
+    return b"".join(parts)
+
+
+def _decode_client_statistics(data: bytes) -> List[ClientStatistics]:
+    clients = []
+    offset = 0
+    while offset < len(data):
+        (length,) = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        client_id = data[offset : offset + length].decode("utf-8")
+        offset += length
+        clients.append(ClientStatistics(client_id, *_CLIENT_STATISTICS.unpack_from(data, offset)))
+        offset += _CLIENT_STATISTICS.size
+    return clients
+
+
+_CLIENT_STATISTICS_LIST = _VariableFieldKind(_encode_client_statistics, _decode_client_statistics)
+_UINT16_ARRAY = _VariableFieldKind(
+    lambda value: np.asarray(value, dtype="<u2").tobytes(), lambda data: np.frombuffer(data, dtype="<u2").copy()
+)
+
+
+def _optional_array(dtype: str, columns: Optional[int] = None) -> _VariableFieldKind:
+    """An optional array field, packed as no bytes when it is None. Arrays with `columns` have shape (N, columns)."""
+
+    def decode(data: bytes) -> Optional[np.ndarray]:
+        if len(data) == 0:
+            return None
+        array = np.frombuffer(data, dtype=dtype).copy()
+        return array.reshape(-1, columns) if columns is not None else array
+
+    return _VariableFieldKind(lambda value: b"" if value is None else np.asarray(value, dtype=dtype).tobytes(), decode)
+
+
+_OPTIONAL_FLOAT_ARRAY = _optional_array("<f8")
+_OPTIONAL_UINT16_ARRAY = _optional_array("<u2")
+_TRAJECTORY_SAMPLES = _VariableFieldKind(
+    lambda value: np.asarray(value, dtype="<f8").tobytes(),
+    lambda data: np.frombuffer(data, dtype="<f8").copy().reshape(-1, 4),
+)
+
+
+class _MessageLayout:
+    """Binary layout of a message type."""
+
+    def __init__(self, type_id: int, message_class: Type, fields: List[Tuple[str, Any]]):
+        self.type_id = type_id
+        self.message_class = message_class
+        self.fixed_fields = [(name, kind) for name, kind in fields if isinstance(kind, _FieldKind)]
+        self.variable_fields = [(name, kind) for name, kind in fields if isinstance(kind, _VariableFieldKind)]
+        self.struct = struct.Struct("<" + "".join(kind.fmt for _, kind in self.fixed_fields))
+        # Messages with only plain numbers, such as velocity targets, skip the conversions.
+        self.plain = all(kind in (_FLOAT, _BOOL, _INT) for _, kind in fields)
+        self.field_names = [name for name, _ in fields]
+
+
+_LAYOUTS = [
+    # Requests.
+    _MessageLayout(1, HandshakeMessage, [("uuid", _STRING)]),
+    _MessageLayout(2, AreDrivesAlignedMessage, []),
+    _MessageLayout(
+        3,
+        SetPlatformVelocityTargetMessage,
+        [("vel_x", _FLOAT), ("vel_y", _FLOAT), ("vel_a", _FLOAT), ("timeout", _FLOAT), ("only_align_drives", _BOOL)],
+    ),
+    _MessageLayout(4, SetDriverTypeMessage, [("driver_type", _DRIVER_TYPE)]),
+    _MessageLayout(5, StopServerMessage, []),
+    _MessageLayout(6, GetVelocityMessage, []),
+    _MessageLayout(7, GetOdometryMessage, []),
+    _MessageLayout(8, ResetOdometryMessage, []),
+    _MessageLayout(9, GetLoopStatisticsMessage, []),
+    _MessageLayout(
+        10,
+        StreamVelocityTargetMessage,
+        [
+            ("stream_id", _INT),
+            ("sequence", _INT),
+            ("client_time", _FLOAT),
+            ("vel_x", _FLOAT),
+            ("vel_y", _FLOAT),
+            ("vel_a", _FLOAT),
+            ("timeout", _FLOAT),
+            ("only_align_drives", _BOOL),
+        ],
+    ),
+    _MessageLayout(11, AcquireControlMessage, [("stream_id", _INT)]),
+    _MessageLayout(12, ReleaseControlMessage, []),
+    _MessageLayout(13, GetClientStatisticsMessage, []),
+    _MessageLayout(14, GetPlatformStateMessage, [("fields", _STATE_FIELDS)]),
+    _MessageLayout(15, ExecuteVelocityTrajectoryMessage, [("samples", _TRAJECTORY_SAMPLES), ("preempt", _BOOL)]),
+    _MessageLayout(16, CancelTrajectoryMessage, []),
+    _MessageLayout(17, GetTrajectoryStatusMessage, []),
+    _MessageLayout(
+        18,
+        MoveToPoseMessage,
+        [
+            ("x", _FLOAT),
+            ("y", _FLOAT),
+            ("a", _FLOAT),
+            ("relative", _BOOL),
+            ("max_vel_linear", _FLOAT),
+            ("max_vel_angular", _FLOAT),
+            ("position_tolerance", _FLOAT),
+            ("angle_tolerance", _FLOAT),
+            ("timeout", _FLOAT),
+        ],
+    ),
+    _MessageLayout(19, CancelPoseGoalMessage, []),
+    _MessageLayout(20, GetPoseGoalStatusMessage, []),
+    _MessageLayout(
+        21,
+        AlignAndDriveMessage,
+        [
+            ("vel_x", _FLOAT),
+            ("vel_y", _FLOAT),
+            ("vel_a", _FLOAT),
+            ("timeout", _FLOAT),
+            ("alignment_tolerance", _FLOAT),
+            ("alignment_timeout", _FLOAT),
+        ],
+    ),
+    # Responses.
+    _MessageLayout(128, HandshakeResponse, [("uuid", _STRING), ("lib_version", _STRING)]),
+    _MessageLayout(129, OdometryResponse, [("odometry", _VECTOR3)]),
+    _MessageLayout(130, VelocityResponse, [("velocity", _VECTOR3)]),
+    _MessageLayout(131, LoopStatisticsResponse, [("statistics", _LOOP_STATISTICS)]),
+    _MessageLayout(132, AreDrivesAlignedResponse, [("aligned", _BOOL)]),
+    _MessageLayout(133, ErrorResponse, [("message", _STRING), ("cause", _STRING)]),
+    _MessageLayout(134, OkResponse, []),
+    _MessageLayout(135, ClientStatisticsResponse, [("clients", _CLIENT_STATISTICS_LIST)]),
+    _MessageLayout(
+        136,
+        PlatformStateResponse,
+        [
+            ("fields", _STATE_FIELDS),
+            ("time", _FLOAT),
+            ("cycle", _INT),
+            ("drives_aligned", _OPTIONAL_BOOL),
+            ("driver_type", _OPTIONAL_DRIVER_TYPE),
+            ("driver_state", _OPTIONAL_DRIVER_STATE),
+            ("pose", _OPTIONAL_FLOAT_ARRAY),
+            ("velocity", _OPTIONAL_FLOAT_ARRAY),
+            ("target_velocity", _OPTIONAL_FLOAT_ARRAY),
+            ("ramped_velocity", _OPTIONAL_FLOAT_ARRAY),
+            ("status1", _OPTIONAL_UINT16_ARRAY),
+            ("status2", _OPTIONAL_UINT16_ARRAY),
+            ("voltage_bus", _OPTIONAL_FLOAT_ARRAY),
+            ("current_in", _OPTIONAL_FLOAT_ARRAY),
+            ("motor_current", _optional_array("<f8", 2)),
+            ("temperature", _optional_array("<f8", 3)),
+        ],
+    ),
+    _MessageLayout(137, TrajectoryStatusResponse, [("status", _TRAJECTORY_STATUS)]),
+    _MessageLayout(138, PoseGoalStatusResponse, [("status", _POSE_GOAL_STATUS)]),
+    # Telemetry.
+    _MessageLayout(
+        192,
+        TelemetryMessage,
+        [
+            ("time", _FLOAT),
+            ("cycle", _INT),
+            ("pose", _VECTOR3),
+            ("velocity", _VECTOR3),
+            ("drives_aligned", _BOOL),
+            ("status1", _UINT16_ARRAY),
+            ("status2", _UINT16_ARRAY),
+            ("voltage_bus", _FLOAT_ARRAY),
+            ("power", _FLOAT_ARRAY),
+        ],
+    ),
+]
+_LAYOUTS_BY_CLASS: Dict[Type, _MessageLayout] = {layout.message_class: layout for layout in _LAYOUTS}
+_LAYOUTS_BY_TYPE_ID: Dict[int, _MessageLayout] = {layout.type_id: layout for layout in _LAYOUTS}
+
+
+def is_binary_message(data: bytes) -> bool:
+    """Check whether `data` is a binary message, as opposed to a pickled one."""
+    return len(data) > 0 and data[0] == WIRE_MAGIC
+
+
+def encode_message(message: Any) -> bytes:
+    """Encode a request or response message.
+
+    Args:
+        message: The message, an instance of one of the classes in `airo_tulip.api.messages`.
+
+    Returns:
+        The binary message."""
+    layout = _LAYOUTS_BY_CLASS.get(type(message))
+    if layout is None:
+        raise ValueError(f"No binary encoding for {type(message).__name__}.")
+
+    if layout.plain:
+        return _HEADER.pack(WIRE_MAGIC, WIRE_VERSION, layout.type_id) + layout.struct.pack(
+            *[getattr(message, name) for name in layout.field_names]
+        )
+
+    values = []
+    for name, kind in layout.fixed_fields:
+        values.extend(kind.encode(getattr(message, name)))
+    parts = [_HEADER.pack(WIRE_MAGIC, WIRE_VERSION, layout.type_id), layout.struct.pack(*values)]
+    for name, kind in layout.variable_fields:
+        encoded = kind.encode(getattr(message, name))
+        parts.append(_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    return b"".join(parts)
+
+
+def decode_message(data: bytes) -> Any:
+    """Decode a binary message.
+
+    Args:
+        data: The binary message.
+
+    Returns:
+        The request or response message.
+
+    Raises:
+        ValueError: If the message is malformed, of an unknown type or of another version of the encoding."""
+    try:
+        magic, version, type_id = _HEADER.unpack_from(data)
+        if magic != WIRE_MAGIC:
+            raise ValueError("Not a binary message.")
+        if version != WIRE_VERSION:
+            raise ValueError(f"Unsupported version {version} of the binary encoding, expected {WIRE_VERSION}.")
+        layout = _LAYOUTS_BY_TYPE_ID.get(type_id)
+        if layout is None:
+            raise ValueError(f"Unknown message type {type_id}.")
+
+        offset = _HEADER.size
+        values = layout.struct.unpack_from(data, offset)
+        if layout.plain:
+            return layout.message_class(*values)
+        offset += layout.struct.size
+        fields = {}
+        index = 0
+        for name, kind in layout.fixed_fields:
+            fields[name] = kind.decode(values[index : index + kind.count])
+            index += kind.count
+        for name, kind in layout.variable_fields:
+            (length,) = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            if offset + length > len(data):
+                raise ValueError(f"Truncated field {name}.")
+            fields[name] = kind.decode(bytes(data[offset : offset + length]))
+            offset += length
+    except struct.error as e:
+        raise ValueError(f"Malformed message: {e}") from e
+    return layout.message_class(**fields)
@@ -1,9 +1,15 @@
 """These messages are used to communicate between client (KELORobile) and server (TulipServer)."""
 
 from dataclasses import dataclass
+from enum import IntFlag
+from typing import List, Optional
 
-from airo_tulip.hardware.platform_driver import PlatformDriverType
+import numpy as np
+from airo_tulip.hardware.platform_driver import PlatformDriverState, PlatformDriverType
+from airo_tulip.hardware.pose_goal import PoseGoalStatus
+from airo_tulip.hardware.realtime import LoopStatistics
 from airo_tulip.hardware.structs import Attitude2DType
+from airo_tulip.hardware.trajectory import TrajectoryStatus
 from airo_typing import Vector3DType
 
 
@@ -17,6 +23,18 @@ class ResponseMessage:
     """Base class for all response messages."""
 
 
+class PlatformStateField(IntFlag):
+    """Field groups of the platform state, which can be combined to request them with a `GetPlatformStateMessage`."""
+
+    POSE = 0x01  # estimated pose
+    VELOCITY = 0x02  # estimated velocity
+    TARGET_VELOCITY = 0x04  # velocity target and ramped velocity
+    ALIGNMENT = 0x08  # whether the drives are aligned
+    DRIVER = 0x10  # driver type and state
+    DRIVES = 0x20  # status bits, voltages, currents and temperatures of all drives
+    ALL = 0x3F
+
+
 @dataclass
 class HandshakeMessage:
     """A handshake message is used to establish a connection between client and server."""
@@ -48,6 +66,35 @@ class SetPlatformVelocityTargetMessage(RequestMessage):
     only_align_drives: bool
 
 
+@dataclass
+class AlignAndDriveMessage(RequestMessage):
+    """A message to align the drives for a platform velocity target, and drive at it once they are aligned."""
+
+    vel_x: float
+    vel_y: float
+    vel_a: float
+    timeout: float
+    alignment_tolerance: float  # rad
+    alignment_timeout: float  # s
+
+
+@dataclass
+class StreamVelocityTargetMessage:
+    """A velocity target sent over the one-way command stream, without a response.
+
+    The server applies only the newest target: targets of a stream with a lower sequence number than an already
+    received one, or that arrive too late, are dropped."""
+
+    stream_id: int  # random id of the sending client, sequence numbers are per stream
+    sequence: int
+    client_time: float  # time (s) at which the client sent the target, on any monotonic clock of the client
+    vel_x: float
+    vel_y: float
+    vel_a: float
+    timeout: float
+    only_align_drives: bool
+
+
 @dataclass
 class SetDriverTypeMessage(RequestMessage):
     """A message to set the driver type (velocity mode or compliant mode)."""
@@ -75,6 +122,81 @@ class ResetOdometryMessage(RequestMessage):
     """A message to reset the odometry of the robot."""
 
 
+@dataclass
+class GetLoopStatisticsMessage(RequestMessage):
+    """A message to get the timing statistics of the EtherCAT loop."""
+
+
+@dataclass
+class GetPlatformStateMessage(RequestMessage):
+    """A message to get the state of the robot at the end of a single cycle of the EtherCAT loop, in one request.
+
+    Unlike `AreDrivesAlignedMessage`, requesting the alignment does not reset the velocity ramp of the platform."""
+
+    fields: PlatformStateField = PlatformStateField.ALL  # field groups to include in the response
+
+
+@dataclass
+class ExecuteVelocityTrajectoryMessage(RequestMessage):
+    """A message to execute a velocity trajectory on the server, see `VelocityTrajectoryExecutor`."""
+
+    samples: np.ndarray  # shape (N, 4): time (s) since the start, x, y and angular velocity
+    preempt: bool  # whether to replace a running trajectory, or refuse this one
+
+
+@dataclass
+class CancelTrajectoryMessage(RequestMessage):
+    """A message to stop the running trajectory and the platform."""
+
+
+@dataclass
+class GetTrajectoryStatusMessage(RequestMessage):
+    """A message to get the progress of the latest trajectory."""
+
+
+@dataclass
+class MoveToPoseMessage(RequestMessage):
+    """A message to drive the platform to a goal pose in the odometry frame on the server, see `PoseGoal`."""
+
+    x: float
+    y: float
+    a: float
+    relative: bool  # whether the goal is relative to the pose of the platform when it starts, in its frame
+    max_vel_linear: float
+    max_vel_angular: float
+    position_tolerance: float
+    angle_tolerance: float
+    timeout: float
+
+
+@dataclass
+class CancelPoseGoalMessage(RequestMessage):
+    """A message to stop driving towards the pose goal and stop the platform."""
+
+
+@dataclass
+class GetPoseGoalStatusMessage(RequestMessage):
+    """A message to get the progress of the latest pose goal."""
+
+
+@dataclass
+class AcquireControlMessage(RequestMessage):
+    """A message to become the only client that may command the robot, until it releases control or stops sending
+    requests."""
+
+    stream_id: int  # id of the command stream of the client, whose velocity targets remain accepted
+
+
+@dataclass
+class ReleaseControlMessage(RequestMessage):
+    """A message to release control of the robot, such that any client may command it again."""
+
+
+@dataclass
+class GetClientStatisticsMessage(RequestMessage):
+    """A message to get the request statistics of all clients of the server."""
+
+
 @dataclass
 class OdometryResponse(ResponseMessage):
     """A response message containing the odometry of the robot."""
@@ -89,6 +211,13 @@ class VelocityResponse(ResponseMessage):
     velocity: Vector3DType
 
 
+@dataclass
+class LoopStatisticsResponse(ResponseMessage):
+    """A response message containing the timing statistics of the EtherCAT loop."""
+
+    statistics: LoopStatistics
+
+
 @dataclass
 class AreDrivesAlignedResponse(ResponseMessage):
     """A response message containing the alignment status of the drives."""
@@ -96,6 +225,61 @@ class AreDrivesAlignedResponse(ResponseMessage):
     aligned: bool
 
 
+@dataclass
+class PlatformStateResponse(ResponseMessage):
+    """A response message containing the state of the robot at the end of a single cycle of the EtherCAT loop. Fields
+    of groups that were not requested are None. Arrays of the drives have one entry (row) per drive."""
+
+    fields: PlatformStateField  # the field groups in this response
+    time: float  # time (s) of the cycle, see `CycleClock`
+    cycle: int
+    pose: Optional[Attitude2DType] = None
+    velocity: Optional[Vector3DType] = None
+    target_velocity: Optional[Vector3DType] = None  # zero after the velocity target timed out
+    ramped_velocity: Optional[Vector3DType] = None  # velocity that the drives are commanded to
+    drives_aligned: Optional[bool] = None
+    driver_type: Optional[PlatformDriverType] = None  # also None before the first cycle
+    driver_state: Optional[PlatformDriverState] = None
+    status1: Optional[np.ndarray] = None  # status bits as defined in STAT1_
+    status2: Optional[np.ndarray] = None  # status bits as defined in STAT2_
+    voltage_bus: Optional[np.ndarray] = None  # bus voltage (V)
+    current_in: Optional[np.ndarray] = None  # input current (A)
+    motor_current: Optional[np.ndarray] = None  # direct current (A) of wheel 1 and wheel 2, shape (N, 2)
+    temperature: Optional[np.ndarray] = None  # temperature (K) of wheel 1, wheel 2 and the IMU, shape (N, 3)
+
+
+@dataclass
+class TrajectoryStatusResponse(ResponseMessage):
+    """A response message containing the progress of a trajectory."""
+
+    status: TrajectoryStatus
+
+
+@dataclass
+class PoseGoalStatusResponse(ResponseMessage):
+    """A response message containing the progress of a pose goal."""
+
+    status: PoseGoalStatus
+
+
+@dataclass
+class ClientStatistics:
+    """Request statistics of a single client of the server."""
+
+    client_id: str  # hexadecimal ZMQ routing id of the client
+    requests: int  # number of requests since the client connected
+    request_rate: float  # requests per second, over the last second
+    last_request_age: float  # time (s) since the last request
+    in_control: bool  # whether the client has acquired control of the robot
+
+
+@dataclass
+class ClientStatisticsResponse(ResponseMessage):
+    """A response message containing the request statistics of all clients of the server."""
+
+    clients: List[ClientStatistics]
+
+
 @dataclass
 class ErrorResponse(ResponseMessage):
     """A response message containing an error message."""
@@ -107,3 +291,19 @@ class ErrorResponse(ResponseMessage):
 @dataclass
 class OkResponse(ResponseMessage):
     """A response message indicating that the request was successful."""
+
+
+@dataclass
+class TelemetryMessage:
+    """A message published by the server every few cycles of the EtherCAT loop, with the state of the robot at the end
+    of a single cycle. Arrays of the drives have one entry per drive."""
+
+    time: float  # time (s) of the cycle, see `CycleClock`
+    cycle: int
+    pose: Attitude2DType
+    velocity: Vector3DType
+    drives_aligned: bool
+    status1: np.ndarray  # status bits as defined in STAT1_
+    status2: np.ndarray  # status bits as defined in STAT2_
+    voltage_bus: np.ndarray  # bus voltage
+    power: np.ndarray  # input power, bus voltage * input current
@@ -1,43 +1,232 @@
 """The TulipServer accepts incoming connections over TCP to send commands to the mobile robot."""
 
+import multiprocessing
+import pickle
 import time
+from collections import deque
+from dataclasses import replace
+from functools import partial
 from threading import Event, Thread
-from typing import List
+from typing import Deque, Dict, List, Optional, Tuple
 
+import numpy as np
 import zmq
 import zmq.asyncio
+from airo_tulip.api.codec import decode_message, encode_message, is_binary_message
 from airo_tulip.api.messages import (
+    AcquireControlMessage,
+    AlignAndDriveMessage,
     AreDrivesAlignedMessage,
     AreDrivesAlignedResponse,
+    CancelPoseGoalMessage,
+    CancelTrajectoryMessage,
+    ClientStatistics,
+    ClientStatisticsResponse,
     ErrorResponse,
+    ExecuteVelocityTrajectoryMessage,
+    GetClientStatisticsMessage,
+    GetLoopStatisticsMessage,
     GetOdometryMessage,
+    GetPlatformStateMessage,
+    GetPoseGoalStatusMessage,
+    GetTrajectoryStatusMessage,
     GetVelocityMessage,
     HandshakeMessage,
     HandshakeResponse,
+    LoopStatisticsResponse,
+    MoveToPoseMessage,
     OdometryResponse,
     OkResponse,
+    PlatformStateField,
+    PlatformStateResponse,
+    PoseGoalStatusResponse,
+    ReleaseControlMessage,
     RequestMessage,
     ResetOdometryMessage,
     ResponseMessage,
     SetDriverTypeMessage,
     SetPlatformVelocityTargetMessage,
     StopServerMessage,
+    StreamVelocityTargetMessage,
+    TelemetryMessage,
+    TrajectoryStatusResponse,
     VelocityResponse,
 )
+from airo_tulip.hardware.platform_channel import PlatformChannel, SharedMemoryChannel
 from airo_tulip.hardware.platform_driver import PlatformDriverType
+from airo_tulip.hardware.pose_goal import PoseGoal, PoseGoalState, PoseGoalStatus
+from airo_tulip.hardware.realtime import (
+    DeadlineLoop,
+    RealtimeSettings,
+    RealtimeStatus,
+    apply_realtime_settings,
+    isolate_cpu,
+)
 from airo_tulip.hardware.robile_platform import RobilePlatform
-from airo_tulip.hardware.structs import WheelConfig
+from airo_tulip.hardware.simulation import SimulatedMaster
+from airo_tulip.hardware.structs import PlatformTaskRates, TorqueControllerGains, WheelConfig
 from loguru import logger
 
+COMMAND_POLL_TIMEOUT = 100  # ms, how often the command loop checks whether the server should stop
+CLIENT_RATE_WINDOW = 1.0  # s, window over which the request rate of a client is measured
+CLIENT_EXPIRY = 60.0  # s, clients that have not sent a request for this long are forgotten
+
+CONTROL_MESSAGES = (
+    SetPlatformVelocityTargetMessage,
+    SetDriverTypeMessage,
+    ResetOdometryMessage,
+    StopServerMessage,
+    ExecuteVelocityTrajectoryMessage,
+    CancelTrajectoryMessage,
+    MoveToPoseMessage,
+    CancelPoseGoalMessage,
+    AlignAndDriveMessage,
+)
+"""Requests that command the robot. When a client has acquired control, only that client may send these."""
+
 
 class RobotConfiguration:
     """The mobile robot configuration requires two parameters: an EtherCAT device string and a list of wheel configurations.
 
-    This configuration is required to properly set up the platform and should be passed to the TulipServer's constructor."""
+    This configuration is required to properly set up the platform and should be passed to the TulipServer's constructor.
+    Set `simulated` to run the server against a `SimulatedMaster` instead of the EtherCAT hardware.
+    Optionally, `torque_controller_gains` overrides the torque controller gains of every motor for the compliant driver
+    types (see `PlatformDriver`), and `task_rates` sets the rates of odometry and diagnostics (see `RobilePlatform`).
+    """
 
-    def __init__(self, ecat_device: str, wheel_configs: List[WheelConfig]):
+    def __init__(
+        self,
+        ecat_device: str,
+        wheel_configs: List[WheelConfig],
+        simulated: bool = False,
+        torque_controller_gains: Optional[Dict[PlatformDriverType, List[TorqueControllerGains]]] = None,
+        task_rates: Optional[PlatformTaskRates] = None,
+    ):
         self.ecat_device = ecat_device
         self.wheel_configs = wheel_configs
+        self.simulated = simulated
+        self.torque_controller_gains = torque_controller_gains
+        self.task_rates = task_rates
+
+
+def _create_platform(robot_configuration: RobotConfiguration) -> RobilePlatform:
+    """Create the platform for a robot configuration."""
+    master = SimulatedMaster(robot_configuration.wheel_configs) if robot_configuration.simulated else None
+    return RobilePlatform(
+        robot_configuration.ecat_device,
+        robot_configuration.wheel_configs,
+        PlatformDriverType.VELOCITY,
+        master,
+        robot_configuration.torque_controller_gains,
+        task_rates=robot_configuration.task_rates,
+    )
+
+
+def _ethercat_step(
+    channel: PlatformChannel, platform: RobilePlatform, scheduler: DeadlineLoop, should_stop: Event
+) -> None:
+    """A single cycle of the EtherCAT loop: apply the commands of the request handlers, step the platform and publish
+    its state for the request handlers."""
+    if not channel.apply_commands(platform):
+        should_stop.set()
+        return
+    platform.step()
+    # The loop statistics are only published at the rate of the diagnostics, as collecting them takes a lock.
+    channel.publish_state(platform, scheduler.get_statistics() if platform.diagnostics_updated else None)
+
+
+def _run_ethercat_process(
+    robot_configuration: RobotConfiguration,
+    channel_name: str,
+    loop_frequency: float,
+    realtime: Optional[RealtimeSettings],
+) -> None:
+    """Entry point of the EtherCAT process: runs the EtherCAT loop and exchanges commands and state with the
+    TulipServer over a `SharedMemoryChannel`."""
+    channel = SharedMemoryChannel(len(robot_configuration.wheel_configs), channel_name)
+    platform = _create_platform(robot_configuration)
+    if not platform.init_ethercat():
+        logger.error("Could not initialise EtherCAT, stopping the EtherCAT process.")
+        channel.close()
+        return
+
+    realtime_status = RealtimeStatus()
+    if realtime is not None:
+        realtime_status = apply_realtime_settings(realtime)
+        logger.info(f"Real-time settings of the EtherCAT process: {realtime_status}.")
+        for message in realtime_status.messages:
+            logger.warning(message)
+
+    scheduler = DeadlineLoop(loop_frequency)
+    should_stop = Event()
+    step = partial(_ethercat_step, channel, platform, scheduler, should_stop)
+    scheduler.run(step, should_stop, collect_garbage=realtime_status.gc_controlled)
+    channel.close()
+
+
+class _CommandStreamFilter:
+    """Decides which velocity targets of the command stream may be applied. Per stream, a target must have a higher
+    sequence number than all previous targets and must not be older than `max_age` seconds.
+
+    The age of a target is measured against the clock of its client: the offset between both clocks is estimated as the
+    smallest difference between receive and send time seen so far on that stream, i.e., the fastest delivery is
+    assumed to have taken no time.
+
+    The state of a stream is forgotten when its client releases control or expires (see `forget()`), or when the
+    stream has been idle for `CLIENT_EXPIRY`."""
+
+    def __init__(self, max_age: float):
+        self._max_age = max_age
+        # Stream id -> last sequence number, clock offset, time of the last accepted target.
+        self._streams: Dict[int, Tuple[int, float, float]] = {}
+        # Streams to forget, which the request loop appends to and the command loop removes before the next target.
+        self._forgotten: Deque[int] = deque()
+
+    def forget(self, stream_id: int) -> None:
+        """Forget the state of a stream before the next target is checked. Can be called from any thread."""
+        self._forgotten.append(stream_id)
+
+    def accept(self, message: StreamVelocityTargetMessage, receive_time: float) -> bool:
+        """Check whether a target may be applied, and update the state of its stream."""
+        while self._forgotten:
+            self._streams.pop(self._forgotten.popleft(), None)
+
+        offset = receive_time - message.client_time
+        stream = self._streams.get(message.stream_id)
+        if stream is None:
+            for expired in [s for s, (_, _, t) in self._streams.items() if t < receive_time - CLIENT_EXPIRY]:
+                del self._streams[expired]
+            self._streams[message.stream_id] = (message.sequence, offset, receive_time)
+            return True
+
+        last_sequence, min_offset, _ = stream
+        if message.sequence <= last_sequence:
+            return False
+        min_offset = min(min_offset, offset)
+        self._streams[message.stream_id] = (message.sequence, min_offset, receive_time)
+        return offset - min_offset <= self._max_age
+
+
+class _ClientState:
+    """Request statistics of a client, identified by the ZMQ routing id of its socket."""
+
+    def __init__(self, client_id: bytes):
+        self.client_id = client_id
+        self.requests = 0
+        self.last_request_time = 0.0
+        self.command_stream_id: Optional[int] = None
+        self._request_times = deque()  # times of the requests in the last `CLIENT_RATE_WINDOW`
+
+    def record_request(self, now: float) -> None:
+        self.requests += 1
+        self.last_request_time = now
+        self._request_times.append(now)
+        while self._request_times[0] < now - CLIENT_RATE_WINDOW:
+            self._request_times.popleft()
+
+    def request_rate(self, now: float) -> float:
+        """The number of requests per second, over the last `CLIENT_RATE_WINDOW`."""
+        return sum(1 for t in self._request_times if t >= now - CLIENT_RATE_WINDOW) / CLIENT_RATE_WINDOW
 
 
 class TulipServer:
@@ -48,15 +237,29 @@ class TulipServer:
     on the KELO CPU Brick, or over the network, if you are running application code on some remote device
     (e.g., your laptop, workstation, or a NUC mounted on the Robile platform.
     In any case, application code that wishes to interface with the Robile platform needs
-    to communicate with the TulipServer over a TCP socket, connecting with 0MQ. We use the REQ/REP
-    message pattern (https://learning-0mq-with-pyzmq.readthedocs.io/en/latest/pyzmq/patterns/client_server.html)."""
+    to communicate with the TulipServer over a TCP socket, connecting with 0MQ. Clients use the REQ/REP
+    message pattern (https://learning-0mq-with-pyzmq.readthedocs.io/en/latest/pyzmq/patterns/client_server.html),
+    served by a ROUTER socket, such that requests of many clients are interleaved instead of handled in lockstep.
+    Requests are handled one at a time, in the fair-queued order of the ROUTER socket, so handlers must not block.
+    A client can acquire control of the robot, after which the other clients can only read its state.
+
+    The request handlers never access the platform directly: they send commands to the EtherCAT loop and read the
+    state it published at the end of its latest cycle over a lock-free `PlatformChannel`, such that every response
+    reflects a single, consistent cycle and requests cannot delay the EtherCAT loop."""
 
     def __init__(
         self,
         robot_configuration: RobotConfiguration,
         robot_ip: str,
         robot_port: int = 49789,
-        loop_frequency: float = 20,
+        loop_frequency: float = 250,
+        ethercat_process: bool = False,
+        allow_pickle: bool = True,
+        telemetry_port: Optional[int] = None,
+        telemetry_cycles: int = 2,
+        command_port: Optional[int] = None,
+        command_max_age: float = 0.1,
+        control_timeout: float = 5.0,
     ):
         """Initialize the server.
 
@@ -64,16 +267,60 @@ class TulipServer:
             robot_configuration: The robot configuration.
             robot_ip: The IP address of the robot. Use 0.0.0.0 for access from the local network.
             robot_port: The port on which to run this server (default: 49789).
-            loop_frequency: The frequency (Hz) with which EtherCAT messages are received and sent.
+            loop_frequency: The frequency (Hz) with which EtherCAT messages are received and sent (default: 250).
+            ethercat_process: If true, run the EtherCAT loop in a separate process, which exchanges commands and state
+                with the server over shared memory, such that handling requests cannot delay a control cycle. The
+                script that runs the server then needs an `if __name__ == "__main__":` guard.
+            allow_pickle: If true, also accept pickled requests from clients that do not use the binary encoding of
+                `airo_tulip.api.codec` yet (default: True). Unpickling executes arbitrary code, so only allow this on
+                trusted networks.
+            telemetry_port: If set, publish a `TelemetryMessage` on a ZMQ PUB socket on this port, which clients can
+                subscribe to with `KELORobile.subscribe_telemetry()` (default: None, no telemetry).
+            telemetry_cycles: Publish telemetry every this many cycles of the EtherCAT loop (default: 2).
+            command_port: If set, receive a one-way stream of velocity targets on a ZMQ PULL socket on this port, which
+                clients send to with `KELORobile.stream_platform_velocity_target()` (default: None, no stream).
+            command_max_age: Velocity targets of the command stream that arrive more than this many seconds later than
+                the fastest one of the same client are dropped (default: 0.1).
+            control_timeout: A client that has acquired control loses it when it has not sent a request or streamed a
+                velocity target for this many seconds (default: 5.0).
         """
         # ZMQ socket.
         address = f"tcp://{robot_ip}:{robot_port}"
         logger.info(f"Binding to {address}...")
         self._zmq_ctx = zmq.Context()
-        self._zmq_socket = self._zmq_ctx.socket(zmq.REP)
+        self._zmq_socket = self._zmq_ctx.socket(zmq.ROUTER)
         self._zmq_socket.bind(address)
         logger.info(f"Bound to {address}.")
 
+        self._allow_pickle = allow_pickle
+
+        # ZMQ socket for telemetry.
+        self._telemetry_socket = None
+        self._telemetry_frequency = loop_frequency / telemetry_cycles
+        if telemetry_port is not None:
+            telemetry_address = f"tcp://{robot_ip}:{telemetry_port}"
+            self._telemetry_socket = self._zmq_ctx.socket(zmq.PUB)
+            self._telemetry_socket.setsockopt(zmq.LINGER, 0)
+            self._telemetry_socket.bind(telemetry_address)
+            logger.info(f"Publishing telemetry on {telemetry_address}.")
+
+        # ZMQ socket for the command stream.
+        self._command_socket = None
+        self._stream_filter = _CommandStreamFilter(command_max_age)
+        if command_port is not None:
+            command_address = f"tcp://{robot_ip}:{command_port}"
+            self._command_socket = self._zmq_ctx.socket(zmq.PULL)
+            self._command_socket.setsockopt(zmq.LINGER, 0)
+            self._command_socket.bind(command_address)
+            logger.info(f"Receiving commands on {command_address}.")
+
+        # Clients, and the client that has acquired control of the robot, if any.
+        self._clients: Dict[bytes, _ClientState] = {}
+        self._current_client: Optional[_ClientState] = None  # the client whose request is being handled
+        self._controller: Optional[_ClientState] = None
+        self._controller_last_active = 0.0
+        self._control_timeout = control_timeout
+
         # Stop process flag.
         self._should_stop = Event()
 
@@ -87,57 +334,255 @@ class TulipServer:
             ResetOdometryMessage.__name__: self._handle_reset_odometry_request,
             GetVelocityMessage.__name__: self._handle_get_velocity_request,
             HandshakeMessage.__name__: self._handle_handshake_request,
+            GetLoopStatisticsMessage.__name__: self._handle_get_loop_statistics_request,
+            AcquireControlMessage.__name__: self._handle_acquire_control_request,
+            ReleaseControlMessage.__name__: self._handle_release_control_request,
+            GetClientStatisticsMessage.__name__: self._handle_get_client_statistics_request,
+            GetPlatformStateMessage.__name__: self._handle_get_platform_state_request,
+            ExecuteVelocityTrajectoryMessage.__name__: self._handle_execute_velocity_trajectory_request,
+            CancelTrajectoryMessage.__name__: self._handle_cancel_trajectory_request,
+            GetTrajectoryStatusMessage.__name__: self._handle_get_trajectory_status_request,
+            MoveToPoseMessage.__name__: self._handle_move_to_pose_request,
+            CancelPoseGoalMessage.__name__: self._handle_cancel_pose_goal_request,
+            GetPoseGoalStatusMessage.__name__: self._handle_get_pose_goal_status_request,
+            AlignAndDriveMessage.__name__: self._handle_align_and_drive_request,
         }
 
-        # Robot platform.
-        self._platform = RobilePlatform(
-            robot_configuration.ecat_device, robot_configuration.wheel_configs, PlatformDriverType.VELOCITY
-        )
-        self._platform.init_ethercat()
-
+        # Robot platform, either in this process or in a separate EtherCAT process.
+        self._robot_configuration = robot_configuration
         self._loop_frequency = loop_frequency
+        self._ethercat_process = ethercat_process
+        num_drives = len(robot_configuration.wheel_configs)
+        if ethercat_process:
+            self._platform = None
+            self._channel = SharedMemoryChannel(num_drives)
+        else:
+            self._platform = _create_platform(robot_configuration)
+            self._platform.init_ethercat()
+            self._channel = PlatformChannel(num_drives)
+
+        self._ethercat_loop_scheduler = DeadlineLoop(loop_frequency)
+        self._realtime_settings: Optional[RealtimeSettings] = None
+        self._realtime_status = RealtimeStatus()
 
     def _request_loop(self):
-        """The request loop listens for incoming requests and handles them."""
+        """The request loop listens for incoming requests and handles them one at a time, in the order in which the
+        ROUTER socket fair-queues the requests of all clients. Handlers therefore must not block: they only exchange
+        commands and state with the EtherCAT loop over the `PlatformChannel`."""
         while not self._should_stop.is_set():
-            request = self._zmq_socket.recv_pyobj()
-            logger.info("Handling client request.")
-            response = self._handle_request(request)
+            # The routing id of the client, the envelope of its socket and the request.
+            frames = self._zmq_socket.recv_multipart()
+            if len(frames) < 2:
+                continue
+            logger.debug("Handling client request.")
+            self._current_client = self._get_client(frames[0])
+            response = self._handle_encoded_request(frames[-1])
             # Send response.
-            logger.info("Sending response to client.")
-            self._zmq_socket.send_pyobj(response)
+            logger.debug("Sending response to client.")
+            self._zmq_socket.send_multipart(frames[:-1] + [response])
+
+    def _get_client(self, client_id: bytes) -> _ClientState:
+        """Get the state of a client and record a request, forgetting clients that have been idle for long."""
+        now = time.monotonic()
+        client = self._clients.get(client_id)
+        if client is None:
+            for expired in [c for c in self._clients.values() if c.last_request_time < now - CLIENT_EXPIRY]:
+                del self._clients[expired.client_id]
+                if expired.command_stream_id is not None:
+                    self._stream_filter.forget(expired.command_stream_id)
+            client = self._clients[client_id] = _ClientState(client_id)
+        client.record_request(now)
+        if client is self._controller:
+            self._controller_last_active = now
+        return client
+
+    def _get_controller(self) -> Optional[_ClientState]:
+        """Get the client that has acquired control, releasing control if it has been inactive for too long."""
+        controller = self._controller
+        if controller is not None and time.monotonic() - self._controller_last_active > self._control_timeout:
+            logger.warning(f"Client {controller.client_id.hex()} lost control after {self._control_timeout} s.")
+            self._controller = controller = None
+        return controller
+
+    def _command_loop(self):
+        """The command loop receives the velocity targets of the command stream and applies the newest valid one of
+        every batch that arrived in the meantime. No responses are sent, so errors are only logged."""
+        while not self._should_stop.is_set():
+            if not self._command_socket.poll(COMMAND_POLL_TIMEOUT):
+                continue
+
+            newest = None
+            while True:
+                try:
+                    data = self._command_socket.recv(zmq.NOBLOCK)
+                except zmq.Again:
+                    break
+                receive_time = time.monotonic()
+                try:
+                    message = decode_message(data)
+                except ValueError as e:
+                    logger.warning(f"Invalid message on the command stream: {e}")
+                    continue
+                if not isinstance(message, StreamVelocityTargetMessage):
+                    logger.warning(f"Unexpected {type(message).__name__} on the command stream.")
+                    continue
+                controller = self._get_controller()
+                if controller is not None and message.stream_id != controller.command_stream_id:
+                    logger.debug("Dropping a velocity target of a client that does not have control.")
+                    continue
+                if self._stream_filter.accept(message, receive_time):
+                    newest = message
+
+            if newest is not None:
+                if self._controller is not None:
+                    self._controller_last_active = time.monotonic()
+                try:
+                    self._channel.set_platform_velocity_target(
+                        newest.vel_x, newest.vel_y, newest.vel_a, newest.timeout, newest.only_align_drives
+                    )
+                except ValueError as e:
+                    logger.error(f"Safety limits exceeded: {e}")
+
+    def _telemetry_loop(self):
+        """The telemetry loop publishes the latest state of the robot every few cycles of the EtherCAT loop."""
+        last_cycle = 0
+
+        def publish():
+            nonlocal last_cycle
+            state = self._channel.read_state()
+            if state.cycle == last_cycle:
+                return
+            last_cycle = state.cycle
+            process_data = state.process_data
+            voltage_bus = process_data["voltage_bus"].astype(np.float64)
+            telemetry = TelemetryMessage(
+                time=state.time,
+                cycle=state.cycle,
+                pose=state.pose,
+                velocity=state.velocity,
+                drives_aligned=state.drives_aligned,
+                status1=process_data["status1"],
+                status2=process_data["status2"],
+                voltage_bus=voltage_bus,
+                power=voltage_bus * process_data["current_in"],
+            )
+            self._telemetry_socket.send(encode_message(telemetry))
+
+        DeadlineLoop(self._telemetry_frequency).run(publish, self._should_stop)
 
     def _ethercat_loop(self):
         """The EtherCAT loop runs at a fixed frequency and steps the platform."""
-        while not self._should_stop.is_set():
-            start_ns = time.time_ns()
-            self._platform.step()
-            end_ns = time.time_ns()
-
-            # Sleep if required (most likely).
-            desired_duration = int((1 / self._loop_frequency) * 1e9)
-            actual_duration = end_ns - start_ns
-            if actual_duration < desired_duration:
-                sleep_s = (desired_duration - actual_duration) * 1e-9
-                logger.trace(f"Sleeping EtherCAT thread for {sleep_s} seconds.")
-                time.sleep(sleep_s)
-
-    def run(self):
-        """Run the server. Starts threads that listen for requests and run the EtherCAT loop."""
+        if self._realtime_settings is not None:
+            self._realtime_status = apply_realtime_settings(self._realtime_settings)
+            logger.info(f"Real-time settings of the EtherCAT loop: {self._realtime_status}.")
+            for message in self._realtime_status.messages:
+                logger.warning(message)
+
+        scheduler = self._ethercat_loop_scheduler
+        step = partial(_ethercat_step, self._channel, self._platform, scheduler, self._should_stop)
+        scheduler.run(step, self._should_stop, collect_garbage=self._realtime_status.gc_controlled)
+
+    def _run_ethercat_process(self):
+        """Run the EtherCAT loop in a separate process, until the server is stopped or the process ends."""
+        process = multiprocessing.get_context("spawn").Process(
+            target=_run_ethercat_process,
+            args=(
+                self._robot_configuration,
+                self._channel.name,
+                self._loop_frequency,
+                self._realtime_settings,
+            ),
+            name="EtherCAT",
+            daemon=True,
+        )
+        process.start()
+
+        while not self._should_stop.wait(0.1):
+            if not process.is_alive():
+                logger.error("The EtherCAT process stopped unexpectedly.")
+                self._should_stop.set()
+
+        self._channel.stop()
+        process.join(1.0)
+        if process.is_alive():
+            process.terminate()
+
+    @property
+    def realtime_status(self) -> RealtimeStatus:
+        """Which of the real-time settings passed to `run()` took effect. With an EtherCAT process, this is logged by
+        that process instead."""
+        return self._realtime_status
+
+    def run(self, realtime: Optional[RealtimeSettings] = None):
+        """Run the server. Starts threads that listen for requests and run the EtherCAT loop.
+
+        Args:
+            realtime: If set, run the EtherCAT loop in real-time mode: pinned to a dedicated core, with SCHED_FIFO
+                priority, locked memory and garbage collection in slack time only. Settings that require privileges
+                the server does not have are skipped, see `realtime_status`."""
         logger.info("Starting EtherCAT loop.")
         logger.info("Listening for requests.")
 
-        thread_ethercat = Thread(target=self._ethercat_loop, daemon=True)
+        self._realtime_settings = realtime
+        ethercat_loop = self._run_ethercat_process if self._ethercat_process else self._ethercat_loop
+        thread_ethercat = Thread(target=ethercat_loop, daemon=True)
         thread_ethercat.start()
 
+        # Keep the request thread off the core of the EtherCAT thread.
+        if realtime is not None and realtime.cpu is not None and not isolate_cpu(realtime.cpu):
+            logger.warning(f"Could not move the other threads off CPU {realtime.cpu}.")
+
         thread_requests = Thread(target=self._request_loop, daemon=True)
         thread_requests.start()
 
+        # Optional threads, with the socket that each of them owns.
+        optional_threads = []
+        if self._telemetry_socket is not None:
+            optional_threads.append((Thread(target=self._telemetry_loop, daemon=True), self._telemetry_socket))
+        if self._command_socket is not None:
+            optional_threads.append((Thread(target=self._command_loop, daemon=True), self._command_socket))
+        for thread, _ in optional_threads:
+            thread.start()
+
         # Run until stop flag set by joining EtherCAT thread
         thread_ethercat.join()
 
+        for thread, socket in optional_threads:
+            thread.join()
+            socket.close()
         self._zmq_socket.close()
         self._zmq_ctx.term()
+        if self._ethercat_process:
+            self._channel.close()
+            self._channel.unlink()
+
+    def _handle_encoded_request(self, data: bytes) -> bytes:
+        """Decode a request, handle it and encode the response, in the same encoding as the request.
+
+        Args:
+            data: The binary or pickled request message.
+
+        Returns:
+            The binary or pickled response message."""
+        if is_binary_message(data):
+            try:
+                request = decode_message(data)
+            except ValueError as e:
+                logger.error(f"Invalid request: {e}")
+                return encode_message(ErrorResponse("Invalid request", str(e)))
+            return encode_message(self._handle_request(request))
+
+        # Refusals are pickled as well, so that pickling clients can decode them.
+        if not self._allow_pickle:
+            logger.error("Refusing pickled request.")
+            response = ErrorResponse("Invalid request", "Pickled requests are not allowed by the server")
+            return pickle.dumps(response, pickle.DEFAULT_PROTOCOL)
+        try:
+            request = pickle.loads(data)
+        except Exception as e:
+            logger.error(f"Invalid request: {e}")
+            return pickle.dumps(ErrorResponse("Invalid request", str(e)), pickle.DEFAULT_PROTOCOL)
+        return pickle.dumps(self._handle_request(request), pickle.DEFAULT_PROTOCOL)
 
     def _handle_request(self, request: RequestMessage) -> ResponseMessage:
         """Handle a request message and return a response message.
@@ -149,8 +594,22 @@ class TulipServer:
             The response."""
         # Delegate based on the request class.
         request_class_name = type(request).__name__
-        logger.info(f"Request type: {request_class_name}.")
-        return self._request_handlers[request_class_name](request)
+        logger.debug(f"Request type: {request_class_name}.")
+        handler = self._request_handlers.get(request_class_name)
+        if handler is None:
+            logger.error(f"Unknown request type: {request_class_name}.")
+            return ErrorResponse("Unknown request", f"The server does not handle {request_class_name} messages")
+        if isinstance(request, CONTROL_MESSAGES):
+            controller = self._get_controller()
+            if controller is not None and controller is not self._current_client:
+                logger.error(f"Refusing {request_class_name}, client {controller.client_id.hex()} has control.")
+                return ErrorResponse("Not in control", f"Client {controller.client_id.hex()} has control of the robot")
+        # A single thread serves all clients, so a failing request must not stop it.
+        try:
+            return handler(request)
+        except Exception as e:
+            logger.exception(f"Failed to handle {request_class_name}.")
+            return ErrorResponse("Request failed", f"{type(e).__name__}: {e}")
 
     def _handle_set_platform_velocity_target_request(
         self, request: SetPlatformVelocityTargetMessage
@@ -166,14 +625,30 @@ class TulipServer:
         Raises:
             An ErrorResponse if the safety limits are exceeded."""
         try:
-            self._platform.driver.set_platform_velocity_target(
+            self._channel.set_platform_velocity_target(
                 request.vel_x,
                 request.vel_y,
                 request.vel_a,
                 request.timeout,
                 request.only_align_drives,
             )
-            logger.info("Request handled successfully.")
+            logger.debug("Request handled successfully.")
+            return OkResponse()
+        except ValueError as e:
+            logger.error(f"Safety limits exceeded: {e}")
+            return ErrorResponse("Safety limits exceeded", str(e))
+
+    def _handle_align_and_drive_request(self, request: AlignAndDriveMessage) -> ResponseMessage:
+        """Handle a request to align the drives, then drive at a platform velocity target."""
+        try:
+            self._channel.align_and_drive(
+                request.vel_x,
+                request.vel_y,
+                request.vel_a,
+                request.timeout,
+                request.alignment_tolerance,
+                request.alignment_timeout,
+            )
             return OkResponse()
         except ValueError as e:
             logger.error(f"Safety limits exceeded: {e}")
@@ -181,17 +656,16 @@ class TulipServer:
 
     def _handle_are_drives_aligned_request(self, _request: AreDrivesAlignedMessage) -> ResponseMessage:
         """Handle a request to check if the drives are aligned."""
-        aligned = self._platform.driver.are_drives_aligned()
-        return AreDrivesAlignedResponse(aligned)
+        return AreDrivesAlignedResponse(self._channel.are_drives_aligned())
 
     def _handle_reset_odometry_request(self, _request: ResetOdometryMessage) -> ResponseMessage:
         """Handle a request to reset the odometry."""
-        self._platform.monitor.reset_odometry()
+        self._channel.reset_odometry()
         return OkResponse()
 
     def _handle_set_driver_type_request(self, request: SetDriverTypeMessage) -> ResponseMessage:
         """Handle a request to set the driver type (velocity or compliant mode)."""
-        self._platform.driver.set_driver_type(request.driver_type)
+        self._channel.set_driver_type(request.driver_type)
         return OkResponse()
 
     def _handle_stop_server_request(self, _request: StopServerMessage) -> ResponseMessage:
@@ -202,13 +676,140 @@ class TulipServer:
 
     def _handle_get_odometry_request(self, _request: GetOdometryMessage) -> ResponseMessage:
         """Handle a request to get the odometry."""
-        odometry = self._platform.monitor.get_estimated_robot_pose()
-        return OdometryResponse(odometry)
+        return OdometryResponse(self._channel.read_state().pose.copy())
 
     def _handle_get_velocity_request(self, _request: GetVelocityMessage) -> ResponseMessage:
         """Handle a request to get the velocity."""
-        velocity = self._platform.monitor.get_estimated_velocity()
-        return VelocityResponse(velocity)
+        return VelocityResponse(self._channel.read_state().velocity.copy())
+
+    def _handle_get_loop_statistics_request(self, _request: GetLoopStatisticsMessage) -> ResponseMessage:
+        """Handle a request to get the timing statistics of the EtherCAT loop."""
+        return LoopStatisticsResponse(self._channel.read_state().loop_statistics)
+
+    def _handle_get_platform_state_request(self, request: GetPlatformStateMessage) -> ResponseMessage:
+        """Handle a request to get the requested field groups of the platform state, all from the same cycle."""
+        state = self._channel.read_state()
+        fields = PlatformStateField(request.fields)
+        response = PlatformStateResponse(fields, state.time, state.cycle)
+        if fields & PlatformStateField.POSE:
+            response.pose = state.pose.copy()
+        if fields & PlatformStateField.VELOCITY:
+            response.velocity = state.velocity.copy()
+        if fields & PlatformStateField.TARGET_VELOCITY:
+            response.target_velocity = state.target_velocity.copy()
+            response.ramped_velocity = state.ramped_velocity.copy()
+        if fields & PlatformStateField.ALIGNMENT:
+            response.drives_aligned = state.drives_aligned
+        if fields & PlatformStateField.DRIVER:
+            response.driver_type = state.driver_type
+            response.driver_state = state.driver_state
+        if fields & PlatformStateField.DRIVES:
+            process_data = state.process_data
+            response.status1 = process_data["status1"].copy()
+            response.status2 = process_data["status2"].copy()
+            response.voltage_bus = process_data["voltage_bus"].astype(np.float64)
+            response.current_in = process_data["current_in"].astype(np.float64)
+            response.motor_current = np.stack(
+                [process_data["current_1_d"], process_data["current_2_d"]], axis=1
+            ).astype(np.float64)
+            response.temperature = np.stack(
+                [process_data["temperature_1"], process_data["temperature_2"], process_data["temperature_imu"]], axis=1
+            ).astype(np.float64)
+        return response
+
+    def _handle_execute_velocity_trajectory_request(
+        self, request: ExecuteVelocityTrajectoryMessage
+    ) -> ResponseMessage:
+        """Handle a request to execute a velocity trajectory, which starts at the next cycle of the EtherCAT loop."""
+        try:
+            status = self._channel.execute_velocity_trajectory(request.samples, request.preempt)
+        except ValueError as e:
+            logger.error(f"Invalid trajectory: {e}")
+            return ErrorResponse("Invalid trajectory", str(e))
+        except RuntimeError as e:
+            return ErrorResponse("Trajectory running", str(e))
+        logger.info(f"Executing trajectory {status.trajectory_id}.")
+        return TrajectoryStatusResponse(status)
+
+    def _handle_cancel_trajectory_request(self, _request: CancelTrajectoryMessage) -> ResponseMessage:
+        """Handle a request to cancel the running trajectory."""
+        self._channel.cancel_trajectory()
+        return OkResponse()
+
+    def _handle_get_trajectory_status_request(self, _request: GetTrajectoryStatusMessage) -> ResponseMessage:
+        """Handle a request to get the progress of the latest trajectory."""
+        return TrajectoryStatusResponse(self._channel.read_state().trajectory_status)
+
+    def _handle_move_to_pose_request(self, request: MoveToPoseMessage) -> ResponseMessage:
+        """Handle a request to drive to a goal pose, which starts at the next cycle of the EtherCAT loop."""
+        goal = PoseGoal(
+            x=request.x,
+            y=request.y,
+            a=request.a,
+            relative=request.relative,
+            max_vel_linear=request.max_vel_linear,
+            max_vel_angular=request.max_vel_angular,
+            position_tolerance=request.position_tolerance,
+            angle_tolerance=request.angle_tolerance,
+            timeout=request.timeout,
+        )
+        try:
+            goal_id = self._channel.move_to_pose(goal)
+        except ValueError as e:
+            logger.error(f"Invalid pose goal: {e}")
+            return ErrorResponse("Invalid pose goal", str(e))
+        logger.info(f"Moving to pose goal {goal_id}.")
+        # A relative goal is only known in the odometry frame once the EtherCAT loop starts it.
+        goal_pose = np.full(3, np.nan) if goal.relative else np.array([goal.x, goal.y, goal.a])
+        return PoseGoalStatusResponse(PoseGoalStatus(goal_id, PoseGoalState.RUNNING, goal_pose))
+
+    def _handle_cancel_pose_goal_request(self, _request: CancelPoseGoalMessage) -> ResponseMessage:
+        """Handle a request to cancel the pose goal."""
+        self._channel.cancel_pose_goal()
+        return OkResponse()
+
+    def _handle_get_pose_goal_status_request(self, _request: GetPoseGoalStatusMessage) -> ResponseMessage:
+        """Handle a request to get the progress of the latest pose goal."""
+        status = self._channel.read_state().pose_goal_status
+        return PoseGoalStatusResponse(replace(status, goal=status.goal.copy()))
+
+    def _handle_acquire_control_request(self, request: AcquireControlMessage) -> ResponseMessage:
+        """Handle a request to acquire control of the robot."""
+        controller = self._get_controller()
+        client = self._current_client
+        if controller is not None and controller is not client:
+            return ErrorResponse("Not in control", f"Client {controller.client_id.hex()} has control of the robot")
+        if client.command_stream_id is not None and client.command_stream_id != request.stream_id:
+            self._stream_filter.forget(client.command_stream_id)
+        client.command_stream_id = request.stream_id
+        self._controller_last_active = time.monotonic()
+        self._controller = client
+        logger.info(f"Client {client.client_id.hex()} acquired control.")
+        return OkResponse()
+
+    def _handle_release_control_request(self, _request: ReleaseControlMessage) -> ResponseMessage:
+        """Handle a request to release control of the robot."""
+        if self._controller is self._current_client:
+            self._controller = None
+            self._stream_filter.forget(self._current_client.command_stream_id)
+            logger.info(f"Client {self._current_client.client_id.hex()} released control.")
+        return OkResponse()
+
+    def _handle_get_client_statistics_request(self, _request: GetClientStatisticsMessage) -> ResponseMessage:
+        """Handle a request to get the request statistics of all clients."""
+        now = time.monotonic()
+        controller = self._get_controller()
+        clients = [
+            ClientStatistics(
+                client_id=client.client_id.hex(),
+                requests=client.requests,
+                request_rate=client.request_rate(now),
+                last_request_age=now - client.last_request_time,
+                in_control=client is controller,
+            )
+            for client in self._clients.values()
+        ]
+        return ClientStatisticsResponse(clients)
 
     def _handle_handshake_request(self, request: HandshakeMessage) -> ResponseMessage:
         """Handle a handshake request."""
@@ -0,0 +1,80 @@
+"""Time base of the EtherCAT loop, used for odometry, velocity ramping, torque control and timeouts."""
+
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from airo_tulip.hardware.process_data import ProcessDataSnapshot
+
+
+class CycleClock(ABC):
+    """Time base of the EtherCAT loop. Advanced once per cycle by the `RobilePlatform`, after receiving the process data.
+
+    Times are in seconds, relative to the first cycle, such that all components share the same time base and
+    differences between cycles are free of the scheduling jitter of the Python process where possible."""
+
+    def __init__(self):
+        self._time_ns = 0
+
+    @property
+    def now(self) -> float:
+        """The time (s) of the current cycle."""
+        return self._time_ns * 1e-9
+
+    def update(self, process_data: ProcessDataSnapshot) -> float:
+        """Advance the clock to the current cycle.
+
+        Args:
+            process_data: The process data of all drives for this cycle.
+
+        Returns:
+            The time (s) of the current cycle."""
+        self._time_ns += self._delta_time_ns(process_data)
+        return self.now
+
+    @abstractmethod
+    def _delta_time_ns(self, process_data: ProcessDataSnapshot) -> int:
+        """Compute the time (ns) since the previous cycle."""
+
+
+class MonotonicClock(CycleClock):
+    """Time base that follows the monotonic clock of the host, sampled at the start of every cycle."""
+
+    def __init__(self):
+        super().__init__()
+        self._last_monotonic_ns: Optional[int] = None
+
+    def _delta_time_ns(self, process_data: ProcessDataSnapshot) -> int:
+        monotonic_ns = time.monotonic_ns()
+        delta_ns = monotonic_ns - self._last_monotonic_ns if self._last_monotonic_ns is not None else 0
+        self._last_monotonic_ns = monotonic_ns
+        return delta_ns
+
+
+class SensorTimestampClock(MonotonicClock):
+    """Time base that follows the EtherCAT timestamps of sensor acquisition (`sensor_ts`) of the drives.
+
+    The newest timestamp of all drives is used. When no valid timestamp is available, e.g., when the drives are not
+    (yet) reporting timestamps or a timestamp jumps, the time since the previous cycle is measured with the monotonic
+    clock of the host instead. With a `SimulatedMaster`, the timestamps follow the simulated time, such that the platform
+    can run faster than real time."""
+
+    def __init__(self, max_delta_time: float = 1.0):
+        """Initialise the clock.
+
+        Args:
+            max_delta_time: Timestamp differences between two cycles that are larger than this (s) are considered
+                invalid (default: 1.0)."""
+        super().__init__()
+        self._max_delta_time_ns = round(max_delta_time * 1e9)
+        self._last_sensor_ts = 0
+
+    def _delta_time_ns(self, process_data: ProcessDataSnapshot) -> int:
+        monotonic_delta_ns = super()._delta_time_ns(process_data)
+
+        sensor_ts = int(process_data["sensor_ts"].max()) if len(process_data) > 0 else 0
+        sensor_delta_ns = sensor_ts - self._last_sensor_ts
+        valid = self._last_sensor_ts > 0 and 0 < sensor_delta_ns <= self._max_delta_time_ns
+        self._last_sensor_ts = sensor_ts
+
+        return sensor_delta_ns if valid else monotonic_delta_ns
@@ -38,3 +38,13 @@ class Controller:
             wheel_param.pivot_offset = wheel_config.a
 
             self._wheel_params.append(wheel_param)
+
+        # Per-drive geometry as arrays, for computations over all drives at once.
+        self._pivot_positions = np.array([wp.pivot_position for wp in self._wheel_params]).reshape((-1, 2))
+        self._pivot_offsets = np.array([wp.pivot_offset for wp in self._wheel_params])
+        self._relative_positions_l = np.array([wp.relative_position_l for wp in self._wheel_params]).reshape((-1, 2))
+        self._relative_positions_r = np.array([wp.relative_position_r for wp in self._wheel_params]).reshape((-1, 2))
+        self._linear_to_angular_velocities = np.array([wp.linear_to_angular_velocity for wp in self._wheel_params])
+        self._max_linear_velocities = np.array([wp.max_linear_velocity for wp in self._wheel_params])
+        self._max_pivot_errors = np.array([wp.max_pivot_error for wp in self._wheel_params])
+        self._pivot_kps = np.array([wp.pivot_kp for wp in self._wheel_params])
@@ -2,7 +2,7 @@
 
 import math
 import time
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 import numpy as np
 from airo_tulip.hardware.controllers.controller import Controller
@@ -10,6 +10,8 @@ from airo_tulip.hardware.structs import Attitude2DType, PlatformLimits, WheelCon
 from airo_tulip.hardware.util import clip, clip_angle, get_shortest_angle
 from airo_typing import Vector2DType
 
+PIVOT_FLIP_HYSTERESIS = 0.2  # rad, margin around a quarter turn before a drive changes its driving direction
+
 
 class VelocityPlatformController(Controller):
     """Control the Robile platform with velocity commands."""
@@ -26,6 +28,13 @@ class VelocityPlatformController(Controller):
         self._time_last_ramping: float | None = None
         self._should_align_drives = True
 
+        # Whether each drive drives backwards, with its pivot opposite to the velocity at the pivot, see
+        # `_choose_pivot_directions`.
+        self._pivots_flipped = np.zeros((self._num_wheels,), dtype=bool)
+
+        # Pivot errors of the last wheel setpoints, while the velocity target is unchanged, see `were_drives_aligned`.
+        self._pivot_errors: Optional[np.ndarray] = None
+
     @staticmethod
     def get_pivot_angle(wheel_param: WheelParamVelocity, pivot_encoder_value: float) -> float:
         """Compute the pivot angle, clipped between -pi and pi, for the current pivot rotation.
@@ -116,6 +125,19 @@ class VelocityPlatformController(Controller):
         self._platform_target_vel[1] = 0.0 if (abs(vel_y) < 0.0000001) else vel_y
         self._platform_target_vel[2] = 0.0 if (abs(vel_a) < 0.0000001) else vel_a
         self._only_align_drives = only_align_drives
+        self._pivot_errors = None
+
+    def get_platform_target_velocity(self) -> Attitude2DType:
+        """Get the target velocity (x, y, a) of the platform."""
+        return self._platform_target_vel.copy()
+
+    def get_platform_limits(self) -> PlatformLimits:
+        """Get the velocity, acceleration and deceleration limits of the platform."""
+        return self._platform_limits
+
+    def get_platform_ramped_velocity(self) -> Attitude2DType:
+        """Get the velocity (x, y, a) of the platform after ramping, towards the target velocity."""
+        return self._platform_ramped_vel.copy()
 
     def set_platform_max_velocity(self, max_vel_linear: float, max_vel_angular: float) -> None:
         """Set the maximum velocity that the platform is allowed to drive at.
@@ -136,9 +158,13 @@ class VelocityPlatformController(Controller):
         self._platform_limits.max_dec_linear = max_dec_linear
         self._platform_limits.max_dec_angular = max_dec_angular
 
-    def calculate_platform_ramped_velocities(self) -> None:
-        """Calculate (and store) the ramped velocities for the platform based on the (stored) target velocities."""
-        now = time.time()
+    def calculate_platform_ramped_velocities(self, now: Optional[float] = None) -> None:
+        """Calculate (and store) the ramped velocities for the platform based on the (stored) target velocities.
+
+        Args:
+            now: The time (s) of the current cycle (default: the monotonic clock)."""
+        if now is None:
+            now = time.monotonic()
 
         # Skip first time this function is called because time_delta does not make sense otherwise
         if self._time_last_ramping is None:
@@ -223,23 +249,94 @@ class VelocityPlatformController(Controller):
         # Calculate error pivot angle as shortest route
         pivot_error = get_shortest_angle(target_pivot_angle, pivot_angle)
 
+        # Steer to the nearest of the target angle and its opposite, see `_choose_pivot_directions`.
+        moving = target_vel_at_pivot[0] != 0.0 or target_vel_at_pivot[1] != 0.0
+        flipped = self._pivots_flipped[drive_index]
+        if moving:
+            flipped = abs(pivot_error) > (
+                math.pi / 2 - PIVOT_FLIP_HYSTERESIS if flipped else math.pi / 2 + PIVOT_FLIP_HYSTERESIS
+            )
+            self._pivots_flipped[drive_index] = flipped
+        if flipped:
+            pivot_error -= math.copysign(math.pi, pivot_error)
+
         return pivot_error
 
-    def are_drives_aligned(self, encoder_pivots: List[float], max_pivot_error: float = 0.25) -> bool:
+    def _compute_pivot_errors(self, raw_pivot_angles: np.ndarray) -> np.ndarray:
+        """Compute the raw pivot errors for all drives, see `_compute_pivot_error`.
+
+        Args:
+            raw_pivot_angles: Encoder pivot values for all drives.
+
+        Returns:
+            Errors of the drive pivots (radians) w.r.t. target angle of the platform."""
+        vx, vy, va = self._platform_ramped_vel
+
+        # Target pivot angle from the velocity target vector at the pivot positions.
+        target_vel_x = vx - va * self._pivot_positions[:, 1]
+        target_vel_y = vy + va * self._pivot_positions[:, 0]
+        target_pivot_angles = np.arctan2(target_vel_y, target_vel_x)
+
+        # Shortest route from pivot angle to target angle. The pivot angle does not need to be clipped to [-pi, pi].
+        delta = target_pivot_angles - (raw_pivot_angles - self._pivot_offsets)
+        pivot_errors = np.arctan2(np.sin(delta), np.cos(delta))
+
+        return self._choose_pivot_directions(pivot_errors, (target_vel_x != 0.0) | (target_vel_y != 0.0))
+
+    def _choose_pivot_directions(self, pivot_errors: np.ndarray, moving: np.ndarray) -> np.ndarray:
+        """Choose, for all drives, whether to steer the pivot to the target angle, or to the opposite angle and drive
+        backwards, whichever is closer. A reversal of the platform then does not turn the pivots half a turn before it
+        can move. The wheel setpoints follow from the projection of the target velocity on the pivot direction, so a
+        flipped pivot spins its wheels backwards.
+
+        A drive only changes its choice once its pivot error exceeds a quarter turn by `PIVOT_FLIP_HYSTERESIS`, so that
+        it does not chatter around a quarter turn. Drives without velocity at their pivot keep their choice.
+
+        Args:
+            pivot_errors: Errors of the drive pivots (radians) w.r.t. target angle of the platform.
+            moving: Whether the target velocity at the pivot is non-zero, for all drives.
+
+        Returns:
+            Errors of the drive pivots (radians) w.r.t. the chosen angle."""
+        thresholds = np.where(
+            self._pivots_flipped, math.pi / 2 - PIVOT_FLIP_HYSTERESIS, math.pi / 2 + PIVOT_FLIP_HYSTERESIS
+        )
+        np.copyto(self._pivots_flipped, np.abs(pivot_errors) > thresholds, where=moving)
+        return np.where(self._pivots_flipped, pivot_errors - np.copysign(math.pi, pivot_errors), pivot_errors)
+
+    def are_drives_aligned(
+        self, encoder_pivots: List[float], max_pivot_error: float = 0.25, reset_ramping: bool = True
+    ) -> bool:
         """Returns true when all drives are approximately aligned to drive in the correct direction.
 
         Args:
             encoder_pivots: Encoder pivot values for all drives.
             max_pivot_error: If ALL pivot errors are smaller than this angle (radians), the drives are considered aligned.
+            reset_ramping: If true, reset the velocity ramping when the drives are not aligned (default: True).
 
         Returns:
             True when all drives are approximately aligned to drive in the correct direction."""
-        for drive_index in range(len(self._wheel_params)):
-            pivot_error = np.abs(self._compute_pivot_error(drive_index, encoder_pivots[drive_index]))
-            if pivot_error > max_pivot_error:
+        pivot_errors = np.abs(self._compute_pivot_errors(np.asarray(encoder_pivots, dtype=np.float64)))
+        if np.any(pivot_errors > max_pivot_error):
+            if reset_ramping:
                 # Reset velocity ramping so that we don't get sudden accelerations once drives are aligned.
                 self._time_last_ramping = None
-                return False
+            return False
+        return True
+
+    def were_drives_aligned(self, max_pivot_error: float = 0.25, reset_ramping: bool = True) -> Optional[bool]:
+        """Same as `are_drives_aligned`, for the encoder pivot values of the last `calculate_wheel_target_velocities`
+        call, without computing the pivot errors again.
+
+        Returns:
+            Whether all drives are approximately aligned, or None if the pivot errors are not available because the
+            platform was commanded zero velocity or the velocity target was set since."""
+        if self._pivot_errors is None:
+            return None
+        if np.any(np.abs(self._pivot_errors) > max_pivot_error):
+            if reset_ramping:
+                self._time_last_ramping = None
+            return False
         return True
 
     def calculate_wheel_target_velocity(self, drive_index: int, raw_pivot_angle: float) -> Tuple[float, float]:
@@ -307,6 +404,74 @@ class VelocityPlatformController(Controller):
 
         return target_ang_vel_r, target_ang_vel_l
 
+    def calculate_wheel_target_velocities(self, raw_pivot_angles: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calculate the wheel velocity setpoints of all drives at once, see `calculate_wheel_target_velocity`.
+
+        Args:
+            raw_pivot_angles: Encoder pivot values for all drives.
+
+        Returns:
+            The target velocities for the right and left wheels of all drives, respectively.
+        """
+        raw_pivot_angles = np.asarray(raw_pivot_angles, dtype=np.float64)
+
+        # Command 0 angular vel when platform has been commanded 0 vel, see `calculate_wheel_target_velocity`.
+        if (
+            self._platform_ramped_vel[0] == 0
+            and self._platform_ramped_vel[1] == 0
+            and self._platform_ramped_vel[2] == 0
+        ):
+            self._pivot_errors = None
+            return np.zeros((self._num_wheels,)), np.zeros((self._num_wheels,))
+
+        # Pivot angles to unity vectors
+        pivot_angles = raw_pivot_angles - self._pivot_offsets
+        cos_pivot = np.cos(pivot_angles)
+        sin_pivot = np.sin(pivot_angles)
+
+        # Calculate error pivot angles as shortest route, and limit pivot velocity
+        self._pivot_errors = self._compute_pivot_errors(raw_pivot_angles)
+        pivot_errors = np.clip(self._pivot_errors, -self._max_pivot_errors, self._max_pivot_errors)
+
+        # Differential correction speed to minimise pivot_error
+        delta_vel = pivot_errors * self._pivot_kps
+
+        if self._only_align_drives:
+            # No forward velocities, see `calculate_wheel_target_velocity`.
+            vel_l = np.zeros((self._num_wheels,))
+            vel_r = np.zeros((self._num_wheels,))
+        else:
+            vel_l = self._velocity_along_pivot(self._relative_positions_l, cos_pivot, sin_pivot)
+            vel_r = self._velocity_along_pivot(self._relative_positions_r, cos_pivot, sin_pivot)
+
+        target_vel_l = np.clip(vel_l - delta_vel, -self._max_linear_velocities, self._max_linear_velocities)
+        target_vel_r = np.clip(vel_r + delta_vel, -self._max_linear_velocities, self._max_linear_velocities)
+
+        # Convert from linear to angular velocity
+        return target_vel_r * self._linear_to_angular_velocities, target_vel_l * self._linear_to_angular_velocities
+
+    def _velocity_along_pivot(
+        self, relative_positions: np.ndarray, cos_pivot: np.ndarray, sin_pivot: np.ndarray
+    ) -> np.ndarray:
+        """Compute, for all drives, the target velocity of a wheel projected on the pivot direction.
+
+        Args:
+            relative_positions: Position of the wheel relative to the pivot, for all drives.
+            cos_pivot: Cosine of the pivot angle, for all drives.
+            sin_pivot: Sine of the pivot angle, for all drives.
+
+        Returns:
+            The dot product of the target velocity vector at the wheel position with the unit pivot vector."""
+        vx, vy, va = self._platform_ramped_vel
+
+        # Position of wheels relative to platform centre
+        x = self._pivot_positions[:, 0] + relative_positions[:, 0] * cos_pivot - relative_positions[:, 1] * sin_pivot
+        y = self._pivot_positions[:, 1] + relative_positions[:, 0] * sin_pivot + relative_positions[:, 1] * cos_pivot
+
+        # Target velocity vector at wheel position, dot product with unit pivot vector
+        return (vx - va * y) * cos_pivot + (vy + va * x) * sin_pivot
+
 
 # Tests
 if __name__ == "__main__":
@@ -1,5 +1,7 @@
 import ctypes
 
+import numpy as np
+
 STAT1_ENABLED1 = 0x0001
 STAT1_ENABLED2 = 0x0002
 STAT1_ENC_1_OK = 0x0004
@@ -81,6 +83,22 @@ class TxPDO1(ctypes.Structure):
     ]
 
 
+def _structure_dtype(structure: type) -> np.dtype:
+    """Create a NumPy dtype with the same (packed) field layout as a little-endian ctypes structure."""
+    formats = {ctypes.c_uint16: "<u2", ctypes.c_uint64: "<u8", ctypes.c_float: "<f4"}
+    return np.dtype(
+        {
+            "names": [name for name, _ in structure._fields_],
+            "formats": [formats[ctype] for _, ctype in structure._fields_],
+            "offsets": [getattr(structure, name).offset for name, _ in structure._fields_],
+            "itemsize": ctypes.sizeof(structure),
+        }
+    )
+
+
+TXPDO1_DTYPE = _structure_dtype(TxPDO1)
+"""NumPy dtype mirroring `TxPDO1`, to decode the process data of multiple drives at once."""
+
 # From https://github.com/kelo-robotics/kelo_tulip/blob/1a8db0626b3d399b62b65b31c004e7b1831756d7/include/kelo_tulip/soem/ethercattype.h#L157
 EC_STATE_SAFE_OP = 0x04
 EC_STATE_OPERATIONAL = 0x08
@@ -0,0 +1,624 @@
+"""Lock-free channel between the request handlers of the TulipServer and the EtherCAT loop.
+
+The channel holds two records: commands, written by the request handlers and applied by the EtherCAT loop at the start
+of every cycle, and the platform state, published by the EtherCAT loop at the end of every cycle. Each record has a
+single writer and is protected by a sequence lock: the writer increments the sequence number before and after writing,
+and readers retry until they have copied the record without a write in between. Neither side ever blocks the other, so
+a slow or busy request handler cannot delay a control cycle, and handlers always see the state of a single, complete
+cycle.
+
+The records live in an ordinary buffer when the EtherCAT loop runs in a thread (`PlatformChannel`), or in shared memory
+when it runs in a separate process (`SharedMemoryChannel`). Note that the sequence lock relies on stores and loads not
+being reordered with each other, as is the case on x86."""
+
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from threading import Lock
+from typing import Iterator, Optional
+
+import numpy as np
+from airo_tulip.hardware.ethercat import TXPDO1_DTYPE
+from airo_tulip.hardware.platform_driver import (
+    PlatformDriverState,
+    PlatformDriverType,
+    check_alignment_parameters,
+    check_platform_velocity_target,
+)
+from airo_tulip.hardware.pose_goal import (
+    POSE_GOAL_COMMAND_TIMEOUT,
+    PoseGoal,
+    PoseGoalController,
+    PoseGoalState,
+    PoseGoalStatus,
+    check_pose_goal,
+)
+from airo_tulip.hardware.process_data import ProcessDataSnapshot
+from airo_tulip.hardware.realtime import LATENCY_BIN_EDGES_US, LoopStatistics
+from airo_tulip.hardware.robile_platform import RobilePlatform
+from airo_tulip.hardware.structs import Attitude2DType
+from airo_tulip.hardware.trajectory import (
+    MAX_TRAJECTORY_SAMPLES,
+    TRAJECTORY_COMMAND_TIMEOUT,
+    TrajectoryState,
+    TrajectoryStatus,
+    VelocityTrajectoryExecutor,
+    check_velocity_trajectory,
+)
+from airo_typing import Vector3DType
+
+COMMAND_DTYPE = np.dtype(
+    [
+        ("seq", np.int64),
+        ("stop", np.bool_),
+        # Every command has a counter, which is incremented for every new command.
+        ("velocity_counter", np.int64),
+        ("vel_x", np.float64),
+        ("vel_y", np.float64),
+        ("vel_a", np.float64),
+        ("timeout", np.float64),
+        ("only_align_drives", np.bool_),
+        ("align_first", np.bool_),  # see `PlatformDriver.align_and_drive`
+        ("alignment_tolerance", np.float64),
+        ("alignment_timeout", np.float64),
+        ("driver_type_counter", np.int64),
+        ("driver_type", np.int32),
+        ("reset_odometry_counter", np.int64),
+        ("align_check_counter", np.int64),
+        # The counter of a trajectory is also its id, the samples are in the trajectory record.
+        ("trajectory_counter", np.int64),
+        ("cancel_trajectory_counter", np.int64),
+        # The counter of a pose goal is also its id.
+        ("pose_goal_counter", np.int64),
+        ("goal_x", np.float64),
+        ("goal_y", np.float64),
+        ("goal_a", np.float64),
+        ("goal_relative", np.bool_),
+        ("goal_max_vel_linear", np.float64),
+        ("goal_max_vel_angular", np.float64),
+        ("goal_position_tolerance", np.float64),
+        ("goal_angle_tolerance", np.float64),
+        ("goal_timeout", np.float64),
+        ("cancel_pose_goal_counter", np.int64),
+    ],
+    align=True,
+)
+"""Layout of the command record, written by the request handlers."""
+
+TRAJECTORY_DTYPE = np.dtype(
+    [
+        ("seq", np.int64),
+        # The id is written together with the samples, so it always matches them.
+        ("trajectory_id", np.int64),
+        ("num_samples", np.int64),
+        ("samples", np.float64, (MAX_TRAJECTORY_SAMPLES, 4)),
+    ],
+    align=True,
+)
+"""Layout of the trajectory record, written by the request handlers and only read by the EtherCAT loop when a new
+trajectory is sent."""
+
+READ_RETRY_SLEEP = 1e-5  # s, back-off while a record is being written
+
+
+def state_dtype(num_drives: int) -> np.dtype:
+    """Layout of the state record of a platform with `num_drives` drives, written by the EtherCAT loop."""
+    return np.dtype(
+        [
+            ("seq", np.int64),
+            ("cycle", np.int64),
+            ("time", np.float64),  # time of the cycle, see `CycleClock`
+            ("pose", np.float64, (3,)),
+            ("velocity", np.float64, (3,)),
+            ("target_velocity", np.float64, (3,)),
+            ("ramped_velocity", np.float64, (3,)),
+            ("driver_type", np.int32),
+            ("driver_state", np.int32),
+            ("drives_aligned", np.bool_),
+            ("process_data", TXPDO1_DTYPE, (num_drives,)),
+            ("loop_frequency", np.float64),
+            ("loop_cycles", np.uint64),
+            ("loop_missed_deadlines", np.uint64),
+            ("loop_period_mean", np.float64),
+            ("loop_period_min", np.float64),
+            ("loop_period_max", np.float64),
+            ("loop_latency_max", np.float64),
+            ("loop_step_duration_mean", np.float64),
+            ("loop_step_duration_max", np.float64),
+            ("loop_gc_collections", np.uint64),
+            ("loop_latency_histogram", np.uint64, (len(LATENCY_BIN_EDGES_US),)),
+            ("trajectory_id", np.int64),
+            ("trajectory_state", np.int32),
+            ("trajectory_elapsed", np.float64),
+            ("trajectory_duration", np.float64),
+            ("pose_goal_id", np.int64),
+            ("pose_goal_state", np.int32),
+            ("pose_goal", np.float64, (3,)),
+            ("pose_goal_position_error", np.float64),
+            ("pose_goal_angle_error", np.float64),
+        ],
+        align=True,
+    )
+
+
+@dataclass(frozen=True)
+class PlatformStateSnapshot:
+    """Immutable state of the platform at the end of a single EtherCAT cycle."""
+
+    cycle: int  # number of the cycle, 0 before the first cycle
+    time: float  # time (s) of the cycle, see `CycleClock`
+    pose: Attitude2DType  # estimated pose
+    velocity: Vector3DType  # estimated velocity
+    target_velocity: Vector3DType  # velocity target, zero after it timed out
+    ramped_velocity: Vector3DType  # velocity that the drives are commanded to, ramped towards the target
+    driver_type: Optional[PlatformDriverType]  # None before the first cycle
+    driver_state: PlatformDriverState  # UNDEFINED before the first cycle
+    drives_aligned: bool  # whether the drives are aligned with the last velocity target
+    process_data: ProcessDataSnapshot  # process data of all drives
+    loop_statistics: LoopStatistics  # updated at the rate of the diagnostics, see `PlatformTaskRates`
+    trajectory_status: TrajectoryStatus  # progress of the latest trajectory
+    pose_goal_status: PoseGoalStatus  # progress of the latest pose goal
+
+    @classmethod
+    def from_record(cls, record: np.ndarray) -> "PlatformStateSnapshot":
+        """Create a snapshot from a copy of the state record, see `state_dtype`."""
+        # The arrays are read-only views on the copy, which is owned by the snapshot only.
+        pose, velocity, process_data = record["pose"], record["velocity"], record["process_data"]
+        target_velocity, ramped_velocity = record["target_velocity"], record["ramped_velocity"]
+        pose_goal = record["pose_goal"]
+        for array in (pose, velocity, target_velocity, ramped_velocity, process_data, pose_goal):
+            array.flags.writeable = False
+        driver_type = int(record["driver_type"])
+        return cls(
+            cycle=int(record["cycle"]),
+            time=float(record["time"]),
+            pose=pose,
+            velocity=velocity,
+            target_velocity=target_velocity,
+            ramped_velocity=ramped_velocity,
+            driver_type=PlatformDriverType(driver_type) if driver_type != 0 else None,
+            driver_state=PlatformDriverState(int(record["driver_state"])),
+            drives_aligned=bool(record["drives_aligned"]),
+            process_data=ProcessDataSnapshot(process_data),
+            loop_statistics=LoopStatistics(
+                frequency=float(record["loop_frequency"]),
+                cycles=int(record["loop_cycles"]),
+                missed_deadlines=int(record["loop_missed_deadlines"]),
+                period_mean=float(record["loop_period_mean"]),
+                period_min=float(record["loop_period_min"]),
+                period_max=float(record["loop_period_max"]),
+                latency_max=float(record["loop_latency_max"]),
+                step_duration_mean=float(record["loop_step_duration_mean"]),
+                step_duration_max=float(record["loop_step_duration_max"]),
+                gc_collections=int(record["loop_gc_collections"]),
+                latency_histogram=record["loop_latency_histogram"].tolist(),
+            ),
+            trajectory_status=TrajectoryStatus(
+                trajectory_id=int(record["trajectory_id"]),
+                state=TrajectoryState(int(record["trajectory_state"])),
+                elapsed=float(record["trajectory_elapsed"]),
+                duration=float(record["trajectory_duration"]),
+            ),
+            pose_goal_status=PoseGoalStatus(
+                goal_id=int(record["pose_goal_id"]),
+                state=PoseGoalState(int(record["pose_goal_state"])),
+                goal=pose_goal,
+                position_error=float(record["pose_goal_position_error"]),
+                angle_error=float(record["pose_goal_angle_error"]),
+            ),
+        )
+
+
+class SeqLockRecord:
+    """A record in (shared) memory with a single writer, read lock-free by any number of readers."""
+
+    def __init__(self, buffer, dtype: np.dtype, offset: int = 0):
+        """Map the record onto a buffer.
+
+        Args:
+            buffer: The buffer that holds the record.
+            dtype: The layout of the record, with a `seq` field of type `np.int64`.
+            offset: Offset (bytes) of the record in the buffer."""
+        self._record = np.ndarray((), dtype=dtype, buffer=buffer, offset=offset)
+        self._seq = self._record["seq"]
+
+    def begin_write(self) -> np.ndarray:
+        """Start writing the record. Returns the record, to be updated in place before calling `end_write`."""
+        self._seq += 1
+        return self._record
+
+    def end_write(self) -> None:
+        """Finish writing the record."""
+        self._seq += 1
+
+    def read(self) -> np.ndarray:
+        """Return a consistent copy of the record, waiting while it is being written."""
+        while True:
+            seq = int(self._seq)
+            if seq % 2 == 0:
+                record = self._record.copy()
+                if int(self._seq) == seq:
+                    return record
+            time.sleep(READ_RETRY_SLEEP)
+
+    def try_read(self, out: np.ndarray) -> bool:
+        """Copy the record into `out` in a single attempt, without waiting for the writer.
+
+        Args:
+            out: A record of the same layout.
+
+        Returns:
+            True if the copy is consistent, False if the record was being written, in which case `out` may be partially
+            overwritten."""
+        seq = int(self._seq)
+        if seq % 2 != 0:
+            return False
+        np.copyto(out, self._record)
+        return int(self._seq) == seq
+
+
+class PlatformChannel:
+    """Channel between the request handlers (commands, state queries) and the EtherCAT loop (state publication) of a
+    platform with `num_drives` drives. Commands can be sent from multiple threads of one process."""
+
+    def __init__(self, num_drives: int):
+        """Create a channel in private memory, for an EtherCAT loop that runs in a thread.
+
+        Args:
+            num_drives: The number of drives of the platform."""
+        self._init_records(num_drives, bytearray(self._buffer_size(num_drives)))
+
+    @staticmethod
+    def _buffer_size(num_drives: int) -> int:
+        return PlatformChannel._trajectory_offset(num_drives) + TRAJECTORY_DTYPE.itemsize
+
+    @staticmethod
+    def _state_offset() -> int:
+        # Keep the records on separate cache lines.
+        return -(-COMMAND_DTYPE.itemsize // 64) * 64
+
+    @staticmethod
+    def _trajectory_offset(num_drives: int) -> int:
+        return -(-(PlatformChannel._state_offset() + state_dtype(num_drives).itemsize) // 64) * 64
+
+    def _init_records(self, num_drives: int, buffer) -> None:
+        self._num_drives = num_drives
+        self._commands = SeqLockRecord(buffer, COMMAND_DTYPE)
+        self._state = SeqLockRecord(buffer, state_dtype(num_drives), self._state_offset())
+        self._trajectory = SeqLockRecord(buffer, TRAJECTORY_DTYPE, self._trajectory_offset(num_drives))
+
+        # Serialises the request handlers, which all write the command record. The EtherCAT loop never takes it.
+        self._command_lock = Lock()
+
+        # The EtherCAT loop never waits for the request handlers: if the command record is being written, it keeps the
+        # commands of the previous cycle and picks up the new ones at the next cycle.
+        self._loop_commands = np.zeros((), dtype=COMMAND_DTYPE)
+        self._loop_commands_next = np.zeros((), dtype=COMMAND_DTYPE)
+        self._loop_trajectory = np.zeros((), dtype=TRAJECTORY_DTYPE)
+
+        # Counters of the last applied commands and the running trajectory, in the EtherCAT loop.
+        self._applied_counters = {}
+        self._trajectory_executor = VelocityTrajectoryExecutor()
+        self._pose_goal_controller = PoseGoalController()
+
+    @property
+    def num_drives(self) -> int:
+        return self._num_drives
+
+    # Request handlers.
+
+    @contextmanager
+    def _write_commands(self) -> Iterator[np.ndarray]:
+        """Update the command record in place, see `SeqLockRecord.begin_write`."""
+        with self._command_lock:
+            commands = self._commands.begin_write()
+            try:
+                yield commands
+            finally:
+                self._commands.end_write()
+
+    def set_platform_velocity_target(
+        self, vel_x: float, vel_y: float, vel_a: float, timeout: float, only_align_drives: bool
+    ) -> None:
+        """Send a platform velocity target. The safety limits are checked before sending, see
+        `PlatformDriver.set_platform_velocity_target`."""
+        check_platform_velocity_target(vel_x, vel_y, vel_a, timeout)
+        with self._write_commands() as commands:
+            commands["vel_x"] = vel_x
+            commands["vel_y"] = vel_y
+            commands["vel_a"] = vel_a
+            commands["timeout"] = timeout
+            commands["only_align_drives"] = only_align_drives
+            commands["align_first"] = False
+            commands["velocity_counter"] += 1
+
+    def align_and_drive(
+        self,
+        vel_x: float,
+        vel_y: float,
+        vel_a: float,
+        timeout: float,
+        alignment_tolerance: float,
+        alignment_timeout: float,
+    ) -> None:
+        """Send a platform velocity target, to drive at once the drives are aligned for it. The parameters are checked
+        before sending, see `PlatformDriver.align_and_drive`."""
+        check_platform_velocity_target(vel_x, vel_y, vel_a, timeout)
+        check_alignment_parameters(alignment_tolerance, alignment_timeout)
+        with self._write_commands() as commands:
+            commands["vel_x"] = vel_x
+            commands["vel_y"] = vel_y
+            commands["vel_a"] = vel_a
+            commands["timeout"] = timeout
+            commands["only_align_drives"] = False
+            commands["align_first"] = True
+            commands["alignment_tolerance"] = alignment_tolerance
+            commands["alignment_timeout"] = alignment_timeout
+            commands["velocity_counter"] += 1
+
+    def set_driver_type(self, driver_type: PlatformDriverType) -> None:
+        """Send a new driver type."""
+        with self._write_commands() as commands:
+            commands["driver_type"] = driver_type.value
+            commands["driver_type_counter"] += 1
+
+    def reset_odometry(self) -> None:
+        """Request an odometry reset."""
+        with self._write_commands() as commands:
+            commands["reset_odometry_counter"] += 1
+
+    def stop(self) -> None:
+        """Request the EtherCAT loop to stop."""
+        with self._write_commands() as commands:
+            commands["stop"] = True
+
+    def execute_velocity_trajectory(self, samples: np.ndarray, preempt: bool = True) -> TrajectoryStatus:
+        """Send a velocity trajectory, which the EtherCAT loop starts at the next cycle. It replaces the running
+        trajectory, and is in turn preempted by a velocity target.
+
+        Args:
+            samples: The samples of the trajectory, see `check_velocity_trajectory`.
+            preempt: If false, refuse the trajectory while another one is running or about to start.
+
+        Returns:
+            The status of the trajectory as it starts: its id and the duration of the checked samples.
+
+        Raises:
+            ValueError: If the trajectory is malformed or exceeds the safety limits.
+            RuntimeError: If `preempt` is false and another trajectory is running."""
+        samples = check_velocity_trajectory(samples)
+        with self._command_lock:
+            if not preempt:
+                status = self.read_state().trajectory_status
+                sent = int(self._commands.read()["trajectory_counter"])
+                if status.trajectory_id != sent or status.state == TrajectoryState.RUNNING:
+                    raise RuntimeError(f"Trajectory {sent} is running")
+            # The trajectory counter is only incremented here, under the command lock.
+            trajectory_id = int(self._commands.read()["trajectory_counter"]) + 1
+            trajectory = self._trajectory.begin_write()
+            trajectory["trajectory_id"] = trajectory_id
+            trajectory["num_samples"] = len(samples)
+            trajectory["samples"][: len(samples)] = samples
+            self._trajectory.end_write()
+
+            commands = self._commands.begin_write()
+            commands["trajectory_counter"] = trajectory_id
+            self._commands.end_write()
+        return TrajectoryStatus(trajectory_id, TrajectoryState.RUNNING, 0.0, float(samples[-1, 0]))
+
+    def cancel_trajectory(self) -> None:
+        """Stop the running trajectory, if any, and the platform."""
+        with self._write_commands() as commands:
+            commands["cancel_trajectory_counter"] += 1
+
+    def move_to_pose(self, goal: PoseGoal) -> int:
+        """Send a pose goal, towards which the EtherCAT loop drives the platform from the next cycle on. It replaces
+        the running trajectory or goal, and is in turn preempted by a velocity target or trajectory.
+
+        Args:
+            goal: The goal pose, in the odometry frame or relative to the platform.
+
+        Returns:
+            The id of the goal.
+
+        Raises:
+            ValueError: If the goal is invalid or exceeds the safety limits."""
+        check_pose_goal(goal)
+        with self._write_commands() as commands:
+            commands["goal_x"] = goal.x
+            commands["goal_y"] = goal.y
+            commands["goal_a"] = goal.a
+            commands["goal_relative"] = goal.relative
+            commands["goal_max_vel_linear"] = goal.max_vel_linear
+            commands["goal_max_vel_angular"] = goal.max_vel_angular
+            commands["goal_position_tolerance"] = goal.position_tolerance
+            commands["goal_angle_tolerance"] = goal.angle_tolerance
+            commands["goal_timeout"] = goal.timeout
+            commands["pose_goal_counter"] += 1
+            return int(commands["pose_goal_counter"])
+
+    def cancel_pose_goal(self) -> None:
+        """Stop driving towards the pose goal, if any, and stop the platform."""
+        with self._write_commands() as commands:
+            commands["cancel_pose_goal_counter"] += 1
+
+    def are_drives_aligned(self) -> bool:
+        """Check if the drives are aligned with the last velocity target, as of the latest cycle.
+
+        As with `PlatformDriver.are_drives_aligned`, the velocity ramp of the platform is reset if they are not."""
+        aligned = self.read_state().drives_aligned
+        if not aligned:
+            with self._write_commands() as commands:
+                commands["align_check_counter"] += 1
+        return aligned
+
+    def read_state(self) -> PlatformStateSnapshot:
+        """Get the state of the platform at the end of the latest cycle."""
+        return PlatformStateSnapshot.from_record(self._state.read())
+
+    # EtherCAT loop.
+
+    def apply_commands(self, platform: RobilePlatform) -> bool:
+        """Apply the commands that were sent since the previous call to the platform.
+
+        Returns:
+            False if the EtherCAT loop should stop, True otherwise."""
+        if self._commands.try_read(self._loop_commands_next):
+            self._loop_commands, self._loop_commands_next = self._loop_commands_next, self._loop_commands
+        commands = self._loop_commands
+        now = platform.clock.now
+        executor = self._trajectory_executor
+        pose_goal_controller = self._pose_goal_controller
+        if self._is_new(commands, "driver_type_counter"):
+            platform.driver.set_driver_type(PlatformDriverType(int(commands["driver_type"])))
+        if self._is_new(commands, "velocity_counter"):
+            executor.preempt()
+            pose_goal_controller.preempt()
+            if commands["align_first"]:
+                platform.driver.align_and_drive(
+                    float(commands["vel_x"]),
+                    float(commands["vel_y"]),
+                    float(commands["vel_a"]),
+                    float(commands["timeout"]),
+                    float(commands["alignment_tolerance"]),
+                    float(commands["alignment_timeout"]),
+                )
+            else:
+                platform.driver.set_platform_velocity_target(
+                    float(commands["vel_x"]),
+                    float(commands["vel_y"]),
+                    float(commands["vel_a"]),
+                    float(commands["timeout"]),
+                    bool(commands["only_align_drives"]),
+                )
+        if self._is_new(commands, "reset_odometry_counter"):
+            platform.monitor.reset_odometry()
+        if self._is_new(commands, "align_check_counter"):
+            platform.driver.are_drives_aligned()
+        if self._is_new(commands, "trajectory_counter"):
+            trajectory = self._loop_trajectory
+            if self._trajectory.try_read(trajectory):
+                # The record may already hold a newer trajectory than the counter, which is then started only once.
+                if self._is_new(trajectory, "trajectory_id"):
+                    pose_goal_controller.preempt()
+                    executor.start(
+                        int(trajectory["trajectory_id"]), trajectory["samples"][: trajectory["num_samples"]], now
+                    )
+            else:
+                # A newer trajectory is being written, it is started at the next cycle.
+                del self._applied_counters["trajectory_counter"]
+        if self._is_new(commands, "cancel_trajectory_counter") and executor.cancel():
+            platform.driver.set_platform_velocity_target(0.0, 0.0, 0.0)
+        if self._is_new(commands, "pose_goal_counter"):
+            executor.preempt()
+            pose_goal_controller.start(
+                int(commands["pose_goal_counter"]),
+                PoseGoal(
+                    x=float(commands["goal_x"]),
+                    y=float(commands["goal_y"]),
+                    a=float(commands["goal_a"]),
+                    relative=bool(commands["goal_relative"]),
+                    max_vel_linear=float(commands["goal_max_vel_linear"]),
+                    max_vel_angular=float(commands["goal_max_vel_angular"]),
+                    position_tolerance=float(commands["goal_position_tolerance"]),
+                    angle_tolerance=float(commands["goal_angle_tolerance"]),
+                    timeout=float(commands["goal_timeout"]),
+                ),
+                platform.monitor.get_estimated_robot_pose(),
+                now,
+            )
+        if self._is_new(commands, "cancel_pose_goal_counter") and pose_goal_controller.cancel():
+            platform.driver.set_platform_velocity_target(0.0, 0.0, 0.0)
+
+        # At most one of the trajectory and the pose goal is running.
+        target = executor.step(now)
+        if target is not None:
+            platform.driver.set_platform_velocity_target(*target, timeout=TRAJECTORY_COMMAND_TIMEOUT)
+        if pose_goal_controller.running:
+            target = pose_goal_controller.step(
+                platform.monitor.get_estimated_robot_pose(), now, platform.driver.get_platform_limits()
+            )
+            platform.driver.set_platform_velocity_target(*target, timeout=POSE_GOAL_COMMAND_TIMEOUT)
+        return not bool(commands["stop"])
+
+    def publish_state(self, platform: RobilePlatform, loop_statistics: Optional[LoopStatistics] = None) -> None:
+        """Publish the state of the platform after a cycle."""
+        drives_aligned = platform.driver.are_drives_aligned(reset_ramping=False)
+
+        state = self._state.begin_write()
+        state["cycle"] += 1
+        state["time"] = platform.clock.now
+        state["pose"] = platform.monitor.get_estimated_robot_pose()
+        state["velocity"] = platform.monitor.get_estimated_velocity()
+        state["target_velocity"] = platform.driver.get_platform_target_velocity()
+        state["ramped_velocity"] = platform.driver.get_platform_ramped_velocity()
+        state["driver_type"] = platform.driver.driver_type.value
+        state["driver_state"] = platform.driver.state.value
+        state["drives_aligned"] = drives_aligned
+        state["process_data"] = platform.monitor.process_data.data
+        if loop_statistics is not None:
+            state["loop_frequency"] = loop_statistics.frequency
+            state["loop_cycles"] = loop_statistics.cycles
+            state["loop_missed_deadlines"] = loop_statistics.missed_deadlines
+            state["loop_period_mean"] = loop_statistics.period_mean
+            state["loop_period_min"] = loop_statistics.period_min
+            state["loop_period_max"] = loop_statistics.period_max
+            state["loop_latency_max"] = loop_statistics.latency_max
+            state["loop_step_duration_mean"] = loop_statistics.step_duration_mean
+            state["loop_step_duration_max"] = loop_statistics.step_duration_max
+            state["loop_gc_collections"] = loop_statistics.gc_collections
+            state["loop_latency_histogram"] = loop_statistics.latency_histogram
+        trajectory_status = self._trajectory_executor.status
+        state["trajectory_id"] = trajectory_status.trajectory_id
+        state["trajectory_state"] = trajectory_status.state.value
+        state["trajectory_elapsed"] = trajectory_status.elapsed
+        state["trajectory_duration"] = trajectory_status.duration
+        pose_goal_status = self._pose_goal_controller.status
+        state["pose_goal_id"] = pose_goal_status.goal_id
+        state["pose_goal_state"] = pose_goal_status.state.value
+        state["pose_goal"] = pose_goal_status.goal
+        state["pose_goal_position_error"] = pose_goal_status.position_error
+        state["pose_goal_angle_error"] = pose_goal_status.angle_error
+        self._state.end_write()
+
+    def _is_new(self, commands: np.ndarray, counter: str) -> bool:
+        """Check whether a command was sent since the last call, and mark it as applied."""
+        value = int(commands[counter])
+        is_new = value != self._applied_counters.get(counter, 0)
+        self._applied_counters[counter] = value
+        return is_new
+
+
+class SharedMemoryChannel(PlatformChannel):
+    """A `PlatformChannel` in shared memory, for an EtherCAT loop that runs in a separate process."""
+
+    def __init__(self, num_drives: int, name: Optional[str] = None):
+        """Create a new channel, or attach to an existing one.
+
+        Args:
+            num_drives: The number of drives of the platform.
+            name: The name of the shared memory block of an existing channel, or `None` to create a new one."""
+        size = self._buffer_size(num_drives)
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self._shm.buf[:size] = bytes(size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._init_records(num_drives, self._shm.buf)
+
+    @property
+    def name(self) -> str:
+        """The name of the shared memory block, to attach to the channel from another process."""
+        return self._shm.name
+
+    def close(self) -> None:
+        """Detach from the channel. The creator of the channel should also call `unlink()`."""
+        self._commands = None
+        self._state = None
+        self._trajectory = None
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """Free the shared memory block."""
+        self._shm.unlink()
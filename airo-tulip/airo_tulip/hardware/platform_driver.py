@@ -1,15 +1,16 @@
 """Platform driver for the airo-tulip platform."""
 
 import math
-import time
 from enum import Enum
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pysoem
 from airo_tulip.hardware.constants import *
 from airo_tulip.hardware.controllers.velocity_platform_controller import VelocityPlatformController
 from airo_tulip.hardware.ethercat import *
-from airo_tulip.hardware.structs import WheelConfig
+from airo_tulip.hardware.process_data import ProcessDataSnapshot
+from airo_tulip.hardware.structs import Attitude2DType, PlatformLimits, TorqueControllerGains, WheelConfig
 from airo_tulip.hardware.util import *
 from loguru import logger
 
@@ -23,6 +24,42 @@ class PlatformDriverType(Enum):
     COMPLIANT_STRONG = 4
 
 
+DEFAULT_TORQUE_CONTROLLER_GAINS = {
+    PlatformDriverType.COMPLIANT_WEAK: TorqueControllerGains(
+        p=0.3, i=1.0, d=0.0, max_output=2.5, max_sum_error_vel=2.0
+    ),
+    PlatformDriverType.COMPLIANT_MODERATE: TorqueControllerGains(
+        p=0.3, i=1.0, d=0.002, max_output=5.0, max_sum_error_vel=3.0
+    ),
+    PlatformDriverType.COMPLIANT_STRONG: TorqueControllerGains(
+        p=0.3, i=1.0, d=0.005, max_output=10.0, max_sum_error_vel=8.0
+    ),
+}
+"""Torque controller gains for every motor, for each of the compliant driver types."""
+
+
+def check_platform_velocity_target(vel_x: float, vel_y: float, vel_a: float, timeout: float) -> None:
+    """Check a platform velocity target against the safety limits. Raises a ValueError if they are exceeded."""
+    if math.sqrt(vel_x**2 + vel_y**2) > 0.5:
+        raise ValueError("Cannot set target linear velocity higher than 0.5 m/s")
+    if abs(vel_a) > math.pi / 4:
+        raise ValueError("Cannot set target angular velocity higher than pi/4 rad/s")
+    if timeout < 0.0:
+        raise ValueError("Cannot set negative timeout")
+
+
+DEFAULT_ALIGNMENT_TOLERANCE = 0.25  # rad, maximum pivot error of aligned drives
+DEFAULT_ALIGNMENT_TIMEOUT = 2.0  # s, maximum time to align the drives before driving
+
+
+def check_alignment_parameters(alignment_tolerance: float, alignment_timeout: float) -> None:
+    """Check the parameters of `PlatformDriver.align_and_drive`. Raises a ValueError if they are invalid."""
+    if not 0.0 < alignment_tolerance <= math.pi:
+        raise ValueError("Alignment tolerance must be between 0 and pi rad")
+    if alignment_timeout < 0.0:
+        raise ValueError("Cannot set negative alignment timeout")
+
+
 class PlatformDriverState(Enum):
     """Platform driver state."""
 
@@ -41,30 +78,49 @@ class PlatformDriver:
         master: pysoem.Master,
         wheel_configs: List[WheelConfig],
         controller_type: PlatformDriverType,
+        torque_controller_gains: Optional[Dict[PlatformDriverType, List[TorqueControllerGains]]] = None,
     ):
         """Initialise the platform driver.
 
         Args:
             master: The EtherCAT master.
             wheel_configs: The configurations for each drive.
-            controller_type: The type of controller to use (velocity or compliant mode)."""
+            controller_type: The type of controller to use (velocity or compliant mode).
+            torque_controller_gains: Per compliant driver type, the torque controller gains for every motor (wheel 1
+                and wheel 2 of every drive, in the order of `wheel_configs`). Driver types that are not in this
+                dictionary use `DEFAULT_TORQUE_CONTROLLER_GAINS` for all motors."""
         self._master = master
         self._wheel_configs = wheel_configs
         self._num_wheels = len(wheel_configs)
 
         self._state = PlatformDriverState.INIT
         self._current_ts = 0
-        self._process_data = []
+        self._process_data = ProcessDataSnapshot.zeros(self._num_wheels)
         self._wheel_enabled = [True] * self._num_wheels
         self._step_count = 0
-        self._timeout = 0
+        self._control_step_count = -1  # the last step that calculated wheel setpoints
+        self._now = 0.0
+        self._timeout = 0.0
         self._timeout_message_printed = True
         self._last_step_time = None
 
+        # Alignment tolerance and velocity target timeout of a pending `align_and_drive()`, or None.
+        self._pending_drive: Optional[Tuple[float, float]] = None
+
+        # Output buffers, one per drive, which are updated in place every cycle.
+        self._outputs = [RxPDO1() for _ in range(self._num_wheels)]
+        self._output_config = None
+        self._slave_indices = [wheel_config.ethercat_number - 1 for wheel_config in wheel_configs]
+
         self._driver_type = controller_type
         self._vpc = VelocityPlatformController(self._wheel_configs)
 
-        self._wheel_controllers = [VelocityTorqueController(self._driver_type) for _ in range(self._num_wheels * 2)]
+        self._torque_controller_gains = dict(torque_controller_gains) if torque_controller_gains is not None else {}
+        for driver_type, gains in self._torque_controller_gains.items():
+            if len(gains) != self._num_wheels * 2:
+                raise ValueError(f"Expected {self._num_wheels * 2} torque controller gains for {driver_type.name}")
+        self._torque_controllers = self._create_torque_controllers(self._driver_type)
+        self._velocity_error = np.zeros((self._num_wheels, 2))
 
     def set_platform_velocity_target(
         self,
@@ -85,43 +141,124 @@ class PlatformDriver:
             vel_y: Velocity along Y axis.
             vel_a: Angular velocity.
             timeout: The platform will stop after this many seconds.
-            only_align_drives: If true, the platform will only align the wheels in the correct orientation without driving into that directino."""
-        if math.sqrt(vel_x**2 + vel_y**2) > 0.5:
-            raise ValueError("Cannot set target linear velocity higher than 0.5 m/s")
-        if abs(vel_a) > math.pi / 4:
-            raise ValueError("Cannot set target angular velocity higher than pi/4 rad/s")
-        if timeout < 0.0:
-            raise ValueError("Cannot set negative timeout")
+            only_align_drives: If true, the platform will only align the wheels in the correct orientation without driving into that directino.
+        """
+        check_platform_velocity_target(vel_x, vel_y, vel_a, timeout)
 
         self._vpc.set_platform_velocity_target(vel_x, vel_y, vel_a, only_align_drives)
+        self._pending_drive = None
 
-        self._timeout = time.time() + timeout
+        self._timeout = self._now + timeout
         self._timeout_message_printed = False
 
-    def are_drives_aligned(self) -> bool:
-        """Check if the drives are aligned with the last provided velocity command."""
-        encoder_pivots = [self._process_data[i].encoder_pivot for i in range(self._num_wheels)]
-        return self._vpc.are_drives_aligned(encoder_pivots)
+    def align_and_drive(
+        self,
+        vel_x: float,
+        vel_y: float,
+        vel_a: float,
+        timeout: float = 1.0,
+        alignment_tolerance: float = DEFAULT_ALIGNMENT_TOLERANCE,
+        alignment_timeout: float = DEFAULT_ALIGNMENT_TIMEOUT,
+    ) -> None:
+        """Align the drives for a velocity target, then drive at it.
+
+        The drives are aligned as with `set_platform_velocity_target(..., only_align_drives=True)`. The platform starts
+        driving in the same control cycle in which the drives are aligned, see `VelocityPlatformController`, so no time
+        is lost between alignment and driving. Setting another velocity target cancels the pending drive.
+
+        Args:
+            vel_x: Velocity along X axis.
+            vel_y: Velocity along Y axis.
+            vel_a: Angular velocity.
+            timeout: The platform will stop after this many seconds of driving.
+            alignment_tolerance: The drives are aligned when all pivot errors (rad) are smaller than this.
+            alignment_timeout: The platform stops if the drives are not aligned after this many seconds."""
+        check_platform_velocity_target(vel_x, vel_y, vel_a, timeout)
+        check_alignment_parameters(alignment_tolerance, alignment_timeout)
+
+        if vel_x == 0.0 and vel_y == 0.0 and vel_a == 0.0:
+            # Nothing to align for.
+            self.set_platform_velocity_target(vel_x, vel_y, vel_a, timeout)
+            return
+
+        self._vpc.set_platform_velocity_target(vel_x, vel_y, vel_a, only_align_drives=True)
+        self._pending_drive = (alignment_tolerance, timeout)
+
+        self._timeout = self._now + alignment_timeout
+        self._timeout_message_printed = False
+
+    def are_drives_aligned(self, reset_ramping: bool = True) -> bool:
+        """Check if the drives are aligned with the last provided velocity command.
+
+        Args:
+            reset_ramping: If true, reset the velocity ramping when the drives are not aligned (default: True)."""
+        # The wheel setpoints of this cycle already computed the pivot errors for the process data of this cycle.
+        if self._control_step_count == self._step_count:
+            aligned = self._vpc.were_drives_aligned(reset_ramping=reset_ramping)
+            if aligned is not None:
+                return aligned
+        return self._vpc.are_drives_aligned(self._process_data["encoder_pivot"], reset_ramping=reset_ramping)
+
+    def get_platform_target_velocity(self) -> Attitude2DType:
+        """Get the platform's velocity target, which is reset to zero when it times out."""
+        return self._vpc.get_platform_target_velocity()
+
+    def get_platform_ramped_velocity(self) -> Attitude2DType:
+        """Get the platform's ramped velocity, i.e., the velocity that the drives are currently commanded to."""
+        return self._vpc.get_platform_ramped_velocity()
+
+    def get_platform_limits(self) -> PlatformLimits:
+        """Get the velocity, acceleration and deceleration limits that the platform velocity is ramped with."""
+        return self._vpc.get_platform_limits()
+
+    @property
+    def state(self) -> PlatformDriverState:
+        return self._state
+
+    @property
+    def driver_type(self) -> PlatformDriverType:
+        return self._driver_type
 
     def set_driver_type(self, driver_type: PlatformDriverType):
         """Set the driver type (velocity control or compliant control)."""
         self._driver_type = driver_type
-        self._wheel_controllers = [VelocityTorqueController(driver_type) for _ in range(self._num_wheels * 2)]
+        self._torque_controllers = self._create_torque_controllers(driver_type)
 
-    def step(self) -> bool:
-        """Perform a single step of the platform driver."""
+    def _create_torque_controllers(self, driver_type: PlatformDriverType) -> Optional["VelocityTorqueControllerBank"]:
+        """Create the torque controllers for a driver type, or `None` in velocity mode."""
+        if driver_type == PlatformDriverType.VELOCITY:
+            return None
+        gains = self._torque_controller_gains.get(
+            driver_type, [DEFAULT_TORQUE_CONTROLLER_GAINS[driver_type]] * (self._num_wheels * 2)
+        )
+        return VelocityTorqueControllerBank(gains)
+
+    def step(self, process_data: ProcessDataSnapshot, now: float) -> bool:
+        """Perform a single step of the platform driver.
+
+        Args:
+            process_data: The process data of all drives for this cycle.
+            now: The time (s) of this cycle, see `CycleClock`."""
         self._step_count += 1
 
-        self._process_data = [self._get_process_data(i) for i in range(self._num_wheels)]
+        self._process_data = process_data
+        self._now = now
 
-        for i in range(len(self._process_data)):
-            pd = self._process_data[i]
-            logger.trace(f"pd {i} sensor_ts {pd.sensor_ts} vel_1 {pd.velocity_1} vel_2 {pd.velocity_2}")
+        # Arguments are only formatted if trace logging is enabled.
+        logger.trace(
+            "pd sensor_ts {} vel_1 {} vel_2 {}",
+            process_data["sensor_ts"],
+            process_data["velocity_1"],
+            process_data["velocity_2"],
+        )
 
-        self._current_ts = self._process_data[0].sensor_ts
+        self._current_ts = self._process_data.sensor_ts
 
-        if self._timeout < time.time():
+        if self._timeout < now:
             self._vpc.set_platform_velocity_target(0.0, 0.0, 0.0, only_align_drives=False)
+            if self._pending_drive is not None:
+                logger.warning("platform stopped, the drives were not aligned within the alignment timeout")
+                self._pending_drive = None
             if not self._timeout_message_printed:
                 logger.info("platform stopped early due to velocity target timeout")
                 self._timeout_message_printed = True
@@ -180,7 +317,7 @@ class PlatformDriver:
 
     def _has_wheel_status_enabled(self, wheel: int) -> bool:
         """Check if the wheel is enabled."""
-        status1 = self._process_data[wheel].status1
+        status1 = int(self._process_data["status1"][wheel])
         return (status1 & STAT1_ENABLED1) > 0 and (status1 & STAT1_ENABLED2) > 0
 
     def _has_wheel_status_error(self, wheel: int) -> bool:
@@ -190,154 +327,169 @@ class PlatformDriver:
         STATUS1disabled = 60
         STATUS2 = 2051
 
-        process_data = self._process_data[wheel]
-        status1 = process_data.status1
-        status2 = process_data.status2
+        status1 = int(self._process_data["status1"][wheel])
+        status2 = int(self._process_data["status2"][wheel])
 
         return (status1 != STATUS1a and status1 != STATUS1b and status1 != STATUS1disabled) or (status2 != STATUS2)
 
     def _do_stop(self) -> None:
         """Stop the platform."""
         # zero setpoints for all drives
-        data = RxPDO1()
-        data.timestamp = self._current_ts + 100 * 1000
-        data.limit1_p = CURRENT_STOP
-        data.limit1_n = -CURRENT_STOP
-        data.limit2_p = CURRENT_STOP
-        data.limit2_n = -CURRENT_STOP
-        data.setpoint1 = 0
-        data.setpoint2 = 0
-
-        for i in range(self._num_wheels):
-            data.command1 = COM1_MODE_VELOCITY  # we always want zero velocity (and not zero torque) when stopping
-
-            if self._wheel_enabled[i]:
-                data.command1 |= COM1_ENABLE1 | COM1_ENABLE2
+        # we always want zero velocity (and not zero torque) when stopping
+        self._configure_outputs(COM1_MODE_VELOCITY, CURRENT_STOP)
 
-            self._set_process_data(i, data)
+        timestamp = self._current_ts + 100 * 1000
+        for i, data in enumerate(self._outputs):
+            data.timestamp = timestamp
+            data.setpoint1 = 0
+            data.setpoint2 = 0
+            self._set_process_data(i)
 
     def _do_control(self) -> None:
         """Control the platform."""
         # calculate setpoints for each drive
-        data = RxPDO1()
-        data.timestamp = self._current_ts + 100 * 1000
-        data.limit1_p = CURRENT_DRIVE
-        data.limit1_n = -CURRENT_DRIVE
-        data.limit2_p = CURRENT_DRIVE
-        data.limit2_n = -CURRENT_DRIVE
-        data.setpoint1 = 0
-        data.setpoint2 = 0
+        if self._driver_type == PlatformDriverType.VELOCITY:
+            self._configure_outputs(COM1_MODE_VELOCITY, CURRENT_DRIVE)
+        else:
+            self._configure_outputs(COM1_MODE_TORQUE, CURRENT_DRIVE)
 
         # Update desired platform velocity if velocity control
-        self._vpc.calculate_platform_ramped_velocities()
+        self._vpc.calculate_platform_ramped_velocities(self._now)
+        if self._pending_drive is not None:
+            self._drive_if_aligned()
+
+        # Calculate wheel setpoints for all drives at once
+        wheel_target_velocities_1, wheel_target_velocities_2 = self._vpc.calculate_wheel_target_velocities(
+            self._process_data["encoder_pivot"]
+        )
+        self._control_step_count = self._step_count
+        wheel_target_velocities_1 = -wheel_target_velocities_1  # because of inverted frame
+
+        # Calculate setpoints
+        if self._driver_type == PlatformDriverType.VELOCITY:
+            setpoints_1 = wheel_target_velocities_1
+            setpoints_2 = wheel_target_velocities_2
 
-        raw_velocities = [[pd.velocity_1, pd.velocity_2] for pd in self._process_data]
+            # Avoid sending close to zero velocities
+            setpoints_1[np.abs(setpoints_1) < WHEEL_SET_POINT_MIN] = 0
+            setpoints_2[np.abs(setpoints_2) < WHEEL_SET_POINT_MIN] = 0
+        else:
+            # Control the torque of all motors at once
+            np.subtract(wheel_target_velocities_1, self._process_data["velocity_1"], out=self._velocity_error[:, 0])
+            np.subtract(wheel_target_velocities_2, self._process_data["velocity_2"], out=self._velocity_error[:, 1])
+            torques = self._torque_controllers.control(self._velocity_error, self._now)
+            setpoints_1 = torques[:, 0]
+            setpoints_2 = torques[:, 1]
 
-        for i in range(self._num_wheels):
-            if self._driver_type == PlatformDriverType.VELOCITY:
-                data.command1 = COM1_MODE_VELOCITY
-            else:
-                data.command1 = COM1_MODE_TORQUE
+        # Avoid sending very large values
+        setpoints_1 = np.clip(setpoints_1, -WHEEL_SET_POINT_MAX, WHEEL_SET_POINT_MAX).tolist()
+        setpoints_2 = np.clip(setpoints_2, -WHEEL_SET_POINT_MAX, WHEEL_SET_POINT_MAX).tolist()
+
+        timestamp = self._current_ts + 100 * 1000
+        for i, data in enumerate(self._outputs):
+            data.timestamp = timestamp
+
+            # Send calculated setpoints
+            data.setpoint1 = setpoints_1[i]
+            data.setpoint2 = setpoints_2[i]
 
+            logger.trace(
+                "wheel {} enabled {} sp1 {} sp2 {}", i, self._wheel_enabled[i], setpoints_1[i], setpoints_2[i]
+            )
+
+            self._set_process_data(i)
+
+    def _drive_if_aligned(self) -> None:
+        """Start driving at the velocity target of `align_and_drive()` if the drives are aligned for it, such that the
+        wheel setpoints of this cycle already drive."""
+        alignment_tolerance, timeout = self._pending_drive
+        target = self._vpc.get_platform_target_velocity()
+        # The pivots are aligned for the ramped velocity, which only points in the direction of the target once all
+        # axes ramp up at the same rate. The pivot angles do not depend on the magnitude of the velocity.
+        ramped = self._vpc.get_platform_ramped_velocity()
+        scale = np.dot(ramped, target) / np.dot(target, target)
+        if scale <= 0.0 or not np.allclose(ramped, scale * target, rtol=0.0, atol=1e-9):
+            return
+        if not self._vpc.are_drives_aligned(
+            self._process_data["encoder_pivot"], max_pivot_error=alignment_tolerance, reset_ramping=False
+        ):
+            return
+        self._vpc.set_platform_velocity_target(*target.tolist(), only_align_drives=False)
+        self._pending_drive = None
+        self._timeout = self._now + timeout
+
+    def _configure_outputs(self, command_mode: int, current_limit: float) -> None:
+        """Write the command bits and current limits to the output buffers, if they changed since the last cycle.
+
+        Args:
+            command_mode: The COM1_MODE_ command bits.
+            current_limit: The maximum current (amps) for both motors of every drive."""
+        if self._output_config == (command_mode, current_limit):
+            return
+
+        for i, data in enumerate(self._outputs):
+            data.command1 = command_mode
             if self._wheel_enabled[i]:
                 data.command1 |= COM1_ENABLE1 | COM1_ENABLE2
+            data.limit1_p = current_limit
+            data.limit1_n = -current_limit
+            data.limit2_p = current_limit
+            data.limit2_n = -current_limit
 
-            # Calculate wheel setpoints
-            wheel_target_velocity_1, wheel_target_velocity_2 = self._vpc.calculate_wheel_target_velocity(
-                i, self._process_data[i].encoder_pivot
-            )
-            wheel_target_velocity_1 *= -1  # because of inverted frame
+        self._output_config = (command_mode, current_limit)
 
-            # Calculate setpoints
-            if self._driver_type == PlatformDriverType.VELOCITY:
-                setpoint1 = wheel_target_velocity_1
-                setpoint2 = wheel_target_velocity_2
-            else:
-                # logger.debug(f"wheel_index {i}")
-                setpoint1 = self._control_velocity_torque(i * 2, wheel_target_velocity_1, raw_velocities[i][0])
-                setpoint2 = self._control_velocity_torque(i * 2 + 1, wheel_target_velocity_2, raw_velocities[i][1])
+    def _set_process_data(self, wheel_index: int) -> None:
+        """Copy the output buffer of a wheel to its slave. `pysoem` only accepts `bytes` objects as output data."""
+        self._master.slaves[self._slave_indices[wheel_index]].output = bytes(self._outputs[wheel_index])
 
-            # Avoid sending close to zero velocities
-            if self._driver_type == PlatformDriverType.VELOCITY:
-                if abs(setpoint1) < WHEEL_SET_POINT_MIN:
-                    setpoint1 = 0
-                if abs(setpoint2) < WHEEL_SET_POINT_MIN:
-                    setpoint2 = 0
 
-            # Avoid sending very large values
-            setpoint1 = clip(setpoint1, WHEEL_SET_POINT_MAX, -WHEEL_SET_POINT_MAX)
-            setpoint2 = clip(setpoint2, WHEEL_SET_POINT_MAX, -WHEEL_SET_POINT_MAX)
+class VelocityTorqueControllerBank:
+    """PDI controllers for the torque of all motors, stepped at once with a shared timestamp.
 
-            # Send calculated setpoints
-            data.setpoint1 = setpoint1
-            data.setpoint2 = setpoint2
-
-            logger.trace(f"wheel {i} enabled {self._wheel_enabled[i]} sp1 {setpoint1} sp2 {setpoint2}")
-
-            self._set_process_data(i, data)
-
-    def _control_velocity_torque(self, wheel_index, target_vel, current_vel):
-        """Control the torque of a wheel."""
-        controller = self._wheel_controllers[wheel_index]
-        error_vel = target_vel - current_vel
-        torque = controller.control(error_vel)
-        # logger.debug(f"target_vel {target_vel:.2f} current_vel {current_vel:.2f} torque {torque:.2f}")
-        return torque
-
-    def _get_process_data(self, wheel_index: int) -> TxPDO1:
-        """Get the process data for a wheel."""
-        ethercat_index = self._wheel_configs[wheel_index].ethercat_number
-        return TxPDO1.from_buffer_copy(self._master.slaves[ethercat_index - 1].input)
-
-    def _set_process_data(self, wheel_index: int, data: RxPDO1) -> None:
-        """Set the process data for a wheel."""
-        ethercat_index = self._wheel_configs[wheel_index].ethercat_number
-        self._master.slaves[ethercat_index - 1].output = bytes(data)
-
-
-class VelocityTorqueController:
-    """PDI Controller for torque control."""
-
-    def __init__(self, driver_type):
-        """Initialise the controller. Sets values for P, D, and I."""
-        if driver_type == PlatformDriverType.COMPLIANT_MODERATE:
-            self.P = 0.3
-            self.D = 0.002
-            self.I = 1.0
-            self._max_output = 5.0
-            self._max_sum_error_vel = 3.0
-        elif driver_type == PlatformDriverType.COMPLIANT_STRONG:
-            self.P = 0.3
-            self.D = 0.005
-            self.I = 1.0
-            self._max_output = 10.0
-            self._max_sum_error_vel = 8.0
-        elif driver_type == PlatformDriverType.COMPLIANT_WEAK:
-            self.P = 0.3
-            self.D = 0.0
-            self.I = 1.0
-            self._max_output = 2.5
-            self._max_sum_error_vel = 2.0
+    Motors are ordered as in the wheel configurations, with two motors (wheel 1 and wheel 2) per drive: all arrays
+    have shape (num_drives, 2)."""
+
+    def __init__(self, gains: List[TorqueControllerGains]):
+        """Initialise the controllers.
+
+        Args:
+            gains: The gains for every motor, in the order wheel 1 and wheel 2 of the first drive, then of the second
+                drive, and so on."""
+        if len(gains) % 2 != 0:
+            raise ValueError("Expected two sets of torque controller gains per drive")
+        shape = (len(gains) // 2, 2)
+
+        self._p = np.array([g.p for g in gains]).reshape(shape)
+        self._i = np.array([g.i for g in gains]).reshape(shape)
+        self._d = np.array([g.d for g in gains]).reshape(shape)
+        self._max_output = np.array([g.max_output for g in gains]).reshape(shape)
+        self._max_sum_error_vel = np.array([g.max_sum_error_vel for g in gains]).reshape(shape)
 
         self._prev_time = None
-        self._prev_error_vel = None
-        self._sum_error_vel = 0.0
+        self._prev_error_vel = np.zeros(shape)
+        self._sum_error_vel = np.zeros(shape)
+
+    def control(self, error_vel: np.ndarray, now: float) -> np.ndarray:
+        """Compute the torque setpoints of all motors.
+
+        Args:
+            error_vel: The velocity error (target - current) of every motor, shape (num_drives, 2).
+            now: The time of this control step (s), shared by all motors.
 
-    def control(self, error_vel):
-        """Control the torque."""
-        if self._prev_time is not None:
-            delta_time = time.time() - self._prev_time
+        Returns:
+            The torque setpoint for every motor, shape (num_drives, 2)."""
+        if self._prev_time is not None and now > self._prev_time:
+            delta_time = now - self._prev_time
             diff_error = (error_vel - self._prev_error_vel) / delta_time
         else:
             delta_time = 0.0
             diff_error = 0.0
 
-        torque = self.P * error_vel + self.D * diff_error + self.I * self._sum_error_vel
+        torque = self._p * error_vel + self._d * diff_error + self._i * self._sum_error_vel
 
-        self._prev_time = time.time()
-        self._prev_error_vel = error_vel
+        self._prev_time = now
+        self._prev_error_vel[:] = error_vel
         self._sum_error_vel += error_vel * delta_time
-        self._sum_error_vel = clip(self._sum_error_vel, self._max_sum_error_vel, -self._max_sum_error_vel)
+        np.clip(self._sum_error_vel, -self._max_sum_error_vel, self._max_sum_error_vel, out=self._sum_error_vel)
 
-        torque = clip(torque, self._max_output, -self._max_output)
-        return torque
+        return np.clip(torque, -self._max_output, self._max_output)
@@ -1,15 +1,13 @@
 """This module contains the PlatformMonitor class, which is responsible for monitoring the robot platform's state."""
 
-import copy
 import math
-import time
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 import numpy as np
 import pysoem
 from airo_tulip.hardware.constants import CASTOR_OFFSET, WHEEL_DISTANCE, WHEEL_RADIUS
-from airo_tulip.hardware.ethercat import RxPDO1, TxPDO1
-from airo_tulip.hardware.structs import Attitude2DType, WheelConfig
+from airo_tulip.hardware.process_data import ProcessDataSnapshot
+from airo_tulip.hardware.structs import Attitude2DType, PlatformDiagnostics, WheelConfig
 from airo_typing import Vector3DType
 
 
@@ -23,7 +21,10 @@ def _norm_angle(a: float) -> float:
 
 
 class PlatformPoseEstimator:
-    """Estimate the robot platform's pose and velocity based on encoder values and pivot values."""
+    """Estimate the robot platform's pose and velocity based on encoder values and pivot values.
+
+    The geometry of the drives is precomputed and all state is kept in preallocated arrays, so that estimating the
+    odometry does not allocate any arrays."""
 
     def __init__(self, num_drives: int, wheel_configs: List[WheelConfig]):
         """Initialise the pose estimator.
@@ -34,51 +35,82 @@ class PlatformPoseEstimator:
         self._num_drives = num_drives
         self._wheel_configs = wheel_configs
 
+        # Drive geometry: pivot offset, and direction (wa) and distance (d) of the drive from the platform centre.
+        self._pivot_offsets = np.array([wc.a for wc in wheel_configs], dtype=np.float64)
+        wa = np.array([math.atan2(wc.y, wc.x) for wc in wheel_configs], dtype=np.float64)
+        d = np.array([math.sqrt(wc.x**2 + wc.y**2) for wc in wheel_configs], dtype=np.float64)
+        self._cos_wa_over_d = np.cos(wa) / d
+        self._sin_wa_over_d = np.sin(wa) / d
+
+        # Intermediate values, preallocated.
+        self._prev_encoder = np.zeros((num_drives, 2))
+        self._delta_encoder = np.zeros((num_drives, 2))
+        self._sum_delta = np.zeros((num_drives,))  # (wl + wr) * dt
+        self._diff_delta = np.zeros((num_drives,))  # (wr - wl) * dt
+        self._theta = np.zeros((num_drives,))
+        self._cos_theta = np.zeros((num_drives,))
+        self._sin_theta = np.zeros((num_drives,))
+        self._product = np.zeros((num_drives,))
+
+        # Results, updated in place.
+        self._velocity = np.zeros((3,))
+        self._pose = np.zeros((3,))
+
         self.reset()
 
     def reset(self):
         """Reset the pose estimator odometry values."""
-        self._prev_encoder = []  # Will be initialised on first iteration in _estimate_velocity.
-        self._odom_x, self._odom_y, self._odom_a = 0, 0, 0
+        self._encoder_initialized = False  # Will be initialised on first iteration in _estimate_velocity.
+        self._odom_x, self._odom_y, self._odom_a = 0.0, 0.0, 0.0
+        self._pose[:] = (0.0, 0.0, 0.0)
 
-    def _estimate_velocity(self, dt: float, encoder_values: List[List[float]], cur_pivots: List[float]) -> np.ndarray:
+    def _estimate_velocity(self, dt: float, encoder_values: np.ndarray, cur_pivots: np.ndarray) -> np.ndarray:
         """Estimate, from the encoder values, the robot platform's linear and angular velocity.
 
         Args:
             dt: Seconds since last iteration.
-            encoder_values: Values for the encoders for every drive (x, y, a), accumulated over time.
-            cur_pivots: Current pivot values.
+            encoder_values: Values for the two wheel encoders of every drive, accumulated over time, shape (N, 2).
+            cur_pivots: Current pivot values, shape (N,).
 
         Returns:
-            vx, vy, va."""
+            vx, vy, va (this array is updated in place by the next call)."""
         # On first iteration, return zero velocity and set state.
-        if len(self._prev_encoder) == 0:
-            self._prev_encoder = copy.deepcopy(encoder_values)
-
-        vx, vy, va = 0, 0, 0
-
-        atan_angle = CASTOR_OFFSET / WHEEL_DISTANCE
+        if not self._encoder_initialized:
+            self._prev_encoder[:] = encoder_values
+            self._encoder_initialized = True
 
-        for drive_index in range(self._num_drives):
-            cur_enc = encoder_values[drive_index]
-            prev_enc = self._prev_encoder[drive_index]
-            wl = (cur_enc[0] - prev_enc[0]) / dt
-            wr = -(cur_enc[1] - prev_enc[1]) / dt  # Negation: inverted frame.
-            self._prev_encoder[drive_index] = copy.deepcopy(cur_enc)
-            theta = _norm_angle(cur_pivots[drive_index] - self._wheel_configs[drive_index].a)
+        # Wheel displacements since the previous iteration: wl * dt and wr * dt, with wr negated (inverted frame).
+        np.subtract(encoder_values, self._prev_encoder, out=self._delta_encoder)
+        self._prev_encoder[:] = encoder_values
+        delta_l = self._delta_encoder[:, 0]
+        delta_r = self._delta_encoder[:, 1]
+        np.subtract(delta_l, delta_r, out=self._sum_delta)
+        np.add(delta_l, delta_r, out=self._diff_delta)
+        np.negative(self._diff_delta, out=self._diff_delta)
 
-            vx -= WHEEL_RADIUS * (wl + wr) * np.cos(theta)
-            vy -= WHEEL_RADIUS * (wl + wr) * np.sin(theta)
+        np.subtract(cur_pivots, self._pivot_offsets, out=self._theta)
+        np.cos(self._theta, out=self._cos_theta)
+        np.sin(self._theta, out=self._sin_theta)
 
-            wa = math.atan2(self._wheel_configs[drive_index].y, self._wheel_configs[drive_index].x)
-            d = math.sqrt(self._wheel_configs[drive_index].x ** 2 + self._wheel_configs[drive_index].y ** 2)
+        vx = -np.dot(self._sum_delta, self._cos_theta)
+        vy = -np.dot(self._sum_delta, self._sin_theta)
 
-            va += WHEEL_RADIUS * (2 * (wr - wl) * atan_angle * np.cos(theta - wa) - (wr + wl) * np.sin(theta - wa)) / d
+        # Expanding cos(theta - wa) and sin(theta - wa) allows to use the precomputed geometry.
+        atan_angle = CASTOR_OFFSET / WHEEL_DISTANCE
+        np.multiply(self._diff_delta, self._cos_theta, out=self._product)
+        va = 2 * atan_angle * np.dot(self._product, self._cos_wa_over_d)
+        np.multiply(self._diff_delta, self._sin_theta, out=self._product)
+        va += 2 * atan_angle * np.dot(self._product, self._sin_wa_over_d)
+        np.multiply(self._sum_delta, self._sin_theta, out=self._product)
+        va -= np.dot(self._product, self._cos_wa_over_d)
+        np.multiply(self._sum_delta, self._cos_theta, out=self._product)
+        va += np.dot(self._product, self._sin_wa_over_d)
 
         # Average velocities across all wheels.
-        result = np.array([vx, vy, va]) / (2 * self._num_drives)
+        scale = WHEEL_RADIUS / (dt * 2 * self._num_drives)
+        self._velocity[:] = (vx * scale, vy * scale, va * scale)
 
-        return result
+        return self._velocity
 
     def _estimate_pose(self, dt: float, estimated_velocity: np.ndarray) -> np.ndarray:
         """Estimate the robot platform's pose, based on its estimated velocity and previous estimations.
@@ -88,8 +120,8 @@ class PlatformPoseEstimator:
             estimated_velocity: The most recent velocity estimation (see _estimate_velocity).
 
         Returns:
-            The estimated pose (x, y, a) of the platform."""
-        vx, vy, va = estimated_velocity
+            The estimated pose (x, y, a) of the platform (this array is updated in place by the next call)."""
+        vx, vy, va = estimated_velocity.tolist()
 
         if abs(va) <= 0.001:
             dx = vx * dt
@@ -102,32 +134,38 @@ class PlatformPoseEstimator:
             circle_radius = abs(linear_velocity / va)
             sign = -1 if va < 0 else 1
             da = abs(va) * dt
-            dx_rel = circle_radius * np.sin(da)
-            dy_rel = sign * circle_radius * (1 - np.cos(da))
+            dx_rel = circle_radius * math.sin(da)
+            dy_rel = sign * circle_radius * (1 - math.cos(da))
 
             # Displacement relative to previous robot frame.
-            dx = dx_rel * np.cos(direction) - dy_rel * np.sin(direction)
-            dy = dx_rel * np.sin(direction) + dy_rel * np.cos(direction)
+            dx = dx_rel * math.cos(direction) - dy_rel * math.sin(direction)
+            dy = dx_rel * math.sin(direction) + dy_rel * math.cos(direction)
 
         # Displacement relative to odometry frame.
-        self._odom_x += dx * np.cos(self._odom_a) - dy * np.sin(self._odom_a)
-        self._odom_y += dx * np.sin(self._odom_a) + dy * np.cos(self._odom_a)
+        self._odom_x += dx * math.cos(self._odom_a) - dy * math.sin(self._odom_a)
+        self._odom_y += dx * math.sin(self._odom_a) + dy * math.cos(self._odom_a)
         self._odom_a = _norm_angle(self._odom_a + va * dt)
 
-        return np.array([self._odom_x, self._odom_y, self._odom_a])
+        self._pose[:] = (self._odom_x, self._odom_y, self._odom_a)
+        return self._pose
 
     def get_odometry(
-        self, dt: float, encoder_values: List[List[float]], cur_pivots: List[float]
+        self, dt: float, encoder_values: np.ndarray, cur_pivots: np.ndarray
     ) -> Tuple[np.ndarray, np.ndarray]:
         """Get the robot platform's odometry.
 
+        The returned arrays are owned by the estimator and updated in place on every call, each with a single
+        assignment. Copy them if they need to be kept.
+
         Args:
             dt: Seconds since last iteration.
-            encoder_values: Values for the encoders for every drive (x, y, a), accumulated over time.
-            cur_pivots: The current pivot values.
+            encoder_values: Values for the two wheel encoders of every drive, accumulated over time, shape (N, 2).
+            cur_pivots: The current pivot values, shape (N,).
 
         Returns:
             The pose (x, y, a) of the platform and the velocity of the platform."""
+        if dt <= 0.0:
+            return self._pose, self._velocity
         v = self._estimate_velocity(dt, encoder_values, cur_pivots)
         return self._estimate_pose(dt, v), v
 
@@ -147,29 +185,22 @@ class PlatformMonitor:
         self._wheel_configs = wheel_configs
         self._num_wheels = len(wheel_configs)
 
-        # Monitored values.
-        self._status1: List[int]
-        self._status2: List[int]
-        self._encoder: List[List[float]]
-        self._velocity: List[List[float]]
-        self._current: List[List[float]]
-        self._voltage: List[List[float]]
-        self._temperature: List[List[float]]
-        self._voltage_bus: List[float]
-        self._accel: List[List[float]]
-        self._gyro: List[List[float]]
-        self._pressure: List[float]
-        self._current_in: List[float]
-
-        # Odometry.
-        self._prev_encoder = [[0.0, 0.0] for _ in range(self._num_wheels)]
-        self._sum_encoder = [[0.0, 0.0] for _ in range(self._num_wheels)]
+        # Monitored values, read from the process data of the most recent cycle.
+        self._process_data = ProcessDataSnapshot.zeros(self._num_wheels)
+
+        # Odometry. Encoder values of both wheels of every drive, shape (N, 2).
+        self._curr_encoder = np.zeros((self._num_wheels, 2))
+        self._prev_encoder = np.zeros((self._num_wheels, 2))
+        self._delta_encoder = np.zeros((self._num_wheels, 2))
+        self._sum_encoder = np.zeros((self._num_wheels, 2))
         self._encoder_initialized = False
         self._odometry_pose: Attitude2DType = np.zeros((3,))
         self._odometry_velocity: Attitude2DType = np.zeros((3,))
 
         # Intermediate state.
-        self._last_step_time: float = time.time()
+        self._last_step_time: Optional[float] = None
+        self._now = 0.0
+        self._diagnostics: Optional[PlatformDiagnostics] = None
 
         self._pose_estimator = PlatformPoseEstimator(self._num_wheels, self._wheel_configs)
 
@@ -177,150 +208,165 @@ class PlatformMonitor:
     def num_wheels(self) -> int:
         return self._num_wheels
 
-    def _update_encoders(self):
-        """Update the encoder values for the robot platform."""
+    @property
+    def process_data(self) -> ProcessDataSnapshot:
+        """The process data of all drives of the last cycle."""
+        return self._process_data
+
+    def _update_encoders(self, process_data: ProcessDataSnapshot):
+        """Update the accumulated encoder values of all wheels, unwrapping the encoder values at +-PI."""
+        self._curr_encoder[:, 0] = process_data["encoder_1"]
+        self._curr_encoder[:, 1] = process_data["encoder_2"]
+
         if not self._encoder_initialized:
-            for i in range(self._num_wheels):
-                data = self._get_process_data(i)
-                self._prev_encoder[i][0] = data.encoder_1
-                self._prev_encoder[i][1] = data.encoder_2
+            self._prev_encoder[:] = self._curr_encoder
             self._encoder_initialized = True
 
-        # count accumulative encoder value
-        for i in range(self._num_wheels):
-            data = self._get_process_data(i)
-            curr_encoder1 = data.encoder_1
-            curr_encoder2 = data.encoder_2
-
-            if abs(curr_encoder1 - self._prev_encoder[i][0]) > math.pi:
-                if curr_encoder1 < self._prev_encoder[i][0]:
-                    self._sum_encoder[i][0] += curr_encoder1 - self._prev_encoder[i][0] + 2 * math.pi
-                else:
-                    self._sum_encoder[i][0] += curr_encoder1 - self._prev_encoder[i][0] - 2 * math.pi
-            else:
-                self._sum_encoder[i][0] += curr_encoder1 - self._prev_encoder[i][0]
-
-            if abs(curr_encoder2 - self._prev_encoder[i][1]) > math.pi:
-                if curr_encoder2 < self._prev_encoder[i][1]:
-                    self._sum_encoder[i][1] += curr_encoder2 - self._prev_encoder[i][1] + 2 * math.pi
-                else:
-                    self._sum_encoder[i][1] += curr_encoder2 - self._prev_encoder[i][1] - 2 * math.pi
-            else:
-                self._sum_encoder[i][1] += curr_encoder2 - self._prev_encoder[i][1]
-
-            self._prev_encoder[i][0] = curr_encoder1
-            self._prev_encoder[i][1] = curr_encoder2
-
-    def step(self) -> None:
-        """Update the robot platform's state."""
-        # Read data from drives.
-        process_data = [self._get_process_data(i) for i in range(self._num_wheels)]
-        self._status1 = [pd.status1 for pd in process_data]
-        self._status2 = [pd.status2 for pd in process_data]
-        self._encoder = [[pd.encoder_1, pd.encoder_2, pd.encoder_pivot] for pd in process_data]
-        self._velocity = [[pd.velocity_1, pd.velocity_2, pd.velocity_pivot] for pd in process_data]
-        self._current = [[pd.current_1_d, pd.current_2_d] for pd in process_data]
-        self._voltage = [[pd.voltage_1, pd.voltage_2] for pd in process_data]
-        self._temperature = [[pd.temperature_1, pd.temperature_2, pd.temperature_imu] for pd in process_data]
-        self._voltage_bus = [pd.voltage_bus for pd in process_data]
-        self._accel = [[pd.accel_x, pd.accel_y, pd.accel_z] for pd in process_data]
-        self._gyro = [[pd.gyro_x, pd.gyro_y, pd.gyro_z] for pd in process_data]
-        self._pressure = [pd.pressure for pd in process_data]
-        self._current_in = [pd.current_in for pd in process_data]
-
-        self._update_encoders()
+        # count accumulative encoder value, taking the shortest route between the previous and current value
+        np.subtract(self._curr_encoder, self._prev_encoder, out=self._delta_encoder)
+        self._delta_encoder += math.pi
+        np.remainder(self._delta_encoder, math.tau, out=self._delta_encoder)
+        self._delta_encoder -= math.pi
+        self._sum_encoder += self._delta_encoder
+
+        self._prev_encoder[:] = self._curr_encoder
+
+    def step(self, process_data: ProcessDataSnapshot, now: float, update_odometry: bool = True) -> None:
+        """Update the robot platform's state.
+
+        Args:
+            process_data: The process data of all drives for this cycle.
+            now: The time (s) of this cycle, see `CycleClock`.
+            update_odometry: Whether to update the odometry in this cycle, see `PlatformTaskRates`."""
+        # Keep data from drives, the getters read from it.
+        self._process_data = process_data
+        self._now = now
+
+        if update_odometry:
+            self._update_odometry(process_data, now)
+
+    def _update_odometry(self, process_data: ProcessDataSnapshot, now: float) -> None:
+        """Update the accumulated encoder values and the estimated pose and velocity."""
+        self._update_encoders(process_data)
 
         # Update delta time.
-        now = time.time()
-        delta_time = now - self._last_step_time
+        delta_time = now - self._last_step_time if self._last_step_time is not None else 0.0
         self._last_step_time = now
 
         # Estimate odometry.
-        pivots = [pd.encoder_pivot for pd in process_data]
+        pivots = process_data["encoder_pivot"].astype(np.float64)
         self._odometry_pose, self._odometry_velocity = self._pose_estimator.get_odometry(
             delta_time, self._sum_encoder, pivots
         )
 
     def get_estimated_robot_pose(self) -> Attitude2DType:
         """Get the robot platform's estimated pose based on fused estimator."""
-        return self._odometry_pose
+        return self._odometry_pose.copy()
 
     def get_estimated_velocity(self) -> Vector3DType:
         """Get the robot platform's estimated velocity based on odometry."""
-        return self._odometry_velocity
+        return self._odometry_velocity.copy()
+
+    def get_accumulated_encoders(self) -> np.ndarray:
+        """Returns the accumulated (unwrapped) encoder values of wheel1 and wheel2 for all drives, shape (N, 2)."""
+        return self._sum_encoder.copy()
 
     def get_status1(self, wheel_index: int) -> int:
         """Returns the status1 register value for a specific drive, see `ethercat.py`."""
-        return self._status1[wheel_index]
+        return int(self._process_data["status1"][wheel_index])
 
     def get_status2(self, wheel_index: int) -> int:
         """Returns the status2 register value for a specific drive, see `ethercat.py`."""
-        return self._status2[wheel_index]
+        return int(self._process_data["status2"][wheel_index])
 
     def get_encoder(self, wheel_index: int) -> List[float]:
         """Returns a list of the encoder value for wheel1, wheel2 and pivot for a specific drive."""
-        return self._encoder[wheel_index]
+        return self._get_fields(wheel_index, "encoder_1", "encoder_2", "encoder_pivot")
 
     def get_velocity(self, wheel_index: int) -> List[float]:
         """Returns a list of the velocity value for wheel1, wheel2 and pivot encoders for a specific drive."""
-        return self._velocity[wheel_index]
+        return self._get_fields(wheel_index, "velocity_1", "velocity_2", "velocity_pivot")
 
     def get_current(self, wheel_index: int) -> List[float]:
         """Returns a list of the direct current for wheel1 and wheel2 for a specific drive."""
-        return self._current[wheel_index]
+        return self._get_fields(wheel_index, "current_1_d", "current_2_d")
 
     def get_voltage(self, wheel_index: int) -> List[float]:
         """Returns a list of the pwm voltage for wheel1 and wheel2 for a specific drive."""
-        return self._voltage[wheel_index]
+        return self._get_fields(wheel_index, "voltage_1", "voltage_2")
 
     def get_temperature(self, wheel_index: int) -> List[float]:
         """Returns a list of the temperature for wheel1, wheel2 and IMU for a specific drive."""
-        return self._temperature[wheel_index]
+        return self._get_fields(wheel_index, "temperature_1", "temperature_2", "temperature_imu")
 
     def get_voltage_bus(self, wheel_index: int) -> float:
         """Returns the bus voltage for a specific drive."""
-        return self._voltage_bus[wheel_index]
+        return float(self._process_data["voltage_bus"][wheel_index])
 
     def get_voltage_bus_max(self) -> float:
         """Returns the maximal bus voltage of all drives."""
-        return max(self._voltage_bus)
+        return float(np.max(self._process_data["voltage_bus"]))
 
     def get_acceleration(self, wheel_index: int) -> List[float]:
         """Returns a list of the x, y and z acceleration values for IMU of a specific drive."""
-        return self._accel[wheel_index]
+        return self._get_fields(wheel_index, "accel_x", "accel_y", "accel_z")
 
     def get_gyro(self, wheel_index: int) -> List[float]:
         """Returns a list of the x, y and z gyro values for IMU of a specific drive."""
-        return self._gyro[wheel_index]
+        return self._get_fields(wheel_index, "gyro_x", "gyro_y", "gyro_z")
 
     def get_pressure(self, wheel_index: int) -> float:
         """Returns the pressure for a specific drive."""
-        return self._pressure[wheel_index]
+        return float(self._process_data["pressure"][wheel_index])
 
     def get_current_in(self, wheel_index: int) -> float:
         """Returns the input current for a specific drive."""
-        return self._current_in[wheel_index]
+        return float(self._process_data["current_in"][wheel_index])
 
     def get_current_in_total(self) -> float:
         """Returns the total input current for all drives."""
-        return sum(self._current_in)
+        return float(np.sum(self._process_data["current_in"], dtype=np.float64))
 
     def get_power(self, wheel_index: int) -> float:
         """Returns the power for a specific drive."""
-        return self._voltage_bus[wheel_index] * self._current_in[wheel_index]
+        return self.get_voltage_bus(wheel_index) * self.get_current_in(wheel_index)
 
     def get_power_total(self) -> float:
         """Returns the total power for all drives."""
-        return sum([self._voltage_bus[i] * self._current_in[i] for i in range(self._num_wheels)])
+        voltage_bus = self._process_data["voltage_bus"].astype(np.float64)
+        return float(np.dot(voltage_bus, self._process_data["current_in"]))
+
+    def update_diagnostics(self) -> None:
+        """Compute the diagnostics from the process data of the current cycle, see `get_diagnostics()`."""
+        process_data = self._process_data
+        voltage_bus = process_data["voltage_bus"].astype(np.float64)
+        current_in = process_data["current_in"].astype(np.float64)
+        temperature = np.stack(
+            [process_data["temperature_1"], process_data["temperature_2"], process_data["temperature_imu"]], axis=1
+        ).astype(np.float64)
+        self._diagnostics = PlatformDiagnostics(
+            time=self._now,
+            voltage_bus=voltage_bus,
+            current_in=current_in,
+            power=voltage_bus * current_in,
+            temperature=temperature,
+            pressure=process_data["pressure"].astype(np.float64),
+        )
 
-    def _get_process_data(self, wheel_index: int) -> TxPDO1:
-        ethercat_index = self._wheel_configs[wheel_index].ethercat_number
-        return TxPDO1.from_buffer_copy(self._master.slaves[ethercat_index - 1].input)
+    def get_diagnostics(self, refresh: bool = False) -> PlatformDiagnostics:
+        """Returns the diagnostics of all drives (bus voltage, input current and power, temperatures and pressure).
+
+        These are computed at a low rate by the `RobilePlatform`, see `PlatformTaskRates`.
+
+        Args:
+            refresh: If true, compute the diagnostics from the process data of the current cycle first."""
+        if refresh or self._diagnostics is None:
+            self.update_diagnostics()
+        return self._diagnostics
 
-    def _set_process_data(self, wheel_index: int, data: RxPDO1) -> None:
-        ethercat_index = self._wheel_configs[wheel_index].ethercat_number
-        self._master.slaves[ethercat_index - 1].output = bytes(data)
+    def _get_fields(self, wheel_index: int, *fields: str) -> List[float]:
+        """Returns a list of the given process data fields for a specific drive."""
+        return [float(self._process_data[field][wheel_index]) for field in fields]
 
     def reset_odometry(self):
-        self._odometry = np.zeros((3,))
         self._pose_estimator.reset()
@@ -0,0 +1,198 @@
+"""Closed-loop control of the platform towards a goal pose in the odometry frame, next to the EtherCAT loop.
+
+The `PoseGoalController` computes a velocity target at every cycle from the estimated pose of the platform, so no
+network round trip is in the feedback path. The speed towards the goal is proportional to the remaining error, and
+limited such that the platform can still decelerate to the goal within the deceleration limits of the
+`VelocityPlatformController`."""
+
+import math
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional, Tuple
+
+from airo_tulip.hardware.platform_driver import check_platform_velocity_target
+from airo_tulip.hardware.structs import Attitude2DType, PlatformLimits
+from airo_tulip.hardware.util import get_shortest_angle
+
+POSE_GOAL_GAIN_LINEAR = 2.0  # 1/s, linear velocity per meter of position error
+POSE_GOAL_GAIN_ANGULAR = 2.0  # 1/s, angular velocity per radian of orientation error
+POSE_GOAL_COMMAND_TIMEOUT = 0.1  # s, timeout of the velocity targets towards a goal, stops the platform if it stalls
+
+
+class PoseGoalState(Enum):
+    """Execution state of a pose goal."""
+
+    IDLE = 0  # no goal was sent yet
+    RUNNING = 1
+    SUCCEEDED = 2  # the platform is within the tolerances of the goal
+    PREEMPTED = 3  # replaced by a velocity target or trajectory
+    CANCELLED = 4
+    TIMED_OUT = 5  # the goal was not reached in time
+
+
+@dataclass(frozen=True)
+class PoseGoal:
+    """A goal pose with the constraints to reach it."""
+
+    x: float  # m
+    y: float  # m
+    a: float  # rad
+    relative: bool = False  # whether the goal is relative to the pose of the platform when it starts, in its frame
+    max_vel_linear: float = 0.3  # m/s
+    max_vel_angular: float = 0.5  # rad/s
+    position_tolerance: float = 0.01  # m
+    angle_tolerance: float = 0.02  # rad
+    timeout: float = 30.0  # s
+
+
+@dataclass(frozen=True)
+class PoseGoalStatus:
+    """Progress of the latest pose goal."""
+
+    goal_id: int  # 0 if no goal was sent yet
+    state: PoseGoalState
+    goal: Attitude2DType  # the goal pose in the odometry frame, NaN for a relative goal that did not start yet
+    position_error: float = 0.0  # remaining distance (m) to the goal
+    angle_error: float = 0.0  # remaining orientation error (rad) to the goal
+
+
+def check_pose_goal(goal: PoseGoal) -> None:
+    """Check a pose goal before sending it. Raises a ValueError if it is invalid or exceeds the safety limits."""
+    values = (
+        goal.x,
+        goal.y,
+        goal.a,
+        goal.max_vel_linear,
+        goal.max_vel_angular,
+        goal.position_tolerance,
+        goal.angle_tolerance,
+        goal.timeout,
+    )
+    if not all(math.isfinite(value) for value in values):
+        raise ValueError("Pose goal values must be finite")
+    if goal.max_vel_linear <= 0.0 or goal.max_vel_angular <= 0.0:
+        raise ValueError("Pose goal maximum velocities must be positive")
+    if goal.position_tolerance <= 0.0 or goal.angle_tolerance <= 0.0:
+        raise ValueError("Pose goal tolerances must be positive")
+    if goal.timeout <= 0.0:
+        raise ValueError("Pose goal timeout must be positive")
+    check_platform_velocity_target(goal.max_vel_linear, 0.0, goal.max_vel_angular, POSE_GOAL_COMMAND_TIMEOUT)
+
+
+class PoseGoalController:
+    """Drives the platform towards a goal pose, at every cycle of the EtherCAT loop."""
+
+    def __init__(self):
+        self._goal_id = 0
+        self._state = PoseGoalState.IDLE
+        self._goal = PoseGoal(0.0, 0.0, 0.0)
+        self._goal_pose = (0.0, 0.0, 0.0)
+        self._start_time = 0.0
+        self._position_error = 0.0
+        self._angle_error = 0.0
+
+    @property
+    def status(self) -> PoseGoalStatus:
+        return PoseGoalStatus(self._goal_id, self._state, self._goal_pose, self._position_error, self._angle_error)
+
+    @property
+    def running(self) -> bool:
+        return self._state == PoseGoalState.RUNNING
+
+    def start(self, goal_id: int, goal: PoseGoal, pose: Attitude2DType, now: float) -> None:
+        """Start driving towards a goal, replacing the current one.
+
+        Args:
+            goal_id: The id of the goal.
+            goal: The goal, see `check_pose_goal`.
+            pose: The current pose of the platform in the odometry frame.
+            now: The time (s) of the current cycle."""
+        if goal.relative:
+            x, y, a = pose[0], pose[1], pose[2]
+            cos_a, sin_a = math.cos(a), math.sin(a)
+            goal_pose = (
+                x + cos_a * goal.x - sin_a * goal.y,
+                y + sin_a * goal.x + cos_a * goal.y,
+                get_shortest_angle(a + goal.a, 0.0),
+            )
+        else:
+            goal_pose = (goal.x, goal.y, goal.a)
+
+        self._goal_id = goal_id
+        self._state = PoseGoalState.RUNNING
+        self._goal = goal
+        self._goal_pose = goal_pose
+        self._start_time = now
+
+    def preempt(self) -> None:
+        """Stop driving towards the goal because another velocity target or trajectory was set."""
+        if self._state == PoseGoalState.RUNNING:
+            self._state = PoseGoalState.PREEMPTED
+
+    def cancel(self) -> bool:
+        """Stop driving towards the goal.
+
+        Returns:
+            True if a goal was running, in which case the platform should be stopped."""
+        if self._state != PoseGoalState.RUNNING:
+            return False
+        self._state = PoseGoalState.CANCELLED
+        return True
+
+    def step(self, pose: Attitude2DType, now: float, limits: PlatformLimits) -> Optional[Tuple[float, float, float]]:
+        """Compute the velocity target towards the goal.
+
+        Args:
+            pose: The current pose of the platform in the odometry frame.
+            now: The time (s) of the current cycle.
+            limits: The velocity and deceleration limits of the platform.
+
+        Returns:
+            The velocity target (x, y, a) of the platform in its own frame, zero when the goal was just reached or
+            timed out, or None if no goal is running."""
+        if self._state != PoseGoalState.RUNNING:
+            return None
+
+        x, y, a = float(pose[0]), float(pose[1]), float(pose[2])
+        goal = self._goal
+        goal_x, goal_y, goal_a = self._goal_pose
+        dx, dy = goal_x - x, goal_y - y
+        position_error = math.hypot(dx, dy)
+        angle_error = get_shortest_angle(goal_a, a)
+        self._position_error = position_error
+        self._angle_error = angle_error
+
+        if position_error <= goal.position_tolerance and abs(angle_error) <= goal.angle_tolerance:
+            self._state = PoseGoalState.SUCCEEDED
+            return 0.0, 0.0, 0.0
+        if now - self._start_time > goal.timeout:
+            self._state = PoseGoalState.TIMED_OUT
+            return 0.0, 0.0, 0.0
+
+        # Speeds from which the platform can still stop at the goal, within the deceleration limits.
+        speed = 0.0
+        if position_error > goal.position_tolerance:
+            speed = min(
+                goal.max_vel_linear,
+                limits.max_vel_linear,
+                POSE_GOAL_GAIN_LINEAR * position_error,
+                math.sqrt(2.0 * limits.max_dec_linear * position_error),
+            )
+        vel_a = 0.0
+        if abs(angle_error) > goal.angle_tolerance:
+            vel_a = math.copysign(
+                min(
+                    goal.max_vel_angular,
+                    limits.max_vel_angular,
+                    POSE_GOAL_GAIN_ANGULAR * abs(angle_error),
+                    math.sqrt(2.0 * limits.max_dec_angular * abs(angle_error)),
+                ),
+                angle_error,
+            )
+
+        # Velocity towards the goal in the odometry frame, rotated into the frame of the platform.
+        if speed == 0.0:
+            return 0.0, 0.0, vel_a
+        vel_x_odom, vel_y_odom = speed * dx / position_error, speed * dy / position_error
+        cos_a, sin_a = math.cos(a), math.sin(a)
+        return cos_a * vel_x_odom + sin_a * vel_y_odom, -sin_a * vel_x_odom + cos_a * vel_y_odom, vel_a
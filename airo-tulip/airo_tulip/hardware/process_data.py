@@ -0,0 +1,57 @@
+"""Decoded process data of all drives, shared by the PlatformMonitor and PlatformDriver within a cycle."""
+
+from typing import Sequence
+
+import numpy as np
+import pysoem
+from airo_tulip.hardware.ethercat import TXPDO1_DTYPE
+
+
+class ProcessDataSnapshot:
+    """Snapshot of the `TxPDO1` process data of all drives for a single EtherCAT cycle.
+
+    The input buffers of the drives are decoded once, right after receiving the process data, into a `(num_drives,)`
+    structured array with dtype `TXPDO1_DTYPE`. Indexing the snapshot with a `TxPDO1` field name returns that field
+    for all drives as a contiguous array, e.g., `snapshot["encoder_pivot"]`."""
+
+    def __init__(self, data: np.ndarray):
+        """Initialise the snapshot.
+
+        Args:
+            data: The decoded process data, one entry per drive (in the order of the wheel configurations)."""
+        self._data = data
+
+    @classmethod
+    def from_master(cls, master: pysoem.Master, slave_indices: Sequence[int]) -> "ProcessDataSnapshot":
+        """Decode the input buffers of the drives.
+
+        Args:
+            master: The EtherCAT master, after receiving the process data.
+            slave_indices: Index in `master.slaves` of every drive.
+
+        Returns:
+            The snapshot."""
+        slaves = master.slaves
+        buffer = b"".join([slaves[i].input for i in slave_indices])
+        return cls(np.frombuffer(buffer, dtype=TXPDO1_DTYPE))
+
+    @classmethod
+    def zeros(cls, num_drives: int) -> "ProcessDataSnapshot":
+        """Create a snapshot with all fields set to zero, used before the first cycle."""
+        return cls(np.zeros((num_drives,), dtype=TXPDO1_DTYPE))
+
+    @property
+    def data(self) -> np.ndarray:
+        """The structured array with the process data of all drives."""
+        return self._data
+
+    @property
+    def sensor_ts(self) -> int:
+        """The EtherCAT timestamp (ns) of sensor acquisition of the first drive."""
+        return int(self._data["sensor_ts"][0])
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self._data[field]
+
+    def __len__(self) -> int:
+        return len(self._data)
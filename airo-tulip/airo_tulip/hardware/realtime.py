@@ -0,0 +1,272 @@
+"""Scheduling of the EtherCAT loop at a fixed frequency, with statistics on its timing, and real-time settings for the
+thread that runs it."""
+
+import bisect
+import ctypes
+import ctypes.util
+import gc
+import os
+import time
+from dataclasses import dataclass, field
+from threading import Event, Lock
+from typing import Callable, List, Optional
+
+from loguru import logger
+
+LATENCY_BIN_EDGES_US = [0, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+"""Lower edges (µs) of the bins of the wake-up latency histogram. The last bin has no upper edge."""
+
+GC_MIN_SLACK_FRACTION = 0.5
+"""Garbage is only collected in slack time if at least this fraction of the period is left before the next deadline."""
+
+GC_OVERDUE_FACTOR = 10
+"""Garbage is collected regardless of the slack time once this many times the allocation threshold is exceeded, so that
+memory does not grow without bounds when the loop is overloaded."""
+
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+
+@dataclass
+class LoopStatistics:
+    """Timing statistics of a `DeadlineLoop`. All durations are in seconds.
+
+    The wake-up latency of a cycle is the time between its deadline and the start of its step. A deadline is missed
+    when a step ends after the deadline of the next cycle, in which case the loop skips the missed cycles."""
+
+    frequency: float  # target frequency (Hz)
+    cycles: int = 0
+    missed_deadlines: int = 0
+    period_mean: float = 0.0
+    period_min: float = 0.0
+    period_max: float = 0.0
+    latency_max: float = 0.0  # worst-case wake-up latency
+    step_duration_mean: float = 0.0
+    step_duration_max: float = 0.0
+    gc_collections: int = 0  # garbage collections in slack time, see `RealtimeSettings.control_gc`
+    latency_bin_edges_us: List[int] = field(default_factory=lambda: list(LATENCY_BIN_EDGES_US))
+    latency_histogram: List[int] = field(default_factory=lambda: [0] * len(LATENCY_BIN_EDGES_US))
+
+
+class DeadlineLoop:
+    """Runs a step function at a fixed frequency, using absolute deadlines on the monotonic clock.
+
+    Every deadline is exactly one period after the previous one, so time spent outside of the step (sleeping, thread
+    switches) does not accumulate as drift. When a step overruns, the missed deadlines are counted and skipped, such
+    that the loop stays in phase instead of running a burst of catch-up cycles."""
+
+    def __init__(self, frequency: float, spin_duration: float = 0.0):
+        """Initialise the loop.
+
+        Args:
+            frequency: The loop frequency (Hz).
+            spin_duration: The last part (s) of every wait that is spent busy-waiting instead of sleeping, which
+                reduces the wake-up latency at the cost of CPU time (default: 0.0, only sleep)."""
+        if frequency <= 0:
+            raise ValueError("The loop frequency must be positive.")
+        self._frequency = frequency
+        self._period_ns = round(1e9 / frequency)
+        self._spin_duration_ns = round(spin_duration * 1e9)
+
+        self._lock = Lock()
+        self._reset_statistics()
+
+    @property
+    def frequency(self) -> float:
+        return self._frequency
+
+    def run(self, step: Callable[[], None], should_stop: Event, collect_garbage: bool = False) -> None:
+        """Call `step` once every period, until `should_stop` is set.
+
+        Args:
+            step: The function to call every cycle.
+            should_stop: Stops the loop when set, after the current cycle.
+            collect_garbage: If true, run the garbage collector in the slack time after a step, for when automatic
+                garbage collection is disabled (see `RealtimeSettings.control_gc`)."""
+        deadline_ns = time.monotonic_ns()
+        previous_start_ns = None
+        while not should_stop.is_set():
+            start_ns = self._wait_until(deadline_ns)
+            step()
+            end_ns = step_end_ns = time.monotonic_ns()
+
+            if collect_garbage:
+                slack_ns = deadline_ns + self._period_ns - end_ns
+                if self._collect_garbage(overdue_only=slack_ns < GC_MIN_SLACK_FRACTION * self._period_ns):
+                    end_ns = time.monotonic_ns()
+
+            latency_ns = start_ns - deadline_ns
+            deadline_ns += self._period_ns
+            missed = 0
+            if end_ns > deadline_ns:
+                missed = (end_ns - deadline_ns) // self._period_ns + 1
+                deadline_ns += missed * self._period_ns
+                logger.debug("EtherCAT loop overran by {} cycles.", missed)
+
+            period_ns = start_ns - previous_start_ns if previous_start_ns is not None else None
+            previous_start_ns = start_ns
+            self._record(latency_ns, period_ns, step_end_ns - start_ns, missed)
+
+    def get_statistics(self) -> LoopStatistics:
+        """Get a copy of the timing statistics since the start of the loop or the last reset."""
+        with self._lock:
+            stats = self._statistics
+            periods = self._period_count
+            return LoopStatistics(
+                frequency=self._frequency,
+                cycles=stats.cycles,
+                missed_deadlines=stats.missed_deadlines,
+                period_mean=self._period_sum_ns * 1e-9 / periods if periods > 0 else 0.0,
+                period_min=stats.period_min,
+                period_max=stats.period_max,
+                latency_max=stats.latency_max,
+                step_duration_mean=self._step_duration_sum_ns * 1e-9 / stats.cycles if stats.cycles > 0 else 0.0,
+                step_duration_max=stats.step_duration_max,
+                gc_collections=stats.gc_collections,
+                latency_histogram=list(stats.latency_histogram),
+            )
+
+    def reset_statistics(self) -> None:
+        """Reset the timing statistics, e.g., after start-up."""
+        with self._lock:
+            self._reset_statistics()
+
+    def _reset_statistics(self) -> None:
+        self._statistics = LoopStatistics(self._frequency)
+        self._period_sum_ns = 0
+        self._period_count = 0
+        self._step_duration_sum_ns = 0
+
+    def _collect_garbage(self, overdue_only: bool) -> bool:
+        """Collect the oldest generation whose allocation count exceeds its threshold, like the automatic garbage
+        collector would. If `overdue_only`, only collect once the threshold is exceeded `GC_OVERDUE_FACTOR` times.
+        Returns whether a collection ran."""
+        counts = gc.get_count()
+        thresholds = gc.get_threshold()
+        factor = GC_OVERDUE_FACTOR if overdue_only else 1
+        for generation in reversed(range(len(counts))):
+            if thresholds[generation] > 0 and counts[generation] > factor * thresholds[generation]:
+                gc.collect(generation)
+                with self._lock:
+                    self._statistics.gc_collections += 1
+                return True
+        return False
+
+    def _wait_until(self, deadline_ns: int) -> int:
+        """Sleep (and optionally spin) until the deadline. Returns the time at which the wait ended."""
+        now_ns = time.monotonic_ns()
+        sleep_ns = deadline_ns - now_ns - self._spin_duration_ns
+        if sleep_ns > 0:
+            time.sleep(sleep_ns * 1e-9)
+            now_ns = time.monotonic_ns()
+        while now_ns < deadline_ns:
+            now_ns = time.monotonic_ns()
+        return now_ns
+
+    def _record(self, latency_ns: int, period_ns: Optional[int], step_duration_ns: int, missed: int) -> None:
+        """Add the timing of a single cycle to the statistics."""
+        with self._lock:
+            stats = self._statistics
+            stats.cycles += 1
+            stats.missed_deadlines += missed
+
+            latency = latency_ns * 1e-9
+            stats.latency_max = max(stats.latency_max, latency)
+            stats.latency_histogram[bisect.bisect_right(LATENCY_BIN_EDGES_US, latency_ns * 1e-3) - 1] += 1
+
+            step_duration = step_duration_ns * 1e-9
+            stats.step_duration_max = max(stats.step_duration_max, step_duration)
+            self._step_duration_sum_ns += step_duration_ns
+
+            if period_ns is not None:
+                period = period_ns * 1e-9
+                if self._period_count == 0:
+                    stats.period_min = stats.period_max = period
+                else:
+                    stats.period_min = min(stats.period_min, period)
+                    stats.period_max = max(stats.period_max, period)
+                self._period_sum_ns += period_ns
+                self._period_count += 1
+
+
+@dataclass
+class RealtimeSettings:
+    """Opt-in real-time settings for the thread that runs the EtherCAT loop. Most of these require privileges
+    (e.g., `CAP_SYS_NICE` and `CAP_IPC_LOCK`, or an `rtprio` and `memlock` limit for the user) and Linux."""
+
+    cpu: Optional[int] = None  # pin the EtherCAT thread to this core, and the other threads to the remaining cores
+    priority: Optional[int] = 80  # SCHED_FIFO priority (1-99) of the EtherCAT thread, None to keep the default
+    lock_memory: bool = True  # lock all current and future memory of the process in RAM
+    control_gc: bool = True  # freeze the objects created during start-up and only collect garbage in slack time
+
+
+@dataclass
+class RealtimeStatus:
+    """Which of the `RealtimeSettings` actually took effect. `messages` explains settings that did not."""
+
+    cpu_affinity: bool = False
+    sched_fifo: bool = False
+    memory_locked: bool = False
+    gc_controlled: bool = False
+    messages: List[str] = field(default_factory=list)
+
+
+def isolate_cpu(cpu: int) -> bool:
+    """Restrict the calling thread, and threads it creates later on, to all cores but `cpu`.
+
+    Call this before starting the threads that should not compete with the EtherCAT thread. Returns whether the
+    affinity was changed, which is not possible if `cpu` is the only available core."""
+    try:
+        other_cpus = os.sched_getaffinity(0) - {cpu}
+        if not other_cpus:
+            return False
+        os.sched_setaffinity(0, other_cpus)
+        return True
+    except (AttributeError, OSError):
+        return False
+
+
+def apply_realtime_settings(settings: RealtimeSettings) -> RealtimeStatus:
+    """Apply the real-time settings to the calling thread (and process, for memory locking and garbage collection).
+
+    Settings that cannot be applied are skipped, such that the EtherCAT loop still runs without privileges.
+
+    Args:
+        settings: The settings to apply.
+
+    Returns:
+        Which settings took effect."""
+    status = RealtimeStatus()
+
+    if settings.cpu is not None:
+        try:
+            # On Linux, pid 0 refers to the calling thread.
+            os.sched_setaffinity(0, {settings.cpu})
+            status.cpu_affinity = True
+        except (AttributeError, OSError) as e:
+            status.messages.append(f"Could not pin the EtherCAT thread to CPU {settings.cpu}: {e}")
+
+    if settings.priority is not None:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(settings.priority))
+            status.sched_fifo = True
+        except (AttributeError, OSError) as e:
+            status.messages.append(f"Could not set SCHED_FIFO priority {settings.priority}: {e}")
+
+    if settings.lock_memory:
+        libc_name = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(libc_name, use_errno=True) if libc_name is not None else None
+        if libc is not None and libc.mlockall(MCL_CURRENT | MCL_FUTURE) == 0:
+            status.memory_locked = True
+        else:
+            error = os.strerror(ctypes.get_errno()) if libc is not None else "libc not found"
+            status.messages.append(f"Could not lock memory: {error}")
+
+    if settings.control_gc:
+        # Objects created during start-up are long-lived: exclude them from all future collections.
+        gc.collect()
+        gc.freeze()
+        gc.disable()
+        status.gc_controlled = True
+
+    return status
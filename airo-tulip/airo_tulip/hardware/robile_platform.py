@@ -1,12 +1,14 @@
 """The RobilePlatform drives the robot through EtherCAT."""
 
-from typing import List
+from typing import Dict, List, Optional
 
 import pysoem
+from airo_tulip.hardware.clock import CycleClock, SensorTimestampClock
 from airo_tulip.hardware.ethercat import EC_STATE_OPERATIONAL, EC_STATE_SAFE_OP
 from airo_tulip.hardware.platform_driver import PlatformDriver, PlatformDriverType
 from airo_tulip.hardware.platform_monitor import PlatformMonitor
-from airo_tulip.hardware.structs import WheelConfig
+from airo_tulip.hardware.process_data import ProcessDataSnapshot
+from airo_tulip.hardware.structs import PlatformTaskRates, TorqueControllerGains, WheelConfig
 from loguru import logger
 
 
@@ -18,19 +20,36 @@ class RobilePlatform:
         device: str,
         wheel_configs: List[WheelConfig],
         controller_type: PlatformDriverType,
+        master: Optional[pysoem.Master] = None,
+        torque_controller_gains: Optional[Dict[PlatformDriverType, List[TorqueControllerGains]]] = None,
+        clock: Optional[CycleClock] = None,
+        task_rates: Optional[PlatformTaskRates] = None,
     ):
         """Initialize the RobilePlatform.
 
         Args:
             device: The EtherCAT device name.
             wheel_configs: A list of wheel configurations specific to your platform.
-            enable_rerun: Enable logging of monitor values to Rerun. Disabled by default."""
+            controller_type: The type of controller to use (velocity or compliant mode).
+            master: The EtherCAT master (default: a new `pysoem.Master`).
+                Pass a `SimulatedMaster` to run without hardware.
+            torque_controller_gains: Per compliant driver type, the torque controller gains for every motor
+                (default: `DEFAULT_TORQUE_CONTROLLER_GAINS`). See `PlatformDriver`.
+            clock: The time base for odometry and control (default: a `SensorTimestampClock`, which follows the
+                EtherCAT timestamps of the drives).
+            task_rates: The rates at which odometry and diagnostics are updated (default: `PlatformTaskRates()`)."""
         self._device = device
         self._ethercat_initialized = False
 
-        self._master = pysoem.Master()
-        self._driver = PlatformDriver(self._master, wheel_configs, controller_type)
+        self._master = master if master is not None else pysoem.Master()
+        self._clock = clock if clock is not None else SensorTimestampClock()
+        self._task_rates = task_rates if task_rates is not None else PlatformTaskRates()
+        if self._task_rates.odometry < 1 or self._task_rates.diagnostics < 1:
+            raise ValueError("Task rate divisors must be at least 1.")
+        self._cycle = 0
+        self._driver = PlatformDriver(self._master, wheel_configs, controller_type, torque_controller_gains)
         self._monitor = PlatformMonitor(self._master, wheel_configs)
+        self._drive_slave_indices = [wheel_config.ethercat_number - 1 for wheel_config in wheel_configs]
 
     @property
     def driver(self) -> PlatformDriver:
@@ -40,6 +59,15 @@ class RobilePlatform:
     def monitor(self) -> PlatformMonitor:
         return self._monitor
 
+    @property
+    def clock(self) -> CycleClock:
+        return self._clock
+
+    @property
+    def diagnostics_updated(self) -> bool:
+        """Whether the last `step()` updated the diagnostics, see `PlatformTaskRates`."""
+        return self._cycle > 0 and (self._cycle - 1) % self._task_rates.diagnostics == 0
+
     def init_ethercat(self) -> bool:
         """
         Initializes the EtherCAT interface and all connected slaves into an operational state.
@@ -98,6 +126,18 @@ class RobilePlatform:
         Main processing loop of the EtherCAT master, must be called frequently.
         """
         self._master.receive_processdata()
-        self._monitor.step()
-        self._driver.step()
+        process_data = self._read_process_data()
+        now = self._clock.update(process_data)
+
+        # Wheel control runs every cycle, odometry and diagnostics at their own rate.
+        self._monitor.step(process_data, now, update_odometry=self._cycle % self._task_rates.odometry == 0)
+        self._driver.step(process_data, now)
+        if self._cycle % self._task_rates.diagnostics == 0:
+            self._monitor.update_diagnostics()
+        self._cycle += 1
+
         self._master.send_processdata()
+
+    def _read_process_data(self) -> ProcessDataSnapshot:
+        """Decode the process data of all drives, once per cycle."""
+        return ProcessDataSnapshot.from_master(self._master, self._drive_slave_indices)
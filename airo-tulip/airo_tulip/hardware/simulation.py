@@ -0,0 +1,269 @@
+"""Simulated EtherCAT master, used to run the RobilePlatform without KELO hardware.
+
+The `SimulatedMaster` is a drop-in replacement for `pysoem.Master`: it exposes a list of slaves with `input` and
+`output` byte buffers laid out as `TxPDO1` and `RxPDO1` respectively, and a simple kinematic model of every KELO drive
+(two wheels and a pivot) that responds to the velocity or torque setpoints sent by the `PlatformDriver`.
+This allows profiling and testing the EtherCAT loop (and the `TulipServer`) on any machine."""
+
+import ctypes
+import math
+import time
+from typing import List, Optional
+
+from airo_tulip.hardware.constants import WHEEL_DISTANCE, WHEEL_RADIUS
+from airo_tulip.hardware.ethercat import (
+    COM1_ENABLE1,
+    COM1_ENABLE2,
+    COM1_MODE_VELOCITY,
+    EC_STATE_OPERATIONAL,
+    EC_STATE_SAFE_OP,
+    STAT1_ENABLED1,
+    STAT1_ENABLED2,
+    STAT1_ENC_1_OK,
+    STAT1_ENC_2_OK,
+    STAT1_ENC_PIVOT_OK,
+    STAT1_UNDERVOLTAGE,
+    RxPDO1,
+    TxPDO1,
+)
+from airo_tulip.hardware.structs import WheelConfig
+
+EC_STATE_NONE = 0x00
+EC_STATE_INIT = 0x01
+EC_STATE_PRE_OP = 0x02
+
+# Status registers as reported by real drives, see `PlatformDriver._has_wheel_status_error`.
+SIM_STATUS1_DISABLED = STAT1_ENC_1_OK | STAT1_ENC_2_OK | STAT1_ENC_PIVOT_OK | STAT1_UNDERVOLTAGE
+SIM_STATUS2 = 2051
+
+# Parameters of the drive model.
+SIM_VELOCITY_TIME_CONSTANT = 0.02  # s, first order response of the wheel velocity to a velocity setpoint
+SIM_TORQUE_TO_ACCELERATION = 40.0  # rad/s^2 per unit of torque setpoint
+SIM_WHEEL_DAMPING = 2.0  # 1/s, viscous friction of a wheel
+SIM_VOLTAGE_BUS = 48.0  # V
+SIM_TEMPERATURE = 300.0  # K
+SIM_PRESSURE = 101325.0  # Pa
+SIM_CURRENT_IDLE = 0.2  # A
+
+
+def _wrap_angle(a: float) -> float:
+    """Wrap an angle to [-pi, pi)."""
+    return (a + math.pi) % math.tau - math.pi
+
+
+class SimulatedDrive:
+    """Kinematic model of a single KELO drive: two wheels and a passive pivot.
+
+    The wheel velocities respond to the setpoints in `RxPDO1`, the pivot rotates due to the velocity difference between
+    both wheels."""
+
+    def __init__(self, pivot: float = 0.0):
+        """Initialise the drive.
+
+        Args:
+            pivot: Initial pivot encoder value (rad)."""
+        self.encoder_1 = 0.0
+        self.encoder_2 = 0.0
+        self.encoder_pivot = _wrap_angle(pivot)
+        self.velocity_1 = 0.0
+        self.velocity_2 = 0.0
+        self.velocity_pivot = 0.0
+        self.command = RxPDO1()
+
+    @property
+    def enabled(self) -> bool:
+        command1 = self.command.command1
+        return (command1 & COM1_ENABLE1) > 0 and (command1 & COM1_ENABLE2) > 0
+
+    def _accelerate(self, velocity: float, setpoint: float, dt: float) -> float:
+        """Compute the new velocity of a wheel after `dt` seconds."""
+        if not self.enabled:
+            return velocity * max(0.0, 1.0 - SIM_WHEEL_DAMPING * dt)
+        if self.command.command1 & COM1_MODE_VELOCITY:
+            return velocity + (setpoint - velocity) * min(1.0, dt / SIM_VELOCITY_TIME_CONSTANT)
+        # Torque mode: the setpoint accelerates the wheel against viscous friction.
+        acceleration = SIM_TORQUE_TO_ACCELERATION * setpoint - SIM_WHEEL_DAMPING * velocity
+        return velocity + acceleration * dt
+
+    def step(self, dt: float) -> None:
+        """Advance the drive state by `dt` seconds."""
+        self.velocity_1 = self._accelerate(self.velocity_1, self.command.setpoint1, dt)
+        self.velocity_2 = self._accelerate(self.velocity_2, self.command.setpoint2, dt)
+
+        # Wheel 1 is mounted in an inverted frame (see `PlatformDriver._do_control`).
+        angular_velocity_r = -self.velocity_1
+        angular_velocity_l = self.velocity_2
+        self.velocity_pivot = WHEEL_RADIUS * (angular_velocity_r - angular_velocity_l) / WHEEL_DISTANCE
+
+        self.encoder_1 = _wrap_angle(self.encoder_1 + self.velocity_1 * dt)
+        self.encoder_2 = _wrap_angle(self.encoder_2 + self.velocity_2 * dt)
+        self.encoder_pivot = _wrap_angle(self.encoder_pivot + self.velocity_pivot * dt)
+
+    def write_process_data(self, data: TxPDO1, sensor_ts: int) -> None:
+        """Fill a `TxPDO1` with the current state of the drive."""
+        data.status1 = SIM_STATUS1_DISABLED
+        if self.enabled:
+            data.status1 |= STAT1_ENABLED1 | STAT1_ENABLED2
+        data.status2 = SIM_STATUS2
+        data.sensor_ts = sensor_ts
+        data.setpoint_ts = self.command.timestamp
+        data.imu_ts = sensor_ts
+
+        data.encoder_1 = self.encoder_1
+        data.encoder_2 = self.encoder_2
+        data.encoder_pivot = self.encoder_pivot
+        data.velocity_1 = self.velocity_1
+        data.velocity_2 = self.velocity_2
+        data.velocity_pivot = self.velocity_pivot
+
+        torque_mode = self.enabled and not (self.command.command1 & COM1_MODE_VELOCITY)
+        data.current_1_d = self.command.setpoint1 if torque_mode else 0.0
+        data.current_2_d = self.command.setpoint2 if torque_mode else 0.0
+        data.voltage_bus = SIM_VOLTAGE_BUS
+        data.current_in = SIM_CURRENT_IDLE + abs(data.current_1_d) + abs(data.current_2_d)
+        data.temperature_1 = SIM_TEMPERATURE
+        data.temperature_2 = SIM_TEMPERATURE
+        data.temperature_imu = SIM_TEMPERATURE
+        data.accel_z = 9.81
+        data.pressure = SIM_PRESSURE
+
+
+class SimulatedSlave:
+    """Stand-in for `pysoem.CdefSlave`, exposing the `input` and `output` process data buffers."""
+
+    def __init__(self, slave_id: int, drive: Optional[SimulatedDrive]):
+        """Initialise the slave.
+
+        Args:
+            slave_id: Position of the slave on the bus (starting at 1).
+            drive: The simulated drive, or `None` for slaves without process data."""
+        self.id = slave_id
+        self.man = 0
+        self.name = "SimulatedDrive" if drive is not None else "SimulatedSlave"
+        self.state = EC_STATE_NONE
+        self.drive = drive
+
+        input_size = ctypes.sizeof(TxPDO1) if drive is not None else 0
+        output_size = ctypes.sizeof(RxPDO1) if drive is not None else 0
+        self._input = bytearray(input_size)
+        self._output = bytearray(output_size)
+
+    @property
+    def input(self) -> bytes:
+        return bytes(self._input)
+
+    @property
+    def output(self) -> bytes:
+        return bytes(self._output)
+
+    @output.setter
+    def output(self, value: bytes) -> None:
+        if len(value) != len(self._output):
+            raise ValueError(f"Expected {len(self._output)} bytes of output data, got {len(value)}.")
+        self._output[:] = value
+
+
+class SimulatedMaster:
+    """Drop-in replacement for `pysoem.Master` that simulates the drives of a KELO Robile platform."""
+
+    def __init__(
+        self,
+        wheel_configs: List[WheelConfig],
+        time_step: Optional[float] = None,
+        initial_pivots: Optional[List[float]] = None,
+    ):
+        """Initialise the simulated master.
+
+        Args:
+            wheel_configs: The configurations for each drive, used to place the drives on the simulated bus.
+            time_step: If set, the simulation advances this many seconds every cycle instead of following the
+                monotonic clock. This allows running the platform faster (or slower) than real time.
+            initial_pivots: Initial pivot encoder values for each drive (default: all zero)."""
+        self._wheel_configs = wheel_configs
+        self._time_step = time_step
+        self._initial_pivots = initial_pivots if initial_pivots is not None else [0.0] * len(wheel_configs)
+
+        self.slaves: List[SimulatedSlave] = []
+        self.state = EC_STATE_NONE
+
+        self._sim_time_ns = 0
+        self._last_receive_time: Optional[float] = None
+        self._tx = TxPDO1()
+
+    @property
+    def drives(self) -> List[SimulatedDrive]:
+        """The simulated drives, in the order of the wheel configurations."""
+        return [self.slaves[wc.ethercat_number - 1].drive for wc in self._wheel_configs]
+
+    @property
+    def sim_time(self) -> float:
+        """Simulated time in seconds since the first cycle."""
+        return self._sim_time_ns * 1e-9
+
+    def open(self, ifname: str) -> None:
+        """Open the (simulated) network interface."""
+
+    def close(self) -> None:
+        """Close the (simulated) network interface."""
+
+    def config_init(self, usetable: bool = False) -> int:
+        """Enumerate all slaves. Returns the number of slaves found."""
+        drives = {
+            wc.ethercat_number: SimulatedDrive(pivot) for wc, pivot in zip(self._wheel_configs, self._initial_pivots)
+        }
+        num_slaves = max(drives.keys(), default=0)
+        self.slaves = [SimulatedSlave(i + 1, drives.get(i + 1)) for i in range(num_slaves)]
+        for slave in self.slaves:
+            slave.state = EC_STATE_PRE_OP
+        return num_slaves
+
+    def config_map(self) -> int:
+        """Map the process data of all slaves. Returns the size of the IO map."""
+        for slave in self.slaves:
+            slave.state = EC_STATE_SAFE_OP
+        return sum(len(slave.input) + len(slave.output) for slave in self.slaves)
+
+    def read_state(self) -> int:
+        """Read the state of all slaves. Returns the lowest state found."""
+        return self._lowest_state()
+
+    def write_state(self) -> None:
+        """Request the master state for all slaves."""
+        for slave in self.slaves:
+            slave.state = self.state
+
+    def state_check(self, expected_state: int, timeout: int = 50000) -> int:
+        """Check the state of all slaves. Returns the lowest state found."""
+        return self._lowest_state()
+
+    def send_processdata(self) -> None:
+        """Transmit the output buffers of all slaves to the simulated drives."""
+        for slave in self.slaves:
+            if slave.drive is not None:
+                slave.drive.command = RxPDO1.from_buffer_copy(slave._output)
+
+    def receive_processdata(self, timeout: int = 2000) -> int:
+        """Advance the simulation and update the input buffers of all slaves. Returns the working counter."""
+        now = time.monotonic()
+        if self._time_step is not None:
+            dt = self._time_step
+        elif self._last_receive_time is None:
+            dt = 0.0
+        else:
+            dt = now - self._last_receive_time
+        self._last_receive_time = now
+        self._sim_time_ns += int(dt * 1e9)
+
+        wkc = 0
+        for slave in self.slaves:
+            if slave.drive is None:
+                continue
+            if slave.state == EC_STATE_OPERATIONAL:
+                slave.drive.step(dt)
+            slave.drive.write_process_data(self._tx, self._sim_time_ns)
+            slave._input[:] = bytes(self._tx)
+            wkc += 3
+        return wkc
+
+    def _lowest_state(self) -> int:
+        return min((slave.state for slave in self.slaves), default=EC_STATE_NONE)
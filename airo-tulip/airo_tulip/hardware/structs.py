@@ -21,6 +21,49 @@ class PlatformLimits:
     max_dec_angular: float = 0.8
 
 
+@dataclass
+class PlatformTaskRates:
+    """
+    Rates of the tasks of `RobilePlatform.step()`, as divisors of the loop frequency: a task with divisor n runs every
+    n-th cycle. Wheel control always runs every cycle. With a divisor larger than 1, the wheels should not turn more
+    than half a revolution between two odometry updates.
+    """
+
+    odometry: int = 1
+    diagnostics: int = 100
+
+
+@dataclass
+class PlatformDiagnostics:
+    """
+    Slowly changing health data of all drives, see `PlatformMonitor.get_diagnostics()`. Arrays have one entry per drive.
+    """
+
+    time: float  # time (s) of the cycle in which the diagnostics were computed, see `CycleClock`
+    voltage_bus: np.ndarray  # bus voltage
+    current_in: np.ndarray  # input current
+    power: np.ndarray  # input power, bus voltage * input current
+    temperature: np.ndarray  # shape (N, 3), temperature of wheel1, wheel2 and IMU
+    pressure: np.ndarray  # pressure
+
+    @property
+    def power_total(self) -> float:
+        return float(np.sum(self.power))
+
+
+@dataclass
+class TorqueControllerGains:
+    """
+    Gains and limits of the velocity PDI controller of a single motor, used in the compliant driver modes.
+    """
+
+    p: float
+    i: float
+    d: float
+    max_output: float  # maximum torque setpoint
+    max_sum_error_vel: float  # anti-windup limit of the integrated velocity error
+
+
 @dataclass
 class WheelConfig:
     """
@@ -0,0 +1,149 @@
+"""Execution of time-parameterized velocity trajectories next to the EtherCAT loop.
+
+A trajectory is a sequence of (t, vel_x, vel_y, vel_a) samples, with t the time (s) since the start of the trajectory.
+The `VelocityTrajectoryExecutor` interpolates the samples linearly at the time of every cycle, so the platform follows
+the trajectory at the loop rate, regardless of the rate of the samples or of the network."""
+
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional, Tuple
+
+import numpy as np
+from airo_tulip.hardware.platform_driver import check_platform_velocity_target
+
+MAX_TRAJECTORY_SAMPLES = 4096
+"""Maximum number of samples of a trajectory."""
+
+TRAJECTORY_COMMAND_TIMEOUT = 0.1  # s, timeout of the velocity targets of a trajectory, stops the platform if it stalls
+
+
+class TrajectoryState(Enum):
+    """Execution state of a trajectory."""
+
+    IDLE = 0  # no trajectory was executed yet
+    RUNNING = 1
+    SUCCEEDED = 2
+    PREEMPTED = 3  # replaced by a velocity target
+    CANCELLED = 4
+
+
+@dataclass(frozen=True)
+class TrajectoryStatus:
+    """Progress of the latest trajectory."""
+
+    trajectory_id: int  # 0 if no trajectory was executed yet
+    state: TrajectoryState
+    elapsed: float = 0.0  # time (s) since the start of the trajectory
+    duration: float = 0.0  # time (s) of the last sample
+
+
+def check_velocity_trajectory(samples: np.ndarray) -> np.ndarray:
+    """Check a velocity trajectory before executing it.
+
+    Args:
+        samples: The samples of the trajectory, of shape (N, 4): time (s) since the start of the trajectory, strictly
+            increasing from 0 or later, and the x, y and angular velocity of the platform.
+
+    Returns:
+        The samples, as float64 array.
+
+    Raises:
+        ValueError: If the samples are malformed, or exceed the safety limits, see `check_platform_velocity_target`."""
+    samples = np.asarray(samples, dtype=np.float64)
+    if samples.ndim != 2 or samples.shape[1] != 4:
+        raise ValueError(f"Expected trajectory samples of shape (N, 4), got {samples.shape}")
+    if not 0 < len(samples) <= MAX_TRAJECTORY_SAMPLES:
+        raise ValueError(f"Expected 1 to {MAX_TRAJECTORY_SAMPLES} trajectory samples, got {len(samples)}")
+    if not np.all(np.isfinite(samples)):
+        raise ValueError("Trajectory samples must be finite")
+    if samples[0, 0] < 0.0 or np.any(np.diff(samples[:, 0]) <= 0.0):
+        raise ValueError("Trajectory sample times must be non-negative and strictly increasing")
+    for _, vel_x, vel_y, vel_a in samples:
+        check_platform_velocity_target(vel_x, vel_y, vel_a, TRAJECTORY_COMMAND_TIMEOUT)
+    return samples
+
+
+class VelocityTrajectoryExecutor:
+    """Interpolates a velocity trajectory at the time of every cycle of the EtherCAT loop."""
+
+    def __init__(self):
+        self._trajectory_id = 0
+        self._state = TrajectoryState.IDLE
+        self._times = []
+        self._velocities = []
+        self._start_time = 0.0
+        self._elapsed = 0.0
+        self._index = 0
+
+    @property
+    def status(self) -> TrajectoryStatus:
+        return TrajectoryStatus(
+            self._trajectory_id, self._state, self._elapsed, self._times[-1] if self._times else 0.0
+        )
+
+    def start(self, trajectory_id: int, samples: np.ndarray, now: float) -> None:
+        """Start a trajectory, replacing the current one.
+
+        Args:
+            trajectory_id: The id of the trajectory.
+            samples: The samples of the trajectory, see `check_velocity_trajectory`.
+            now: The time (s) of the current cycle, which is the start of the trajectory."""
+        # Plain floats are faster to interpolate than NumPy scalars.
+        self._times = samples[:, 0].tolist()
+        self._velocities = samples[:, 1:].tolist()
+        self._trajectory_id = trajectory_id
+        self._state = TrajectoryState.RUNNING
+        self._start_time = now
+        self._elapsed = 0.0
+        self._index = 0
+
+    def preempt(self) -> None:
+        """Stop the trajectory because another velocity target was set."""
+        if self._state == TrajectoryState.RUNNING:
+            self._state = TrajectoryState.PREEMPTED
+
+    def cancel(self) -> bool:
+        """Stop the trajectory.
+
+        Returns:
+            True if a trajectory was running, in which case the platform should be stopped."""
+        if self._state != TrajectoryState.RUNNING:
+            return False
+        self._state = TrajectoryState.CANCELLED
+        return True
+
+    def step(self, now: float) -> Optional[Tuple[float, float, float]]:
+        """Interpolate the trajectory at the time of the current cycle.
+
+        Args:
+            now: The time (s) of the current cycle.
+
+        Returns:
+            The velocity target (x, y, a) of the platform, zero when the trajectory just finished, or None if no
+            trajectory is running."""
+        if self._state != TrajectoryState.RUNNING:
+            return None
+
+        times = self._times
+        elapsed = now - self._start_time
+        self._elapsed = elapsed
+        if elapsed >= times[-1]:
+            self._elapsed = times[-1]
+            self._state = TrajectoryState.SUCCEEDED
+            return 0.0, 0.0, 0.0
+        if elapsed < times[0]:
+            return tuple(self._velocities[0])
+
+        # Time only moves forward, so the current segment is found from the previous one.
+        index = self._index
+        while times[index + 1] <= elapsed:
+            index += 1
+        self._index = index
+
+        alpha = (elapsed - times[index]) / (times[index + 1] - times[index])
+        v0, v1 = self._velocities[index], self._velocities[index + 1]
+        return (
+            v0[0] + alpha * (v1[0] - v0[0]),
+            v0[1] + alpha * (v1[1] - v0[1]),
+            v0[2] + alpha * (v1[2] - v0[2]),
+        )
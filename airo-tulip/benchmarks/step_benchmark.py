@@ -0,0 +1,241 @@
+"""Benchmark the cycle time of `RobilePlatform.step()` on a simulated platform.
+
+The platform is driven by a `SimulatedMaster`, so this benchmark runs on any machine. Every combination of drive count
+and `PlatformDriverType` is benchmarked, with a velocity target set so that the full control path is exercised.
+For each combination, the mean, p99 and max duration of the complete cycle and of each of its phases is reported,
+together with the memory that is allocated per cycle.
+
+Results are written as JSON, so that they can be compared across releases:
+
+    python benchmarks/step_benchmark.py --drives 4 8 --cycles 5000 --output results.json
+"""
+
+import argparse
+import gc
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from importlib.metadata import PackageNotFoundError, version
+from typing import Callable, Dict, List
+
+import numpy as np
+from airo_tulip.hardware.platform_driver import PlatformDriverType
+from airo_tulip.hardware.robile_platform import RobilePlatform
+from airo_tulip.hardware.simulation import SimulatedMaster
+from airo_tulip.hardware.structs import WheelConfig
+from loguru import logger
+
+DRIVE_RING_RADIUS = 0.26  # m, the drives are placed evenly on a ring around the platform centre
+
+
+def create_wheel_configs(num_drives: int) -> List[WheelConfig]:
+    """Create wheel configurations for a platform with `num_drives` drives.
+
+    Like on a real platform, every drive occupies two slaves on the EtherCAT bus, after the compute brick."""
+    wheel_configs = []
+    for i in range(num_drives):
+        angle = math.tau * (i + 0.5) / num_drives
+        wheel_configs.append(
+            WheelConfig(
+                ethercat_number=2 * i + 3,
+                x=DRIVE_RING_RADIUS * math.cos(angle),
+                y=DRIVE_RING_RADIUS * math.sin(angle),
+                a=0.0,
+            )
+        )
+    return wheel_configs
+
+
+class PhaseTimer:
+    """Record the duration of every call to a method, by wrapping it on the instance."""
+
+    def __init__(self, obj: object, method_name: str):
+        self.durations_ns: List[int] = []
+        self._obj = obj
+        self._method_name = method_name
+        self._method = getattr(obj, method_name)
+        setattr(obj, method_name, self._timed(self._method))
+
+    def _timed(self, method: Callable) -> Callable:
+        durations_ns = self.durations_ns
+
+        def timed(*args, **kwargs):
+            start_ns = time.perf_counter_ns()
+            result = method(*args, **kwargs)
+            durations_ns.append(time.perf_counter_ns() - start_ns)
+            return result
+
+        return timed
+
+    def restore(self) -> None:
+        setattr(self._obj, self._method_name, self._method)
+
+
+def summarize(durations_ns: List[int]) -> Dict[str, float]:
+    """Summarize durations as mean, p99 and max, in microseconds."""
+    durations_us = np.asarray(durations_ns, dtype=np.float64) * 1e-3
+    return {
+        "mean_us": float(np.mean(durations_us)),
+        "p99_us": float(np.percentile(durations_us, 99)),
+        "max_us": float(np.max(durations_us)),
+    }
+
+
+def create_platform(num_drives: int, driver_type: PlatformDriverType, loop_frequency: float) -> RobilePlatform:
+    """Create and initialise a simulated platform that is driving at constant velocity."""
+    wheel_configs = create_wheel_configs(num_drives)
+    master = SimulatedMaster(wheel_configs, time_step=1 / loop_frequency)
+    robile = RobilePlatform("simulated", wheel_configs, driver_type, master)
+    if not robile.init_ethercat():
+        raise RuntimeError("Could not initialise the simulated EtherCAT bus.")
+
+    # Step until the driver is active, then start driving.
+    for _ in range(10):
+        robile.step()
+    robile.driver.set_platform_velocity_target(0.3, 0.1, 0.2, timeout=3600.0)
+    return robile
+
+
+def benchmark_cycle_time(robile: RobilePlatform, cycles: int) -> Dict[str, Dict[str, float]]:
+    """Time `cycles` calls to `RobilePlatform.step()` and their phases."""
+    phases = {
+        "receive_processdata": PhaseTimer(robile._master, "receive_processdata"),
+        "read_process_data": PhaseTimer(robile, "_read_process_data"),
+        "monitor_step": PhaseTimer(robile.monitor, "step"),
+        "driver_step": PhaseTimer(robile.driver, "step"),
+        "send_processdata": PhaseTimer(robile._master, "send_processdata"),
+    }
+
+    step_durations_ns = []
+    for _ in range(cycles):
+        start_ns = time.perf_counter_ns()
+        robile.step()
+        step_durations_ns.append(time.perf_counter_ns() - start_ns)
+
+    for timer in phases.values():
+        timer.restore()
+
+    result = {"step": summarize(step_durations_ns)}
+    result.update({name: summarize(timer.durations_ns) for name, timer in phases.items()})
+    return result
+
+
+def benchmark_allocations(robile: RobilePlatform, cycles: int) -> Dict[str, float]:
+    """Measure the memory allocated per call to `RobilePlatform.step()`.
+
+    This is a separate pass, because tracing allocations slows down the cycle considerably. Reports the mean peak of
+    temporarily allocated memory during a cycle, and the mean number of memory blocks retained after a cycle."""
+    tracemalloc.start()
+    peaks = []
+    blocks_before = sys.getallocatedblocks()
+    for _ in range(cycles):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        robile.step()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - current)
+    blocks_after = sys.getallocatedblocks()
+    tracemalloc.stop()
+
+    return {
+        "alloc_peak_bytes_per_cycle": float(np.mean(peaks)),
+        "alloc_net_blocks_per_cycle": (blocks_after - blocks_before) / cycles,
+    }
+
+
+def run_benchmarks(
+    drive_counts: List[int],
+    driver_types: List[PlatformDriverType],
+    cycles: int,
+    warmup: int,
+    loop_frequency: float,
+) -> dict:
+    """Run the benchmark for every combination of drive count and driver type."""
+    try:
+        airo_tulip_version = version("airo-tulip")
+    except PackageNotFoundError:
+        airo_tulip_version = "unknown"
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "airo_tulip_version": airo_tulip_version,
+            "python_version": platform.python_version(),
+            "numpy_version": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cycles": cycles,
+            "warmup": warmup,
+            "loop_frequency": loop_frequency,
+        },
+        "results": [],
+    }
+
+    for num_drives in drive_counts:
+        for driver_type in driver_types:
+            robile = create_platform(num_drives, driver_type, loop_frequency)
+            for _ in range(warmup):
+                robile.step()
+
+            gc.collect()
+            timings = benchmark_cycle_time(robile, cycles)
+            allocations = benchmark_allocations(robile, min(cycles, 1000))
+
+            result = {"num_drives": num_drives, "driver_type": driver_type.name, "timings": timings}
+            result.update(allocations)
+            report["results"].append(result)
+
+            step = timings["step"]
+            print(
+                f"{num_drives:3d} drives {driver_type.name:18s} "
+                f"mean {step['mean_us']:8.1f} us  p99 {step['p99_us']:8.1f} us  max {step['max_us']:8.1f} us  "
+                f"alloc {allocations['alloc_peak_bytes_per_cycle']:8.0f} B/cycle",
+                file=sys.stderr,
+            )
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drives", type=int, nargs="+", default=[4, 8, 16, 32], help="Drive counts to benchmark.")
+    parser.add_argument(
+        "--driver-types",
+        nargs="+",
+        choices=[t.name for t in PlatformDriverType],
+        default=[t.name for t in PlatformDriverType],
+        help="Driver types to benchmark.",
+    )
+    parser.add_argument("--cycles", type=int, default=5000, help="Number of timed cycles per combination.")
+    parser.add_argument("--warmup", type=int, default=500, help="Number of untimed cycles per combination.")
+    parser.add_argument("--loop-frequency", type=float, default=1000.0, help="Simulated loop frequency (Hz).")
+    parser.add_argument(
+        "--output", type=str, default=None, help="Write the JSON report to this file (default: stdout)."
+    )
+    args = parser.parse_args()
+
+    # Keep the benchmark output readable; log calls below this level are still evaluated, as on the real platform.
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    report = run_benchmarks(
+        args.drives,
+        [PlatformDriverType[name] for name in args.driver_types],
+        args.cycles,
+        args.warmup,
+        args.loop_frequency,
+    )
+
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
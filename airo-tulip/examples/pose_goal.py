@@ -0,0 +1,25 @@
+import math
+
+from airo_tulip.api.client import KELORobile
+
+
+def test():
+    mobi = KELORobile("localhost", 49789)
+
+    mobi.reset_odometry()
+
+    # Drive a square, turning at every corner, in the odometry frame.
+    for x, y, a in [(0.5, 0.0, math.pi / 2), (0.5, 0.5, math.pi), (0.0, 0.5, -math.pi / 2), (0.0, 0.0, 0.0)]:
+        goal_id = mobi.move_to_pose(x, y, a)
+        status = mobi.wait_for_pose_goal(goal_id)
+        print(f"Goal {goal_id}: {status.state.name}, pose {mobi.get_odometry()}")
+
+    # Relative goal: 0.3 m forward in the frame of the platform.
+    goal_id = mobi.move_to_pose(0.3, 0.0, 0.0, relative=True)
+    mobi.wait_for_pose_goal(goal_id)
+
+    mobi.stop_server()
+
+
+if __name__ == "__main__":
+    test()